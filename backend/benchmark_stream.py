@@ -0,0 +1,90 @@
+"""
+Time to classification with and without streaming the LLM response.
+
+Runs prompt_perplexity against mock_services.py set up like a reasoning
+model: a time to first token, then a <think> segment, the classification
+JSON and some explanation after it, each token generated token_delay
+apart. Without streaming the classification is available when the whole
+completion has been generated; with streaming it is available as soon as
+the JSON object closes, and the rest of the stream is cancelled.
+
+Usage:
+    python benchmark_stream.py [--requests 10] [--first-token 0.5] [--token-delay 0.01]
+                               [--think-tokens 300] [--trailing-tokens 150]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+import mock_services
+
+COMMANDS = [
+    "send an email to nathan about the meeting saying can we meet tomorrow at noon",
+    "find me a flight from SFO to New York on April first for two people",
+]
+
+async def run_mode(sanitization, streaming, requests):
+    """Classify requests commands and return (latencies in seconds, results)"""
+    sanitization.LLM_STREAMING = streaming
+    latencies = []
+    results = []
+    for index in range(requests):
+        start_time = time.perf_counter()
+        results.append(await sanitization.prompt_perplexity(COMMANDS[index % len(COMMANDS)]))
+        latencies.append(time.perf_counter() - start_time)
+    await sanitization.close_clients()
+    return latencies, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=10, help="Classifications per mode")
+    parser.add_argument('--first-token', type=float, default=0.5, help="Mock time to first token in seconds")
+    parser.add_argument('--token-delay', type=float, default=0.01, help="Mock generation time per token")
+    parser.add_argument('--think-tokens', type=int, default=300, help="Reasoning words before the answer")
+    parser.add_argument('--trailing-tokens', type=int, default=150, help="Words after the answer")
+    args = parser.parse_args()
+    
+    mock = mock_services.start_in_background(mock_services.create_server(
+        llm_delay=args.first_token, token_delay=args.token_delay,
+        think_tokens=args.think_tokens, trailing_tokens=args.trailing_tokens))
+    # Read by sanitization at import
+    os.environ["PERPLEXITY_BASE_URL"] = mock.base_url
+    os.environ.setdefault("perplexity_Key", "mock-key")
+    import sanitization
+    
+    total_tokens = len(mock_services.completion_tokens(mock_services.EMAIL_RESULT, args.think_tokens,
+                                                       args.trailing_tokens))
+    print(f"Mock reasoning model: first token {args.first_token * 1000:.0f} ms, "
+          f"{args.token_delay * 1000:.0f} ms per token, {total_tokens} tokens per completion")
+    
+    summary = {}
+    try:
+        for name, streaming in (("complete", False), ("streaming", True)):
+            tokens_before = mock.stats['tokens_sent']
+            cancelled_before = mock.stats['streams_cancelled']
+            latencies, results = asyncio.run(run_mode(sanitization, streaming, args.requests))
+            # Let the mock notice the last cancelled stream before reading its counters
+            time.sleep(0.2 + 2 * args.token_delay)
+            summary[name] = (np.array(latencies) * 1000, results)
+            tokens = mock.stats['tokens_sent'] - tokens_before
+            cancelled = mock.stats['streams_cancelled'] - cancelled_before
+            summary[name] += (tokens, cancelled)
+    finally:
+        mock.shutdown()
+        mock.server_close()
+    
+    print()
+    for name, (latencies, results, tokens, cancelled) in summary.items():
+        streamed = f", {tokens / args.requests:.0f} tokens streamed per request, {cancelled} streams cancelled" \
+            if name == "streaming" else ""
+        print(f"{name:10s} time to classification p50 {np.percentile(latencies, 50):6.0f} ms, "
+              f"p95 {np.percentile(latencies, 95):6.0f} ms{streamed}")
+    complete, streaming = summary["complete"], summary["streaming"]
+    print(f"streaming saves {np.percentile(complete[0], 50) - np.percentile(streaming[0], 50):.0f} ms at p50; "
+          f"classifications {'match' if complete[1] == streaming[1] else 'DIFFER'}")
+
+if __name__ == '__main__':
+    main()
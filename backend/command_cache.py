@@ -0,0 +1,214 @@
+"""
+Cache of LLM classifications keyed on the normalized command.
+
+The same command is often said again ("email nathan about the demo"), and
+each time it used to cost a full reasoning model call. command_key()
+folds away what doesn't change the meaning: case, punctuation,
+whitespace, filler like "please" and "can you", and number words
+("two" -> "2", "first" -> "1st"). Commands with relative dates
+("tomorrow", "on Friday") are only reused on the same day.
+
+CommandCache keeps the classifications in memory with a TTL and a bounded
+LRU order, and optionally writes them through to a SQLite file so they
+survive restarts. Only successful classifications are stored: 'error' and
+'unknown' results are never cached.
+
+Usage:
+    python command_cache.py command_cache.db [--clear]
+"""
+import argparse
+import copy
+import datetime
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from command_parser import LEADING_FILLER, NUMBER_WORDS, ORDINAL_WORDS, TRAILING_FILLER, WEEKDAYS
+
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 256
+
+# Only these results are stored
+CACHEABLE_TYPES = ("email", "flight")
+
+RELATIVE_DATE = re.compile(rf"\b(?:today|tonight|tomorrow|yesterday|week|weekend|month|{'|'.join(WEEKDAYS)})\b")
+
+def _ordinal(value: int) -> str:
+    """Digits of an ordinal, e.g. 22nd"""
+    suffix = "th" if 10 <= value % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(value % 10, "th")
+    return f"{value}{suffix}"
+
+# Number and ordinal words as digits; "twenty first" is hyphenated to one word first
+NUMBERS = {word: str(value) for word, value in NUMBER_WORDS.items()}
+NUMBERS.update({word.replace(" ", "-"): _ordinal(value) for word, value in ORDINAL_WORDS.items()})
+TWO_WORD_ORDINAL = re.compile(r"\b(twenty|thirty) (?=(?:first|second|third|fourth|fifth|sixth|seventh|eighth|ninth)\b)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS command_cache (
+    key TEXT PRIMARY KEY,
+    request_type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+def command_key(text: str, today: Optional[datetime.date] = None) -> str:
+    """
+    Cache key for a command.
+    
+    Args:
+        text: Transcribed command
+        today: Date the command was given (default: today); part of the key
+            when the command has a relative date
+    
+    Returns:
+        The normalized command
+    """
+    text = " ".join((text or "").lower().split())
+    text = LEADING_FILLER.sub("", text.strip(" .!?"))
+    text = TRAILING_FILLER.sub("", text)
+    # Keep the punctuation inside addresses and numbers ("a.b@x.com", "3.5"), drop the rest
+    text = re.sub(r"[^\w@.'\-]+|(?<!\w)[.'\-]|[.'\-](?!\w)", " ", text)
+    text = TWO_WORD_ORDINAL.sub(r"\1-", text)
+    key = " ".join(NUMBERS.get(word, word) for word in text.split())
+    if RELATIVE_DATE.search(key):
+        key = f"{(today or datetime.date.today()).isoformat()}|{key}"
+    return key
+
+class CommandCache:
+    """TTL and LRU bounded cache of classifications, optionally backed by SQLite"""
+    
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL, path: Optional[str] = None):
+        """
+        Initialize the cache, loading the unexpired entries of path.
+        
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl: Seconds an entry is used for; 0 disables the cache
+            path: SQLite file the entries are written through to (None to
+                keep them in memory only)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "uncacheable": 0}
+        self.connection = None
+        if path and self.enabled:
+            self.connection = sqlite3.connect(path)
+            with self.connection:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.executescript(SCHEMA)
+                self.connection.execute("DELETE FROM command_cache WHERE created < ?", (time.time() - ttl,))
+            rows = self.connection.execute(
+                "SELECT key, request_type, data, created FROM command_cache ORDER BY created DESC LIMIT ?",
+                (max_entries,)).fetchall()
+            for key, request_type, data, created in reversed(rows):
+                self.entries[key] = (request_type, json.loads(data), created)
+            if rows:
+                print(f"Loaded {len(rows)} cached commands from {path}")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+    
+    def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        """
+        Cached classification of a command key.
+        
+        Returns:
+            (request_type, data) with a copy of the data, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[2] > self.ttl:
+            self._remove(key)
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0], copy.deepcopy(entry[1])
+    
+    def put(self, key: str, request_type: str, data: Any) -> bool:
+        """
+        Store a classification.
+        
+        Args:
+            key: Command key from command_key()
+            request_type: Classified type; anything but CACHEABLE_TYPES is refused
+            data: Extracted fields
+        
+        Returns:
+            True if it was stored
+        """
+        if not self.enabled:
+            return False
+        if request_type not in CACHEABLE_TYPES:
+            self.stats["uncacheable"] += 1
+            return False
+        created = time.time()
+        self.entries[key] = (request_type, copy.deepcopy(data), created)
+        self.entries.move_to_end(key)
+        self.stats["stores"] += 1
+        if self.connection is not None:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO command_cache (key, request_type, data, created) VALUES (?, ?, ?, ?)",
+                    (key, request_type, json.dumps(data), created))
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+        return True
+    
+    def _remove(self, key: str):
+        self.entries.pop(key, None)
+        if self.connection is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM command_cache WHERE key = ?", (key,))
+    
+    def clear(self):
+        """Drop every entry, including the persisted ones"""
+        self.entries.clear()
+        if self.connection is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM command_cache")
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Counters, size and hit rate for /health"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, size=len(self.entries), max_entries=self.max_entries, ttl=self.ttl,
+                    persistent=self.connection is not None,
+                    hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else None)
+    
+    def close(self):
+        """Close the SQLite file"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="Cache database (COMMAND_CACHE_PATH)")
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help="Entries older than this are dropped")
+    parser.add_argument('--clear', action='store_true', help="Delete every cached command")
+    args = parser.parse_args()
+    
+    cache = CommandCache(max_entries=1 << 30, ttl=args.ttl, path=args.path)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.path}")
+    for key, (request_type, data, created) in reversed(cache.entries.items()):
+        when = datetime.datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"  {when}  {request_type:6s}  {key!r}")
+    print(f"{len(cache.entries)} cached commands")
+    cache.close()
+
+if __name__ == '__main__':
+    main()
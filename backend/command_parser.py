@@ -0,0 +1,546 @@
+"""
+Rule-based fast path for classifying voice commands.
+
+Most commands are dictated in a few fixed shapes ("send an email to Nathan
+about the demo saying the build is ready", "find a flight from SFO to
+New York on April first for two people"). parse_command() recognizes
+those shapes and extracts the same fields the LLM classification returns,
+with a confidence per field:
+
+- email: recipient, subject, body (and senders_name from SENDER_NAME)
+- flight: from_city, to_city, departure_date, num_passengers
+
+The result's confidence is its weakest field's, 0 when a required field is
+missing. Only results at or above FAST_PATH_CONFIDENCE skip the LLM;
+anything else (unknown contacts, missing subject, "next Friday", both
+intents in one sentence, ...) is escalated to the reasoning model as
+before.
+
+Run as a script to measure the hit rate, the accuracy of the fast path
+results on the labelled corpus and the latency saved, on the corpus and on
+any recorded metadata_*.json files.
+
+Usage:
+    python command_parser.py [metadata files or globs ...] [--corpus command_corpus.jsonl]
+                             [--llm-latency 5.0] [--show]
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import string
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Results at least this confident are used without the LLM
+FAST_PATH_CONFIDENCE = 0.8
+
+# Known contacts; the same mapping the LLM prompt gives
+CONTACTS = {
+    "nathan": "nathan.tran04@sjsu.edu",
+}
+
+SENDER_NAME = os.getenv("SENDER_NAME", "")
+
+CITY_CODES = {
+    "ATL": "Atlanta", "AUS": "Austin", "BOS": "Boston", "CDG": "Paris", "DCA": "Washington",
+    "DEN": "Denver", "DFW": "Dallas", "EWR": "Newark", "HNL": "Honolulu", "HND": "Tokyo",
+    "IAD": "Washington", "JFK": "New York", "LAS": "Las Vegas", "LAX": "Los Angeles",
+    "LGA": "New York", "LHR": "London", "MIA": "Miami", "NRT": "Tokyo", "NYC": "New York",
+    "OAK": "Oakland", "ORD": "Chicago", "PDX": "Portland", "PHX": "Phoenix", "SEA": "Seattle",
+    "SFO": "San Francisco", "SJC": "San Jose", "SMF": "Sacramento",
+}
+CITY_ALIASES = {
+    "sf": "San Francisco", "san fran": "San Francisco", "la": "Los Angeles",
+    "new york city": "New York", "vegas": "Las Vegas", "dc": "Washington",
+    "washington dc": "Washington", "philly": "Philadelphia",
+}
+KNOWN_CITIES = set(CITY_CODES.values()) | set(CITY_ALIASES.values()) | {
+    "Chicago", "Houston", "Philadelphia", "San Diego", "Orlando", "Toronto", "Vancouver",
+}
+
+MONTHS = {name: index + 1 for index, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july", "august",
+     "september", "october", "november", "december"])}
+MONTHS.update({name[:3]: number for name, number in list(MONTHS.items())})
+MONTHS["sept"] = 9
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10}
+ORDINAL_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+                 "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11,
+                 "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+                 "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19,
+                 "twentieth": 20, "thirtieth": 30}
+for _ones, _value in list(ORDINAL_WORDS.items())[:9]:
+    ORDINAL_WORDS[f"twenty {_ones}"] = 20 + _value
+    ORDINAL_WORDS[f"twenty-{_ones}"] = 20 + _value
+ORDINAL_WORDS["thirty first"] = ORDINAL_WORDS["thirty-first"] = 31
+
+# Politeness and filler the recognizer leaves around the command
+LEADING_FILLER = re.compile(
+    r"^(?:(?:hey|hi|okay|ok|so|um|uh|ava|please|can you|could you|would you|will you|"
+    r"i want you to|i need you to|i'd like you to|go ahead and|help me|i want to|i need to|"
+    r"i'd like to)\b[\s,]*)+", re.IGNORECASE)
+TRAILING_FILLER = re.compile(r"[\s,]*\b(?:please|thanks|thank you)\s*$", re.IGNORECASE)
+
+EMAIL_INTENT = re.compile(
+    r"^(?:send|write|compose|draft|shoot)\s+(?:(?:an?|the)\s+)?(?:(?:quick|short)\s+)?"
+    r"(?P<noun>e-?mail|mail|message|note)\s+(?:to\s+)?(?P<rest>.+)$", re.IGNORECASE)
+EMAIL_VERB = re.compile(r"^e-?mail\s+(?P<rest>.+)$", re.IGNORECASE)
+EMAIL_INDIRECT = re.compile(
+    r"^(?:send|write|shoot)\s+(?P<recipient>.+?)\s+an?\s+(?:(?:quick|short)\s+)?e-?mail\b[\s,]*(?P<rest>.*)$",
+    re.IGNORECASE)
+
+# Phrases that introduce the subject and the body of a dictated email
+SUBJECT_MARKER = (r"about|regarding|concerning|with (?:the )?subject(?: line)?(?: of)?|"
+                  r"with (?:the )?title|titled|subject(?: line)?")
+BODY_MARKER = (r"saying|that says|which says|and say|to say|and tell (?:him|her|them)|"
+               r"telling (?:him|her|them)|and let (?:him|her|them) know|letting (?:him|her|them) know|"
+               r"with (?:the )?(?:body|message)|and (?:the )?(?:body|message)(?: is| says)?")
+MARKER = re.compile(rf"[\s,:]+(?:(?P<subject>{SUBJECT_MARKER})|(?P<body>{BODY_MARKER}))\b[\s,:]*",
+                    re.IGNORECASE)
+EXPLICIT_SUBJECT = re.compile(r"[\s,:]+(?:and )?with (?:the )?subject(?: line)?(?: of)?\b[\s,:]*",
+                              re.IGNORECASE)
+
+# A second instruction in the dictated text ("... saying hi and also book a flight")
+COMPOUND = re.compile(r"\b(?:and|then)\s+(?:also\s+)?(?:then\s+)?(?:find|book|search|look for|e-?mail|send)\b",
+                      re.IGNORECASE)
+
+EMAIL_ADDRESS = re.compile(r"^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$")
+SPOKEN_ADDRESS = re.compile(r"^(?P<user>[\w+-]+(?:\s+dot\s+[\w+-]+)*)\s+at\s+(?P<domain>[\w-]+(?:\s+dot\s+[\w-]+)+)$",
+                            re.IGNORECASE)
+
+FLIGHT_INTENT = re.compile(r"\b(?:flights?|fly|flying|plane tickets?|airline tickets?)\b", re.IGNORECASE)
+OTHER_INTENT = re.compile(r"\b(?:e-?mail|hotel|car rental|rent a car|cancel|don't|do not)\b", re.IGNORECASE)
+
+# Words that end a city name
+_DATE_WORDS = "|".join(list(MONTHS) + WEEKDAYS)
+CITY_END = (rf"(?=\s+(?:to|from|on|for|this|next|tomorrow|today|tonight|in|departing|leaving|"
+            rf"around|with|and|the|{_DATE_WORDS})\b|\s+\d|[,.?!]|$)")
+FROM_CITY = re.compile(rf"\bfrom\s+(?P<city>[A-Za-z.'\- ]+?){CITY_END}", re.IGNORECASE)
+TO_CITY = re.compile(rf"\b(?:to|into)\s+(?P<city>[A-Za-z.'\- ]+?){CITY_END}", re.IGNORECASE)
+
+_NUMBER = "|".join(["\\d+"] + list(NUMBER_WORDS))
+PASSENGERS = re.compile(
+    rf"\b(?:for\s+)?(?P<count>{_NUMBER})\s+(?:people|persons|passengers|adults|travell?ers|tickets|seats|of us|guests)\b",
+    re.IGNORECASE)
+PASSENGERS_FOR = re.compile(rf"\bfor\s+(?P<count>{_NUMBER})\b(?!\s*(?:am|pm|o'clock|days?|nights?|weeks?))",
+                            re.IGNORECASE)
+SINGLE_PASSENGER = re.compile(r"\b(?:for me|just me|only me|for myself|by myself)\b(?!\s+and\b)", re.IGNORECASE)
+GROUP_PASSENGERS = re.compile(r"\b(?:for us|me and|and me|my (?:family|wife|husband|kids|partner))\b",
+                              re.IGNORECASE)
+
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_DAY = "|".join(["\\d{1,2}(?:st|nd|rd|th)?"] + sorted(ORDINAL_WORDS, key=len, reverse=True))
+ISO_DATE = re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b")
+SLASH_DATE = re.compile(r"\b(?P<month>\d{1,2})/(?P<day>\d{1,2})(?:/(?P<year>\d{2,4}))?\b")
+MONTH_DAY = re.compile(rf"\b(?P<month>{_MONTH})\.?\s+(?:the\s+)?(?P<day>{_DAY})\b(?:,?\s+(?P<year>\d{{4}}))?",
+                       re.IGNORECASE)
+DAY_MONTH = re.compile(rf"\b(?:the\s+)?(?P<day>{_DAY})\s+(?:of\s+)?(?P<month>{_MONTH})\b(?:,?\s+(?P<year>\d{{4}}))?",
+                       re.IGNORECASE)
+DAY_ONLY = re.compile(rf"\bon\s+the\s+(?P<day>{_DAY})\b", re.IGNORECASE)
+RELATIVE_DAY = re.compile(r"\b(?P<word>day after tomorrow|tomorrow|today|tonight)\b", re.IGNORECASE)
+WEEKDAY = re.compile(rf"\b(?P<which>this|next|on|coming)?\s*(?P<weekday>{'|'.join(WEEKDAYS)})\b", re.IGNORECASE)
+
+def _clean(text: str) -> str:
+    """Collapse whitespace and strip filler and trailing punctuation"""
+    text = " ".join(text.split()).strip(" .!?")
+    previous = None
+    while previous != text:
+        previous = text
+        text = LEADING_FILLER.sub("", text)
+        text = TRAILING_FILLER.sub("", text).strip(" .!?,")
+    return text
+
+def _sentence(text: str) -> str:
+    """Text with its first letter capitalized"""
+    text = text.strip(" ,")
+    return text[:1].upper() + text[1:]
+
+def _number(word: str) -> Optional[int]:
+    if word.isdigit():
+        return int(word)
+    return NUMBER_WORDS.get(word.lower())
+
+def _day(word: str) -> Optional[int]:
+    digits = re.match(r"\d+", word)
+    if digits:
+        return int(digits.group())
+    return ORDINAL_WORDS.get(word.lower())
+
+def resolve_recipient(text: str) -> Tuple[Optional[str], float]:
+    """
+    Email address for a spoken recipient.
+    
+    Args:
+        text: Recipient as dictated ("Nathan", "nathan@example.com",
+            "nathan dot tran at gmail dot com")
+    
+    Returns:
+        (address, confidence), or (None, 0.0) for unknown names and
+        multiple recipients
+    """
+    text = text.strip(" ,.")
+    text = re.sub(r"^(?:my (?:friend|colleague|boss|teammate)\s+)", "", text, flags=re.IGNORECASE)
+    if EMAIL_ADDRESS.match(text):
+        return text.lower(), 1.0
+    spoken = SPOKEN_ADDRESS.match(text)
+    if spoken:
+        user = re.sub(r"\s+dot\s+", ".", spoken.group("user"), flags=re.IGNORECASE)
+        domain = re.sub(r"\s+dot\s+", ".", spoken.group("domain"), flags=re.IGNORECASE)
+        return f"{user}@{domain}".lower().replace(" ", ""), 0.9
+    address = CONTACTS.get(text.lower())
+    if address:
+        return address, 0.95
+    return None, 0.0
+
+def parse_email(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Fields of a dictated email command.
+    
+    Returns:
+        {data, fields, instruction} with a confidence per field (0 for
+        missing ones) and the text before the dictated subject and body,
+        or None if the text isn't an email command
+    """
+    intent_confidence = 1.0
+    recipient = None
+    match = EMAIL_INDIRECT.match(text)
+    if match:
+        recipient, rest = match.group("recipient"), match.group("rest")
+        rest = " " + rest
+    else:
+        match = EMAIL_INTENT.match(text) or EMAIL_VERB.match(text)
+        if not match:
+            return None
+        if match.groupdict().get("noun", "email").lower() in ("message", "note"):
+            # Could be a text message; email is the only kind the actions support
+            intent_confidence = 0.85
+        rest = match.group("rest")
+    
+    # Split at the first subject or body marker; the body runs to the end
+    subject = body = None
+    markers = list(MARKER.finditer(rest))
+    if recipient is None:
+        if not markers:
+            recipient, rest, markers = rest, "", []
+        else:
+            recipient = rest[:markers[0].start()]
+    instruction = text[:len(text) - len(rest) + markers[0].start()] if markers else text
+    for index, marker in enumerate(markers):
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(rest)
+        if marker.group("body"):
+            body = rest[marker.end():]
+            # An explicit "with subject ..." can still follow the body
+            explicit = EXPLICIT_SUBJECT.search(body)
+            if explicit and subject is None:
+                subject = body[explicit.end():]
+                body = body[:explicit.start()]
+            break
+        if subject is None:
+            subject = rest[marker.end():end]
+    
+    address, recipient_confidence = resolve_recipient(recipient)
+    fields = {"recipient": recipient_confidence, "subject": 0.0, "body": 0.0}
+    data = {"recipient": address or recipient.strip(" ,"), "subject": "", "body": "", "senders_name": SENDER_NAME}
+    if subject:
+        subject = re.sub(r"^(?:the|a|an)\s+", "", subject.strip(" ,"), flags=re.IGNORECASE)
+        data["subject"] = _sentence(subject)
+        fields["subject"] = 0.95 if len(subject.split()) <= 8 else 0.75
+    if body:
+        body = re.sub(r"^that\s+", "", body.strip(" ,"), flags=re.IGNORECASE)
+        data["body"] = _sentence(body)
+        fields["body"] = (0.6 if COMPOUND.search(body) else 0.95) if body else 0.0
+    fields = {name: min(confidence, intent_confidence) for name, confidence in fields.items()}
+    return {"data": data, "fields": fields, "instruction": instruction}
+
+def parse_city(text: str) -> Tuple[Optional[str], float]:
+    """
+    City name for a spoken city or airport code.
+    
+    Returns:
+        (city, confidence), or (None, 0.0) if it doesn't look like a city
+    """
+    text = re.sub(r"^the\s+", "", text.strip(" ,"), flags=re.IGNORECASE)
+    code = text.replace(".", "").replace(" ", "")
+    if code.upper() in CITY_CODES and len(code) == 3 and (code.isupper() or "." in text):
+        return CITY_CODES[code.upper()], 1.0
+    alias = CITY_ALIASES.get(text.lower().replace(".", ""))
+    if alias:
+        return alias, 0.95
+    words = text.split()
+    if not words or len(words) > 3:
+        return None, 0.0
+    name = " ".join(word.capitalize() for word in words)
+    if name in KNOWN_CITIES:
+        return name, 1.0
+    # Unknown places are trusted when the recognizer capitalized them as names
+    if all(word[:1].isupper() for word in words) and all(word.lower() not in WEEKDAYS + list(MONTHS) for word in words):
+        return text, 0.85
+    return None, 0.0
+
+def _future(date: datetime.date, today: datetime.date, year_given: bool) -> datetime.date:
+    """A date without a year is the next one that isn't in the past"""
+    if not year_given and date < today:
+        return date.replace(year=date.year + 1)
+    return date
+
+def parse_date(text: str, today: datetime.date) -> Tuple[Optional[str], float]:
+    """
+    Departure date mentioned in a command.
+    
+    Args:
+        text: Command text
+        today: Date the command was given, for relative dates
+    
+    Returns:
+        (ISO date, confidence), or (None, 0.0) if no date was found
+    """
+    try:
+        for pattern, confidence in ((ISO_DATE, 1.0), (MONTH_DAY, 1.0), (DAY_MONTH, 1.0), (SLASH_DATE, 0.85)):
+            match = pattern.search(text)
+            if not match:
+                continue
+            month = match.group("month")
+            month = int(month) if month.isdigit() else MONTHS[month.lower().rstrip(".")]
+            day = _day(match.group("day"))
+            year = match.group("year")
+            year = int(year) + (2000 if year and len(year) == 2 else 0) if year else today.year
+            date = _future(datetime.date(year, month, day), today, match.group("year") is not None)
+            return date.isoformat(), confidence
+        
+        match = RELATIVE_DAY.search(text)
+        if match:
+            offset = {"today": 0, "tonight": 0, "tomorrow": 1, "day after tomorrow": 2}[match.group("word").lower()]
+            return (today + datetime.timedelta(days=offset)).isoformat(), 1.0
+        
+        match = WEEKDAY.search(text)
+        if match:
+            days_ahead = (WEEKDAYS.index(match.group("weekday").lower()) - today.weekday() - 1) % 7 + 1
+            # "next Friday" means this coming Friday to some people and the one after to others
+            confidence = 0.7 if (match.group("which") or "").lower() == "next" else 0.9
+            return (today + datetime.timedelta(days=days_ahead)).isoformat(), confidence
+        
+        match = DAY_ONLY.search(text)
+        if match:
+            day = _day(match.group("day"))
+            date = today.replace(day=day)
+            if date < today:
+                date = (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=day)
+            return date.isoformat(), 0.85
+    except (ValueError, TypeError):
+        # Impossible dates like February 30th
+        pass
+    return None, 0.0
+
+def parse_passengers(text: str) -> Tuple[int, float]:
+    """
+    Number of passengers in a command.
+    
+    Returns:
+        (count, confidence); one passenger at reduced confidence when none
+        is mentioned
+    """
+    match = PASSENGERS.search(text)
+    if match:
+        return _number(match.group("count")), 1.0
+    match = PASSENGERS_FOR.search(text)
+    if match:
+        return _number(match.group("count")), 0.9
+    if GROUP_PASSENGERS.search(text):
+        return 2, 0.5
+    if SINGLE_PASSENGER.search(text):
+        return 1, 0.95
+    return 1, 0.85
+
+def parse_flight(text: str, today: datetime.date) -> Optional[Dict[str, Any]]:
+    """
+    Fields of a flight search command.
+    
+    Returns:
+        {data, fields} with a confidence per field (0 for missing ones),
+        or None if the text isn't a flight command
+    """
+    if not FLIGHT_INTENT.search(text):
+        return None
+    
+    from_city, from_confidence = None, 0.0
+    match = FROM_CITY.search(text)
+    if match:
+        from_city, from_confidence = parse_city(match.group("city"))
+    to_city, to_confidence = None, 0.0
+    for match in TO_CITY.finditer(text):
+        to_city, to_confidence = parse_city(match.group("city"))
+        if to_city:
+            break
+    departure_date, date_confidence = parse_date(text, today)
+    passengers, passenger_confidence = parse_passengers(text)
+    
+    data = {
+        "from_city": from_city or "",
+        "to_city": to_city or "",
+        "departure_date": departure_date or "",
+        "num_passengers": passengers
+    }
+    fields = {
+        "from_city": from_confidence,
+        "to_city": to_confidence if to_city != from_city else 0.0,
+        "departure_date": date_confidence,
+        "num_passengers": passenger_confidence
+    }
+    return {"data": data, "fields": fields}
+
+def parse_command(text: str, today: Optional[datetime.date] = None) -> Optional[Dict[str, Any]]:
+    """
+    Classify a command and extract its fields without the LLM.
+    
+    Args:
+        text: Transcribed command
+        today: Date of the command for relative dates (default: today)
+    
+    Returns:
+        Dictionary with request_type ('email' or 'flight'), data (the
+        fields prompt_perplexity would return), fields (confidence per
+        field), missing (required fields not found) and confidence (the
+        weakest field's), or None if no known command shape matched
+    """
+    today = today or datetime.date.today()
+    text = _clean(text or "")
+    if not text:
+        return None
+    
+    email = parse_email(text)
+    flight = parse_flight(text, today)
+    if email and flight and FLIGHT_INTENT.search(email["instruction"]):
+        # e.g. "email Nathan the flight times": leave it to the LLM
+        result, request_type = email, "email"
+        result["fields"] = {name: 0.0 for name in result["fields"]}
+    elif email:
+        # Flight words in the dictated subject or body don't make it a flight search
+        result, request_type = email, "email"
+    elif flight:
+        result, request_type = flight, "flight"
+        if OTHER_INTENT.search(text):
+            result["fields"] = {name: min(confidence, 0.5) for name, confidence in result["fields"].items()}
+    else:
+        return None
+    
+    fields = result["fields"]
+    return {
+        "request_type": request_type,
+        "data": result["data"],
+        "fields": fields,
+        "missing": [name for name, confidence in fields.items() if confidence == 0.0],
+        "confidence": min(fields.values())
+    }
+
+def _normalize(value: Any) -> str:
+    """Field value for comparison: case, surrounding punctuation and articles don't count"""
+    text = str(value).lower().strip().strip(string.punctuation)
+    return re.sub(r"^(?:the|a|an)\s+", "", " ".join(text.split()))
+
+def load_metadata(paths):
+    """(command text, date) of each recorded interaction"""
+    commands = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                interaction = json.load(f)["interaction"]
+            text = interaction["command"]["text"]
+            recorded = datetime.datetime.fromisoformat(interaction["iso_time"]).date()
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        if text:
+            commands.append((text, recorded))
+    return commands
+
+def evaluate(entries, threshold, llm_latency, show=False):
+    """
+    Run the parser over commands and print hit rate, accuracy and latency saved.
+    
+    Args:
+        entries: List of (text, date, expected) where expected is the labelled
+            {request_type, data} or None when the fast path should escalate,
+            or the string 'unlabelled'
+        threshold: Confidence needed to skip the LLM
+        llm_latency: Seconds an LLM classification takes, for the savings
+        show: Print each command's outcome
+    """
+    hits = correct = wrong = missed = 0
+    labelled = sum(1 for _, _, expected in entries if expected != 'unlabelled')
+    parse_times = []
+    for text, date, expected in entries:
+        start_time = time.perf_counter()
+        result = parse_command(text, date)
+        parse_times.append(time.perf_counter() - start_time)
+        hit = result is not None and result["confidence"] >= threshold
+        hits += hit
+        verdict = "hit" if hit else "llm"
+        if expected != 'unlabelled':
+            if hit:
+                agrees = (expected is not None and result["request_type"] == expected["request_type"] and
+                          all(_normalize(result["data"].get(name)) == _normalize(value)
+                              for name, value in expected["data"].items()))
+                correct += agrees
+                wrong += not agrees
+                verdict = "hit" if agrees else "WRONG"
+            elif expected is not None:
+                missed += 1
+        if show:
+            detail = (f"{result['request_type']} {result['confidence']:.2f} {result['data']}" if result
+                      else "no match")
+            if result and result["missing"]:
+                detail += f" missing {result['missing']}"
+            print(f"  [{verdict:5s}] {text!r}\n          {detail}")
+    
+    parse_times = np.array(parse_times) * 1e6
+    total = len(entries)
+    print(f"{total} commands: {hits} on the fast path ({hits / max(1, total) * 100:.0f}%), "
+          f"{total - hits} escalated to the LLM")
+    if labelled:
+        should_hit = sum(1 for _, _, expected in entries if expected not in (None, 'unlabelled'))
+        print(f"  labelled: {correct} correct and {wrong} wrong fast path results, "
+              f"{missed} of {should_hit} parseable commands escalated")
+    print(f"  parse time mean {parse_times.mean():.0f} us, p95 {np.percentile(parse_times, 95):.0f} us; "
+          f"saves {hits * llm_latency:.0f} s of LLM time at {llm_latency:.1f} s per call "
+          f"({hits * llm_latency / max(1, total):.2f} s per command on average)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('metadata', nargs='*', default=['../frontend/temp/metadata_*.json'],
+                        help="Recorded metadata files or glob patterns")
+    parser.add_argument('--corpus', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         'command_corpus.jsonl'),
+                        help="Labelled commands (JSON lines with text, today and expected)")
+    parser.add_argument('--threshold', type=float, default=FAST_PATH_CONFIDENCE, help="Fast path confidence")
+    parser.add_argument('--llm-latency', type=float, default=5.0,
+                        help="Seconds per LLM classification (see 'Query time' in the API log)")
+    parser.add_argument('--show', action='store_true', help="Print the outcome of every command")
+    args = parser.parse_args()
+    
+    if args.corpus and os.path.exists(args.corpus):
+        entries = []
+        with open(args.corpus) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.append((entry["text"], datetime.date.fromisoformat(entry["today"]), entry["expected"]))
+        print(f"Corpus {args.corpus}:")
+        evaluate(entries, args.threshold, args.llm_latency, args.show)
+    
+    paths = sorted({path for pattern in args.metadata for path in glob.glob(pattern)})
+    commands = load_metadata(paths)
+    if commands:
+        print(f"\nRecorded commands from {len(paths)} metadata files:")
+        evaluate([(text, date, 'unlabelled') for text, date in commands], args.threshold, args.llm_latency, args.show)
+    else:
+        print("\nNo recorded metadata files found")
+
+if __name__ == '__main__':
+    main()
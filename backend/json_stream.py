@@ -0,0 +1,124 @@
+"""
+Incremental extraction of a JSON object from a streamed LLM response.
+
+sonar-reasoning-pro streams its reasoning in a <think>...</think> segment
+before the answer, and may add text after it. JSONObjectExtractor is fed
+the content deltas as they arrive. It skips reasoning segments with a
+substring search, scans only the answer for the first '{' and tracks the
+nesting depth (outside of strings) from there, so it knows the moment the
+top-level object closes and the rest of the stream can be cancelled.
+Tags and escapes split across deltas are carried over to the next feed().
+"""
+import re
+from typing import Optional
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Where scanning outside an object has to stop: an object or a possible tag
+_INTERESTING = re.compile(r"[{<]")
+
+class JSONObjectExtractor:
+    """Finds the first complete top-level JSON object in streamed text"""
+
+    def __init__(self):
+        self.text_parts = []
+        self.object_parts = []
+        self.result = None
+        self.skipped_chars = 0
+        self._pending = ""
+        self._in_think = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return "".join(self.text_parts)
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Consume the next piece of the response.
+
+        Args:
+            chunk: Content delta from the stream
+
+        Returns:
+            The JSON object text once it is complete (and on every later
+            call), None while it isn't
+        """
+        if self.result is not None or not chunk:
+            return self.result
+        self.text_parts.append(chunk)
+        text = self._pending + chunk
+        self._pending = ""
+        position = 0
+        length = len(text)
+        while position < length:
+            if self._in_think:
+                end = text.find(THINK_CLOSE, position)
+                if end < 0:
+                    # Keep what could be the start of a split closing tag
+                    keep = min(len(THINK_CLOSE) - 1, length - position)
+                    self.skipped_chars += length - position - keep
+                    self._pending = text[length - keep:]
+                    return None
+                self.skipped_chars += end + len(THINK_CLOSE) - position
+                position = end + len(THINK_CLOSE)
+                self._in_think = False
+            elif self._depth == 0:
+                match = _INTERESTING.search(text, position)
+                if not match:
+                    return None
+                position = match.start()
+                if text[position] == "{":
+                    self._depth = 1
+                    self.object_parts.append("{")
+                    position += 1
+                elif text.startswith(THINK_OPEN, position):
+                    self._in_think = True
+                    position += len(THINK_OPEN)
+                elif THINK_OPEN.startswith(text[position:]):
+                    # A tag split across deltas
+                    self._pending = text[position:]
+                    return None
+                else:
+                    position += 1
+            else:
+                position = self._scan_object(text, position)
+                if self.result is not None:
+                    return self.result
+        return None
+
+    def _scan_object(self, text: str, position: int) -> int:
+        """Follow the object's nesting until it closes or the text ends"""
+        start = position
+        in_string, escape, depth = self._in_string, self._escape, self._depth
+        for position in range(position, len(text)):
+            character = text[position]
+            if escape:
+                escape = False
+            elif in_string:
+                if character == "\\":
+                    escape = True
+                elif character == '"':
+                    in_string = False
+            elif character == '"':
+                in_string = True
+            elif character == "{" or character == "[":
+                depth += 1
+            elif character == "}" or character == "]":
+                depth -= 1
+                if depth == 0:
+                    self.object_parts.append(text[start:position + 1])
+                    self.result = "".join(self.object_parts)
+                    self._depth = 0
+                    return position + 1
+        self.object_parts.append(text[start:])
+        self._in_string, self._escape, self._depth = in_string, escape, depth
+        return len(text)
@@ -0,0 +1,170 @@
+"""
+Load test for the voice command API.
+
+Sends batches of concurrent commands to /voice/command and reports
+throughput and latency per concurrency level. By default the API runs
+in-process against mock_services.py (mock LLM and action server), so no
+API key or action server is needed and the LLM round-trip is a fixed
+delay: when commands are handled concurrently, throughput grows with the
+concurrency level; when the event loop is blocked, it stays at one command
+per LLM delay. The rule-based fast path and the command cache are off
+unless --fast-path and --cache are given, so every command goes through
+the (mock) LLM. Every command carries its own Idempotency-Key, so the
+backend doesn't coalesce the repeated test commands with each other and
+each one is handled. With --duplicates every command is delivered twice
+with the same key, like the frontend's metadata and confirmation
+requests, to /voice/command and /command.
+
+Usage:
+    python load_test.py [--concurrency 1 4 16 32] [--requests 32] [--llm-delay 1.0]
+    python load_test.py --url http://localhost:8000   # an already running API
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+import uvicorn
+
+import mock_services
+
+COMMANDS = [
+    "send an email to nathan about the meeting saying can we meet tomorrow at noon",
+    "find me a flight from SFO to New York on April first for two people",
+]
+
+def command_payload(text):
+    """Request body in the format the frontend posts"""
+    return {"interaction": {"command": {"text": text}}}
+
+def free_port():
+    """A port that is free right now"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_api(port):
+    """Run the command API with uvicorn on a daemon thread and wait until it answers"""
+    import sanitization
+    
+    server = uvicorn.Server(uvicorn.Config(sanitization.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("API server did not start")
+        time.sleep(0.05)
+    return server
+
+async def run_level(client, url, concurrency, total, duplicates=False):
+    """
+    Send total commands with at most concurrency in flight.
+    
+    With duplicates, each command is also sent to /command with the same
+    idempotency key; the latency covers both deliveries.
+    
+    Returns:
+        (wall time in seconds, latencies in seconds, failed count)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failed = 0
+    
+    async def post(target, payload, headers):
+        nonlocal failed
+        try:
+            response = await client.post(target, json=payload, headers=headers)
+            if response.status_code != 200 or response.json().get("status") != "success":
+                failed += 1
+        except httpx.HTTPError:
+            failed += 1
+    
+    async def send(index):
+        async with semaphore:
+            start_time = time.perf_counter()
+            payload = command_payload(COMMANDS[index % len(COMMANDS)])
+            headers = {"Idempotency-Key": f"load-test-{uuid.uuid4().hex}"}
+            if duplicates:
+                await asyncio.gather(post(url, payload, headers),
+                                     post(url.replace("/voice/command", "/command"), payload, headers))
+            else:
+                await post(url, payload, headers)
+            latencies.append(time.perf_counter() - start_time)
+    
+    start_time = time.perf_counter()
+    await asyncio.gather(*(send(index) for index in range(total)))
+    return time.perf_counter() - start_time, latencies, failed
+
+async def run(url, levels, total, duplicates=False):
+    connections = max(levels) * (2 if duplicates else 1)
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    results = []
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        for concurrency in levels:
+            wall_time, latencies, failed = await run_level(client, url, concurrency, total, duplicates)
+            latencies = np.array(latencies) * 1000
+            throughput = total / wall_time
+            results.append((concurrency, throughput))
+            print(f"concurrency {concurrency:3d}: {total} commands in {wall_time:6.2f} s, "
+                  f"{throughput:6.2f} commands/s, latency p50 {np.percentile(latencies, 50):6.0f} ms "
+                  f"p95 {np.percentile(latencies, 95):6.0f} ms, {failed} failed")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help="Base URL of a running API (default: start one on mocks)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32],
+                        help="Concurrency levels to test")
+    parser.add_argument('--requests', type=int, default=32, help="Commands sent per level")
+    parser.add_argument('--llm-delay', type=float, default=1.0, help="Mock LLM response time in seconds")
+    parser.add_argument('--action-delay', type=float, default=0.05, help="Mock action response time in seconds")
+    parser.add_argument('--fast-path', action='store_true', help="Classify parseable commands without the LLM")
+    parser.add_argument('--cache', action='store_true', help="Reuse LLM results for repeated commands")
+    parser.add_argument('--duplicates', action='store_true', help="Deliver every command twice with one idempotency key")
+    args = parser.parse_args()
+    
+    mock = api = None
+    base_url = args.url
+    if base_url is None:
+        mock = mock_services.start_in_background(mock_services.create_server(
+            llm_delay=args.llm_delay, action_delay=args.action_delay))
+        # Read by sanitization at import
+        os.environ["PERPLEXITY_BASE_URL"] = mock.base_url
+        os.environ["ACTION_SERVER_URL"] = mock.base_url
+        os.environ.setdefault("perplexity_Key", "mock-key")
+        os.environ["FAST_PATH"] = "1" if args.fast_path else "0"
+        os.environ["COMMAND_CACHE_TTL"] = os.environ.get("COMMAND_CACHE_TTL", "3600") if args.cache else "0"
+        port = free_port()
+        api = start_api(port)
+        base_url = f"http://127.0.0.1:{port}"
+        print(f"API on {base_url}, mock LLM {args.llm_delay * 1000:.0f} ms, "
+              f"mock actions {args.action_delay * 1000:.0f} ms")
+    
+    try:
+        results = asyncio.run(run(f"{base_url.rstrip('/')}/voice/command", args.concurrency, args.requests,
+                                  args.duplicates))
+    finally:
+        if api is not None:
+            api.should_exit = True
+        if mock is not None:
+            mock.shutdown()
+            mock.server_close()
+    
+    base_throughput = results[0][1]
+    print()
+    for concurrency, throughput in results:
+        print(f"concurrency {concurrency:3d}: {throughput / base_throughput:5.1f}x the throughput "
+              f"of concurrency {results[0][0]}")
+    if mock is not None:
+        commands = args.requests * len(args.concurrency)
+        print(f"Mock served {mock.stats['llm']} completions and {mock.stats['action']} actions for {commands} "
+              f"commands{' delivered twice' if args.duplicates else ''}, "
+              f"at most {mock.stats['max_in_flight']} requests at once")
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
 from fastapi import FastAPI
-from sanitization import prompt_perplexity
+from sanitization import lifespan, prompt_perplexity
 import os
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root():
@@ -11,7 +11,7 @@ async def root():
 @app.post("/main")
 async def brain(prompt: str):
 
-    sanitized_steps = prompt_perplexity(prompt)
+    sanitized_steps = await prompt_perplexity(prompt)
 
     url = "http://localhost:3000/task/start"
     payload = {"task": sanitized_steps}
@@ -0,0 +1,247 @@
+"""
+Local stand-ins for the services the command API calls.
+
+One server answers both sides of a command:
+
+- POST .../chat/completions like the Perplexity (OpenAI-compatible) API,
+  with a classification JSON chosen from the prompt after a configurable
+  delay, optionally wrapped in <think> reasoning and followed by more text
+  like sonar-reasoning-pro, and streamed token by token as server-sent
+  events when the request asks for "stream"
+- POST /email/send and /flight/search like the action server on port 3000
+
+It counts requests per route and the most requests it had in flight at
+once, which shows whether the API sends commands concurrently or one at a
+time. Point the backend at it with
+PERPLEXITY_BASE_URL=http://127.0.0.1:PORT and ACTION_SERVER_URL=http://127.0.0.1:PORT.
+
+Usage:
+    python mock_services.py [--port 8200] [--llm-delay 1.0] [--action-delay 0.05]
+                            [--token-delay 0.01 --think-tokens 300 --trailing-tokens 100]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMAIL_RESULT = {
+    "request_type": "email",
+    "data": {
+        "recipient": "nathan.tran04@sjsu.edu",
+        "subject": "Meeting",
+        "body": "Can we meet tomorrow at noon?",
+        "senders_name": "Ava"
+    }
+}
+
+FLIGHT_RESULT = {
+    "request_type": "flight",
+    "data": {
+        "from_city": "San Francisco",
+        "to_city": "New York",
+        "departure_date": "2025-04-01",
+        "num_passengers": 2
+    }
+}
+
+REASONING = ("The user wants me to classify this request . It mentions the recipient and what to "
+             "say , so I should check which fields are present and convert the names . ").split()
+TRAILER = ("This request was classified from the wording of the command ; the fields were "
+           "extracted directly and cities were expanded to their full names . ").split()
+
+def completion_tokens(result, think_tokens, trailing_tokens):
+    """
+    Content of a completion split into tokens.
+    
+    Args:
+        result: Classification dictionary the answer contains
+        think_tokens: Reasoning words in a <think> segment before the answer
+        trailing_tokens: Words of explanation after the answer
+    
+    Returns:
+        List of token strings
+    """
+    tokens = []
+    if think_tokens:
+        words = [REASONING[index % len(REASONING)] for index in range(think_tokens)]
+        tokens += ["<think>"] + [f" {word}" for word in words] + ["</think>\n"]
+    answer = json.dumps(result, indent=2)
+    tokens += [answer[index:index + 4] for index in range(0, len(answer), 4)]
+    tokens += [f" {TRAILER[index % len(TRAILER)]}" for index in range(trailing_tokens)]
+    return tokens
+
+class MockServicesHandler(BaseHTTPRequestHandler):
+    """Request handler; behaviour comes from the server's settings"""
+    
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        """Keep the console quiet"""
+    
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _tokens(self, request):
+        """Completion tokens for a request, with the classification matching its prompt"""
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        result = FLIGHT_RESULT if "flight" in prompt.lower() else EMAIL_RESULT
+        return completion_tokens(result, self.server.think_tokens, self.server.trailing_tokens)
+    
+    def _completion(self, request, tokens):
+        """OpenAI-style chat completion with the whole content"""
+        return {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "".join(tokens)}
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+        }
+    
+    def _stream(self, request, tokens):
+        """Send the tokens as chat.completion.chunk events, token_delay apart"""
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": "mock-completion",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        
+        sent = 0
+        try:
+            event({"role": "assistant", "content": ""})
+            for token in tokens:
+                time.sleep(server.token_delay)
+                event({"content": token})
+                sent += 1
+            event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with server.lock:
+                server.stats['streams_cancelled'] += 1
+        finally:
+            with server.lock:
+                server.stats['tokens_sent'] += sent
+    
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.rstrip('/')
+        if path.endswith('/chat/completions'):
+            route, delay = 'llm', server.llm_delay
+        elif path in ('/email/send', '/flight/search'):
+            route, delay = 'action', server.action_delay
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+        
+        with server.lock:
+            server.stats[route] += 1
+            server.in_flight += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.in_flight)
+        try:
+            if route == 'llm':
+                request = json.loads(body or b"{}")
+                tokens = self._tokens(request)
+                if request.get("stream"):
+                    # The delay is the time to the first token
+                    time.sleep(delay)
+                    self._stream(request, tokens)
+                else:
+                    time.sleep(delay + server.token_delay * len(tokens))
+                    self._send_json(200, self._completion(request, tokens))
+            else:
+                time.sleep(delay)
+                self._send_json(200, {"status": "ok"})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+class MockServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer with room for a burst of concurrent connections"""
+    
+    daemon_threads = True
+    # The default backlog of 5 makes extra connections wait for a SYN retry
+    request_queue_size = 128
+
+def create_server(port=0, llm_delay=1.0, action_delay=0.05, token_delay=0.0, think_tokens=0, trailing_tokens=0):
+    """
+    Create a mock LLM and action server.
+    
+    Args:
+        port: Port to listen on (0 picks a free one)
+        llm_delay: Response time of chat completions in seconds
+        action_delay: Response time of the email and flight endpoints
+        token_delay: Generation time per completion token
+        think_tokens: Reasoning words before the classification
+        trailing_tokens: Words of explanation after the classification
+    
+    Returns:
+        MockServer with a 'stats' dictionary (llm, action, max_in_flight,
+        tokens_sent, streams_cancelled) and a 'base_url' attribute
+    """
+    server = MockServer(('127.0.0.1', port), MockServicesHandler)
+    server.llm_delay = llm_delay
+    server.action_delay = action_delay
+    server.token_delay = token_delay
+    server.think_tokens = think_tokens
+    server.trailing_tokens = trailing_tokens
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.stats = {'llm': 0, 'action': 0, 'max_in_flight': 0, 'tokens_sent': 0, 'streams_cancelled': 0}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+def start_in_background(server):
+    """Serve requests on a daemon thread and return the server"""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--llm-delay', type=float, default=1.0, help="Chat completion response time in seconds")
+    parser.add_argument('--action-delay', type=float, default=0.05, help="Action endpoint response time in seconds")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Generation time per completion token")
+    parser.add_argument('--think-tokens', type=int, default=0, help="Reasoning words before the answer")
+    parser.add_argument('--trailing-tokens', type=int, default=0, help="Words after the answer")
+    args = parser.parse_args()
+    
+    server = create_server(args.port, args.llm_delay, args.action_delay, args.token_delay,
+                           args.think_tokens, args.trailing_tokens)
+    print(f"Mock LLM and action server at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats['llm']} completions and {server.stats['action']} actions, "
+              f"at most {server.stats['max_in_flight']} at once")
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,104 @@
 import os
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Tuple, Any
 from dotenv import load_dotenv
 import uvicorn
 import json
 import time  # Import the time module for measuring elapsed time
-from openai import OpenAI
-import requests
+import httpx
+from openai import AsyncOpenAI
 from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from datetime import datetime
+from command_parser import FAST_PATH_CONFIDENCE, parse_command
+from command_cache import CommandCache, command_key
+from json_stream import JSONObjectExtractor
+from single_flight import SingleFlight
 
 load_dotenv()
 
 perplexity_key = os.getenv("perplexity_Key")
 
-client = OpenAI(api_key=perplexity_key, base_url="https://api.perplexity.ai")
+# Base URLs of the LLM API and the action server (override to point at mocks)
+PERPLEXITY_BASE_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+ACTION_SERVER_URL = os.getenv("ACTION_SERVER_URL", "http://localhost:3000")
+
+# Classify unambiguous commands with the rule-based parser instead of the LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "1") != "0"
+classifier_stats = {"fast_path": 0, "llm": 0}
+
+# LLM classifications by normalized command; COMMAND_CACHE_TTL=0 disables it and
+# COMMAND_CACHE_PATH keeps it in a SQLite file across restarts
+command_cache = CommandCache(
+    max_entries=int(os.getenv("COMMAND_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("COMMAND_CACHE_TTL", "3600")),
+    path=os.getenv("COMMAND_CACHE_PATH") or None
+)
+
+# Duplicate deliveries of a command share one classification and one action:
+# requests with an Idempotency-Key are matched by key for IDEMPOTENCY_WINDOW
+# seconds, others by normalized command text while the first one is running
+# and for COALESCE_WINDOW seconds after (default none: a command the user
+# repeats on purpose runs again). Only successful results are reused once
+# they finish
+IDEMPOTENCY_WINDOW = float(os.getenv("IDEMPOTENCY_WINDOW", "600"))
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))
+command_flights = SingleFlight(window=COALESCE_WINDOW, keep=lambda result: result["status"] == "success")
+
+# One connection pool shared by the LLM client and the action forwarding, so
+# concurrent commands reuse kept-alive connections instead of opening new ones
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16)
+LLM_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+ACTION_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Stream the classification and stop reading once its JSON object is complete
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") != "0"
+LLM_MODEL = "sonar-reasoning-pro"
+
+# Created on first use inside the running event loop and closed on shutdown
+http_client: Optional[httpx.AsyncClient] = None
+client: Optional[AsyncOpenAI] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The shared async HTTP client, created on first use
+    """
+    global http_client, client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=ACTION_TIMEOUT)
+        # The LLM client is rebuilt on the new pool
+        client = None
+    return http_client
+
+def get_llm_client() -> AsyncOpenAI:
+    """
+    The async Perplexity client, sending through the shared HTTP client
+    """
+    global client
+    pool = get_http_client()
+    if client is None:
+        client = AsyncOpenAI(api_key=perplexity_key, base_url=PERPLEXITY_BASE_URL,
+                             timeout=LLM_TIMEOUT, http_client=pool)
+    return client
+
+async def close_clients():
+    """
+    Close the shared HTTP client and its pooled connections
+    """
+    global http_client, client
+    if http_client is not None:
+        await http_client.aclose()
+    http_client = None
+    client = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_clients()
+    command_cache.close()
 
 # Initialize FastAPI app
-app = FastAPI(title="Voice Command API", description="API for processing voice commands")
+app = FastAPI(title="Voice Command API", description="API for processing voice commands", lifespan=lifespan)
 
 class CommandResponse(BaseModel):
     status: str
@@ -25,7 +106,45 @@ class CommandResponse(BaseModel):
     command_text: str
     processed_data: Dict[str, Any]
 
-def prompt_perplexity(task: str) -> Tuple[str, Any]:
+async def stream_completion(messages: List[Dict[str, str]]) -> str:
+    """
+    Stream a completion until the first JSON object in it is complete
+    
+    The <think> reasoning is skipped as it arrives and the rest of the
+    stream is cancelled once the object closes.
+    
+    Returns:
+        The JSON object text, or the whole response if none was complete
+    """
+    extractor = JSONObjectExtractor()
+    start_time = time.perf_counter()
+    first_token_time = None
+    stream = await get_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=messages,
+        stream=True
+    )
+    try:
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if not content:
+                continue
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start_time
+            if extractor.feed(content):
+                break
+    finally:
+        # Closes the connection, so the server stops generating the rest
+        await stream.close()
+    
+    elapsed_time = time.perf_counter() - start_time
+    first_token = f"{first_token_time:.2f}" if first_token_time is not None else "-"
+    print(f"Streamed classification: first token {first_token}s, JSON complete {elapsed_time:.2f}s, "
+          f"{extractor.skipped_chars} reasoning characters skipped"
+          f"{', rest of the stream cancelled' if extractor.done else ', no complete JSON object'}")
+    return extractor.result or extractor.text
+
+async def prompt_perplexity(task: str) -> Tuple[str, Any]:
     content = """
     You are a classification AI that categorizes user requests into specific types. Your ONLY job is to determine if a request is an email request or a flight request, then extract the relevant information.
 
@@ -70,18 +189,21 @@ def prompt_perplexity(task: str) -> Tuple[str, Any]:
     start_time = time.time()
 
     try:
-        response = client.chat.completions.create(
-            model="sonar-reasoning-pro",
-            messages=messages
-        )
+        if LLM_STREAMING:
+            response_content = await stream_completion(messages)
+        else:
+            response = await get_llm_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages
+            )
+            # Parse the response content to extract the JSON
+            response_content = response.choices[0].message.content
 
         # End the timer after the response
         end_time = time.time()
         elapsed_time = end_time - start_time
         print(f"Query time: {elapsed_time:.4f} seconds")
         
-        # Parse the response content to extract the JSON
-        response_content = response.choices[0].message.content
         print(f"Raw response from Perplexity:\n{response_content}")
         
         try:
@@ -128,17 +250,50 @@ def prompt_perplexity(task: str) -> Tuple[str, Any]:
         print(f"An error occurred: {e}")
         return "error", {"error_message": str(e)}
 
-def handle_request(task: str):
+async def classify_request(task: str) -> Tuple[str, Any]:
+    """
+    Classify a request with the rule-based parser, escalating to the LLM
+    when it doesn't recognize the command or isn't confident in every field
+    
+    LLM results are cached by normalized command text.
+    """
+    if FAST_PATH_ENABLED:
+        start_time = time.perf_counter()
+        result = parse_command(task)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        if result and result["confidence"] >= FAST_PATH_CONFIDENCE:
+            classifier_stats["fast_path"] += 1
+            print(f"Fast path: {result['request_type']} (confidence {result['confidence']:.2f}) in {elapsed_ms:.2f} ms")
+            return result["request_type"], result["data"]
+        if result:
+            print(f"Fast path not confident ({result['confidence']:.2f}, missing {result['missing']}), asking the LLM")
+    
+    key = command_key(task)
+    cached = command_cache.get(key)
+    if cached:
+        print(f"Cache hit: {cached[0]} for {key!r}")
+        return cached
+    
+    classifier_stats["llm"] += 1
+    request_type, data = await prompt_perplexity(task)
+    # Errors and unknown results are refused, so they're retried next time
+    command_cache.put(key, request_type, data)
+    return request_type, data
+
+async def handle_request(task: str):
     """
     Handle the user request by classifying it and taking appropriate action
+    
+    The LLM call and the forwarding are awaited, so other commands are
+    handled while this one waits on the network.
     """
-    request_type, data = prompt_perplexity(task)
+    request_type, data = await classify_request(task)
     
     if request_type == "email":
         # Make a POST request to your email endpoint
         try:
-            email_endpoint = "http://localhost:3000/email/send"
-            response = requests.post(
+            email_endpoint = f"{ACTION_SERVER_URL}/email/send"
+            response = await get_http_client().post(
                 email_endpoint,
                 json=data,
                 headers={"Content-Type": "application/json"}
@@ -158,8 +313,8 @@ def handle_request(task: str):
     elif request_type == "flight":
         # Make a POST request to your flight search endpoint
         try:
-            flight_endpoint = "http://localhost:3000/flight/search"
-            response = requests.post(
+            flight_endpoint = f"{ACTION_SERVER_URL}/flight/search"
+            response = await get_http_client().post(
                 flight_endpoint,
                 json=data,
                 headers={"Content-Type": "application/json"}
@@ -182,6 +337,26 @@ def handle_request(task: str):
             "data": data
         }
 
+async def run_command(request: Request, command_text: str, data: Any) -> Dict[str, Any]:
+    """
+    Handle a command, once per idempotency key or normalized command
+    
+    The key comes from the Idempotency-Key header or an idempotency_key
+    field in the request body.
+    """
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if not idempotency_key and isinstance(data, dict):
+        idempotency_key = data.get("idempotency_key")
+    if idempotency_key:
+        key, window = f"key:{idempotency_key}", IDEMPOTENCY_WINDOW
+    else:
+        key, window = f"command:{command_key(command_text)}", COALESCE_WINDOW
+    
+    result, shared = await command_flights.run(key, lambda: handle_request(command_text), window)
+    if shared:
+        print(f"Duplicate command {key!r} shares the result of the first request")
+    return result
+
 # Define all API routes
 @app.post("/voice/command", response_model=CommandResponse)
 async def process_voice_command(request: Request):
@@ -204,8 +379,8 @@ async def process_voice_command(request: Request):
             detail=f"Invalid request format. Could not extract command text: {str(e)}"
         )
     
-    # Process the command using the existing handle_request function
-    result = handle_request(command_text)
+    # Process the command, once for all deliveries of it
+    result = await run_command(request, command_text, data)
     
     # Return a response
     return CommandResponse(
@@ -251,8 +426,8 @@ async def process_email(request: Request):
         command_text = f"send an email to {recipient} about {subject} saying {content}"
         print(f"Constructed email command: {command_text}")
         
-        # Process using the existing handle_request function
-        result = handle_request(command_text)
+        # Process the command, once for all deliveries of it
+        result = await run_command(request, command_text, data)
         
         # Return a response
         return CommandResponse(
@@ -275,7 +450,10 @@ async def health_check():
     return {
         "status": "ok",
         "timestamp": datetime.now().isoformat(),
-        "service": "Voice Command API"
+        "service": "Voice Command API",
+        "classifier": dict(classifier_stats),
+        "cache": command_cache.metrics(),
+        "coalescing": command_flights.metrics()
     }
 
 # Run the FastAPI app if this file is executed directly
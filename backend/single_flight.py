@@ -0,0 +1,101 @@
+"""
+Single-flight coalescing of duplicate commands.
+
+The frontend can send one command several times: with the interaction's
+metadata to /voice/command, then again after the user confirms to
+/api/email or /command (and /voice/command as a fallback). Each used to
+classify the command with the LLM and start its own browser task.
+
+SingleFlight runs one coroutine per key. A request whose key is already
+running awaits the same task, and one arriving within the key's window
+after it finished gets the same result, so duplicates share one
+classification and one downstream task. The task is shielded, so a caller
+that disconnects doesn't cancel it for the others. Failed tasks, and
+results the keep predicate rejects, are only shared with the requests that
+were already waiting; the next request runs again.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+DEFAULT_WINDOW = 30.0
+MAX_ENTRIES = 1024
+
+class SingleFlight:
+    """Coalesces concurrent and recent calls with the same key"""
+    
+    def __init__(self, window: float = DEFAULT_WINDOW, max_entries: int = MAX_ENTRIES,
+                 keep: Optional[Callable[[Any], bool]] = None):
+        """
+        Initialize the coalescer.
+        
+        Args:
+            window: Seconds a finished result is shared for (default for
+                run()); 0 shares it only while it is running
+            max_entries: Finished results kept before the oldest are dropped
+            keep: Predicate deciding whether a finished result may be shared
+                with later requests (default: every result)
+        """
+        self.window = window
+        self.max_entries = max_entries
+        self.keep = keep or (lambda result: True)
+        # key -> (task, window, finished time or None while running)
+        self.entries: Dict[str, Tuple[asyncio.Future, float, Optional[float]]] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "in_flight": 0}
+    
+    async def run(self, key: str, function: Callable[[], Awaitable[Any]],
+                  window: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run function for key, or share the running or recent run.
+        
+        Args:
+            key: Identity of the work (an idempotency key or a normalized command)
+            function: Coroutine function doing the work
+            window: Seconds the result is shared for after it finishes
+        
+        Returns:
+            (result, shared) where shared is True if another request ran it
+        """
+        self._prune()
+        entry = self.entries.get(key)
+        if entry is not None:
+            task, _, _ = entry
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task), True
+        
+        task = asyncio.ensure_future(function())
+        self.entries[key] = (task, self.window if window is None else window, None)
+        self.stats["leaders"] += 1
+        self.stats["in_flight"] += 1
+        task.add_done_callback(lambda task: self._finished(key, task))
+        return await asyncio.shield(task), False
+    
+    def _finished(self, key: str, task: asyncio.Future):
+        self.stats["in_flight"] -= 1
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not task:
+            return
+        if entry[1] <= 0 or task.cancelled() or task.exception() is not None or not self.keep(task.result()):
+            del self.entries[key]
+        else:
+            self.entries[key] = (task, entry[1], time.monotonic())
+    
+    def _prune(self):
+        """Drop finished results past their window, and the oldest beyond max_entries"""
+        now = time.monotonic()
+        finished = []
+        for key, (_, window, finished_at) in list(self.entries.items()):
+            if finished_at is None:
+                continue
+            if now - finished_at > window:
+                del self.entries[key]
+            else:
+                finished.append((finished_at, key))
+        if len(finished) > self.max_entries:
+            for _, key in sorted(finished)[:len(finished) - self.max_entries]:
+                del self.entries[key]
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Counters and the number of results being shared, for /health"""
+        return dict(self.stats, shared_results=sum(1 for _, _, finished_at in self.entries.values()
+                                                   if finished_at is not None))
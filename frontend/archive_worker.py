@@ -0,0 +1,169 @@
+"""
+Background worker for archiving recordings off the listening thread.
+
+Saving a recording converts it to MP3 with pydub (which spawns ffmpeg)
+and writes to disk, and saving the interaction metadata writes its JSON
+file. None of that is needed to answer the user, so the listening thread
+only queues jobs and a single worker thread runs them in order. Jobs may
+be dropped, so work that must happen (sending the command to the backend)
+doesn't belong here.
+
+The queue is bounded. When it is full, submit() applies the drop policy
+instead of growing without limit:
+
+- 'drop_oldest': discard the oldest waiting job to make room (default;
+  recent interactions are the most useful ones to keep)
+- 'drop_newest': discard the job being submitted
+- 'block': wait up to block_timeout for room, then discard the new job
+
+submit() returns False when the job was dropped, so callers can see the
+backpressure. Queue depth, drops per job name and per-job latency (time
+waiting in the queue and time running) are kept for format_stats().
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+QUEUE_SIZE = 16
+DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+DEFAULT_DROP_POLICY = 'drop_oldest'
+BLOCK_TIMEOUT = 0.05
+LATENCY_WINDOW = 100
+
+class ArchiveWorker:
+    """Runs archiving jobs in submission order on a daemon thread"""
+    
+    def __init__(self, max_queue=QUEUE_SIZE, drop_policy=DEFAULT_DROP_POLICY, block_timeout=BLOCK_TIMEOUT):
+        """
+        Initialize and start the worker.
+        
+        Args:
+            max_queue: Jobs that may wait before the drop policy applies
+            drop_policy: One of DROP_POLICIES
+            block_timeout: Longest wait for room with the 'block' policy
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {drop_policy!r}, expected one of {DROP_POLICIES}")
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'dropped': 0, 'max_depth': 0}
+        # Per job name: jobs dropped by the policy
+        self.dropped = {}
+        # Per job name: recent queue waits and run times in seconds
+        self.latencies = {}
+        self.thread = threading.Thread(target=self._run, name="archive-worker", daemon=True)
+        self.thread.start()
+    
+    @property
+    def depth(self):
+        """Jobs currently waiting"""
+        return self.jobs.qsize()
+    
+    def submit(self, name, function, *args, **kwargs):
+        """
+        Queue a job.
+        
+        Args:
+            name: Job type used to group the latency stats (e.g. 'audio')
+            function: Callable to run on the worker thread
+            *args, **kwargs: Passed to function
+        
+        Returns:
+            True if the job was queued, False if it was dropped
+        """
+        job = (name, function, args, kwargs, time.perf_counter())
+        queued = False
+        if self.drop_policy == 'block':
+            # Wait without holding the lock the worker needs to finish its job
+            try:
+                self.jobs.put(job, timeout=self.block_timeout)
+                queued = True
+            except queue.Full:
+                pass
+        
+        with self.lock:
+            self.stats['submitted'] += 1
+            if self.drop_policy != 'block':
+                try:
+                    self.jobs.put_nowait(job)
+                    queued = True
+                except queue.Full:
+                    if self.drop_policy == 'drop_oldest':
+                        # The worker only takes jobs out, so the freed slot stays free
+                        try:
+                            dropped = self.jobs.get_nowait()
+                            self.jobs.task_done()
+                            self.stats['dropped'] += 1
+                            self.dropped[dropped[0]] = self.dropped.get(dropped[0], 0) + 1
+                            print(f"Archive queue full, dropped oldest {dropped[0]} job")
+                        except queue.Empty:
+                            pass
+                        self.jobs.put_nowait(job)
+                        queued = True
+            if not queued:
+                self.stats['dropped'] += 1
+                self.dropped[name] = self.dropped.get(name, 0) + 1
+                print(f"Archive queue full, dropped {name} job")
+            self.stats['max_depth'] = max(self.stats['max_depth'], self.jobs.qsize())
+        return queued
+    
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            name, function, args, kwargs, submitted_at = job
+            started_at = time.perf_counter()
+            try:
+                function(*args, **kwargs)
+                outcome = 'completed'
+            except Exception as e:
+                print(f"Error in archive {name} job: {e}")
+                outcome = 'failed'
+            finished_at = time.perf_counter()
+            with self.lock:
+                self.stats[outcome] += 1
+                waits, runs = self.latencies.setdefault(name, (deque(maxlen=LATENCY_WINDOW),
+                                                               deque(maxlen=LATENCY_WINDOW)))
+                waits.append(started_at - submitted_at)
+                runs.append(finished_at - started_at)
+            self.jobs.task_done()
+    
+    def close(self, timeout=5.0):
+        """
+        Finish the queued jobs and stop the worker.
+        
+        Args:
+            timeout: Longest wait for the queue to drain; jobs still waiting
+                afterwards are abandoned with the daemon thread
+        """
+        if not self.thread.is_alive():
+            return
+        try:
+            self.jobs.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"Archive queue still full after {timeout:.0f}s, abandoning {self.depth} jobs")
+            return
+        self.thread.join(timeout)
+    
+    def format_stats(self):
+        """Summarize queue depth, drops and latency per job type"""
+        with self.lock:
+            stats = dict(self.stats)
+            dropped = ", ".join(f"{name} {count}" for name, count in sorted(self.dropped.items()))
+            latencies = {name: (np.array(waits) * 1000, np.array(runs) * 1000)
+                         for name, (waits, runs) in self.latencies.items()}
+        parts = [f"{stats['submitted']} jobs, {stats['completed']} done, {stats['failed']} failed, "
+                 f"{stats['dropped']} dropped ({self.drop_policy}{': ' + dropped if dropped else ''}), "
+                 f"depth {self.depth} "
+                 f"(max {stats['max_depth']}/{self.jobs.maxsize})"]
+        for name, (waits, runs) in sorted(latencies.items()):
+            parts.append(f"{name}: wait p50 {np.percentile(waits, 50):.0f} ms, "
+                         f"run p50 {np.percentile(runs, 50):.0f} ms, p95 {np.percentile(runs, 95):.0f} ms")
+        return "; ".join(parts)
@@ -0,0 +1,203 @@
+"""
+Continuous microphone capture into a ring buffer with phrase segmentation.
+
+A sounddevice input stream writes every block into a fixed-size NumPy ring
+buffer on the audio thread, and a voice activity detector (vad.py) cuts
+the stream into phrases frame by frame as it goes. Finished phrases are queued as
+sample ranges, so a consumer that was busy (e.g. waiting for the wake word
+transcription) finds everything spoken in the meantime already captured and
+cut instead of having to start listening again. Each phrase starts a short
+pre-roll before the detected speech onset so soft first syllables aren't
+clipped.
+
+Positions are absolute sample counts since the stream started; audio stays
+readable until the ring buffer wraps around (BUFFER_SECONDS later).
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from vad import VoiceActivityDetector
+
+# Try to import sounddevice (it raises OSError when PortAudio is missing)
+try:
+    import sounddevice as sd
+    SOUNDDEVICE_AVAILABLE = True
+except (ImportError, OSError):
+    SOUNDDEVICE_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 480  # 30 ms
+BUFFER_SECONDS = 30
+
+# Segmentation settings, in seconds
+PRE_ROLL_SECONDS = 0.3
+PAUSE_SECONDS = 0.5  # silence that ends a phrase (the VAD hangover)
+MIN_SPEECH_SECONDS = 0.3  # speech needed for a phrase to count
+MAX_PHRASE_SECONDS = 7.0
+
+class AudioCapture:
+    """
+    Captures the microphone into a ring buffer and queues detected phrases.
+    
+    Phrases are (start, end) sample positions; read them with get_pcm().
+    process_block() is the whole audio thread pipeline and can also be fed
+    from a recording, which is how the capture runs without a microphone.
+    """
+    
+    def __init__(self, rate=SAMPLE_RATE, block_size=BLOCK_SIZE, buffer_seconds=BUFFER_SECONDS,
+                 pre_roll_seconds=PRE_ROLL_SECONDS, pause_seconds=PAUSE_SECONDS,
+                 min_speech_seconds=MIN_SPEECH_SECONDS, max_phrase_seconds=MAX_PHRASE_SECONDS,
+                 device=None):
+        """
+        Initialize the capture (call start() to open the microphone).
+        
+        Args:
+            rate: Sample rate in Hz
+            block_size: Samples per audio callback
+            buffer_seconds: Length of the ring buffer
+            pre_roll_seconds: Audio kept before the detected speech onset
+            pause_seconds: Silence that ends a phrase
+            min_speech_seconds: Voiced audio needed for a phrase to be queued
+            max_phrase_seconds: Phrases are cut at this length
+            device: sounddevice input device (None for the default)
+        """
+        self.rate = rate
+        self.block_size = block_size
+        self.device = device
+        self.pre_roll = int(pre_roll_seconds * rate)
+        self.pause = int(pause_seconds * rate)
+        self.min_speech = int(min_speech_seconds * rate)
+        self.max_phrase = int(max_phrase_seconds * rate)
+        
+        self.buffer = np.zeros(int(buffer_seconds * rate), dtype=np.int16)
+        self.position = 0
+        self.lock = threading.Lock()
+        self.segments = queue.Queue()
+        self.stream = None
+        
+        self.vad = VoiceActivityDetector(rate, hangover_seconds=pause_seconds)
+        
+        # Phrase currently being captured
+        self._speech_start = None
+        self._last_segment_end = 0
+        
+        self.stats = {'blocks': 0, 'overflows': 0, 'segments': 0, 'discarded': 0, 'lost_samples': 0}
+    
+    @property
+    def in_speech(self):
+        """Whether a phrase is being captured right now"""
+        return self._speech_start is not None
+    
+    def start(self):
+        """Open the input stream and start capturing"""
+        if not SOUNDDEVICE_AVAILABLE:
+            raise RuntimeError("sounddevice (with PortAudio) is required for microphone capture")
+        self.stream = sd.InputStream(samplerate=self.rate, channels=1, dtype='int16',
+                                     blocksize=self.block_size, device=self.device,
+                                     callback=self._callback)
+        self.stream.start()
+    
+    def stop(self):
+        """Stop capturing and close the input stream"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+    
+    def _callback(self, indata, frames, time_info, status):
+        """sounddevice callback, runs on the audio thread"""
+        if status.input_overflow:
+            self.stats['overflows'] += 1
+        self.process_block(indata[:, 0])
+    
+    def process_block(self, block):
+        """
+        Append a block of 16-bit samples to the ring buffer and update the phrase segmentation.
+        
+        Args:
+            block: 1-D int16 array
+        """
+        with self.lock:
+            start = self.position
+            index = start % len(self.buffer)
+            first = min(len(block), len(self.buffer) - index)
+            self.buffer[index:index + first] = block[:first]
+            self.buffer[:len(block) - first] = block[first:]
+            self.position = end = start + len(block)
+        self.stats['blocks'] += 1
+        
+        for offset, event in self.vad.process(block):
+            if event == 'start':
+                self._speech_start = start + offset
+            elif self._speech_start is not None:
+                self._end_phrase(start + offset, self._speech_start + self.min_speech + self.pause)
+        
+        if self._speech_start is not None and end - self._speech_start >= self.max_phrase:
+            # Cut overlong phrases and carry on with the rest of the speech
+            self._end_phrase(end, self._speech_start + self.min_speech)
+            self._speech_start = end
+    
+    def _end_phrase(self, end, min_end):
+        """Queue the current phrase, or drop it if it ends before min_end (too short to be speech)"""
+        if end >= min_end:
+            start = max(self._speech_start - self.pre_roll, self._last_segment_end, end - len(self.buffer))
+            self._last_segment_end = end
+            self.stats['segments'] += 1
+            self.segments.put((start, end, time.perf_counter()))
+        else:
+            self.stats['discarded'] += 1
+        self._speech_start = None
+    
+    def next_segment(self, timeout=None, after=0):
+        """
+        Wait for the next captured phrase.
+        
+        Args:
+            timeout: Seconds to wait for speech to start (a phrase already
+                in progress is always waited for); None waits forever
+            after: Skip phrases that end at or before this position and cut
+                the start of one that overlaps it
+        
+        Returns:
+            (start, end, captured_at) tuple, where captured_at is the
+            perf_counter time the phrase ended, or None on timeout
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                start, end, captured_at = self.segments.get(timeout=0.05)
+            except queue.Empty:
+                if deadline is not None and time.perf_counter() >= deadline and not self.in_speech:
+                    return None
+                continue
+            if end > after:
+                return max(start, after), end, captured_at
+    
+    def get_pcm(self, segment):
+        """
+        Copy a phrase out of the ring buffer.
+        
+        Args:
+            segment: (start, end, ...) tuple from next_segment
+        
+        Returns:
+            16-bit mono PCM bytes (the part of the phrase that is still buffered)
+        """
+        start, end = segment[0], segment[1]
+        with self.lock:
+            oldest = self.position - len(self.buffer)
+            if start < oldest:
+                self.stats['lost_samples'] += oldest - start
+                start = oldest
+            indices = np.arange(start, end) % len(self.buffer)
+            return self.buffer[indices].tobytes()
+    
+    def format_stats(self):
+        """Summarize captured phrases and audio problems"""
+        stats = self.stats
+        return (f"{stats['segments']} phrases ({stats['discarded']} too short), "
+                f"{self.position / self.rate:.0f} s captured, "
+                f"{stats['overflows']} overflows, {stats['lost_samples']} samples overwritten before reading")
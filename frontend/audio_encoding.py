@@ -0,0 +1,176 @@
+"""
+Compact encoding of phrases before they are uploaded for transcription.
+
+A 7 s command is 224 KB as 16 kHz 16-bit WAV. UploadEncoder first cuts
+the leading and trailing silence (the capture pre-roll and the pause that
+ended the phrase) using the frame energy envelope, then encodes the rest:
+
+- 'flac': lossless, about half the size; uses the flac encoder bundled
+  with speech_recognition (the same one recognize_google uses)
+- 'opus': lossy Ogg/Opus at a speech bitrate, about a tenth of the size;
+  needs pydub and ffmpeg with libopus
+- 'wav': no compression
+
+When an encoder isn't available or fails, the phrase is sent as WAV and
+that encoder isn't tried again.
+"""
+import io
+import os
+import time
+import wave
+
+import numpy as np
+
+import vad
+
+try:
+    import speech_recognition as sr
+    FLAC_AVAILABLE = True
+except ImportError:
+    FLAC_AVAILABLE = False
+
+try:
+    from pydub import AudioSegment
+    OPUS_AVAILABLE = True
+except ImportError:
+    OPUS_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+
+ENCODINGS = ('flac', 'opus', 'wav')
+DEFAULT_ENCODING = os.environ.get('UPLOAD_ENCODING', 'flac')
+OPUS_BITRATE = "24k"
+
+# File extension per encoding; the transcription API detects the format from it
+EXTENSIONS = {'flac': 'flac', 'opus': 'ogg', 'wav': 'wav'}
+
+# Silence kept around the speech so word onsets and endings aren't clipped
+TRIM_PADDING_SECONDS = 0.15
+
+def pcm_to_wav(pcm, rate=SAMPLE_RATE):
+    """WAV file bytes for mono 16-bit PCM"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+def trim_upload_silence(pcm, rate=SAMPLE_RATE, padding_seconds=TRIM_PADDING_SECONDS):
+    """
+    Cut leading and trailing silence from mono 16-bit PCM before upload.
+    
+    Frames are voiced when they stand out from the phrase's own noise floor
+    (its quietest frames) by the VAD's margin, so trimming follows the
+    room's noise level. This differs from wake_word.trim_silence, which
+    trims wake templates relative to their loudest frame.
+    
+    Args:
+        pcm: Raw little-endian int16 PCM bytes
+        rate: Sample rate in Hz
+        padding_seconds: Audio kept before the first and after the last voiced frame
+    
+    Returns:
+        The trimmed PCM bytes (unchanged if no frame stands out)
+    """
+    samples = np.frombuffer(pcm, dtype='<i2')
+    detector = vad.VoiceActivityDetector(rate)
+    frame_length = detector.frame_length
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return pcm
+    
+    energies = detector.frame_energies(samples[:frame_count * frame_length])
+    noise_db = np.percentile(energies, 10)
+    voiced = np.flatnonzero(energies > max(noise_db + detector.snr_db, detector.min_speech_db))
+    if len(voiced) == 0:
+        return pcm
+    
+    padding = int(padding_seconds * rate)
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    return samples[start:end].tobytes()
+
+class UploadEncoder:
+    """Trims and encodes phrases for upload, falling back to WAV"""
+    
+    def __init__(self, encoding=DEFAULT_ENCODING, rate=SAMPLE_RATE, trim=True, opus_bitrate=OPUS_BITRATE):
+        """
+        Initialize the encoder.
+        
+        Args:
+            encoding: One of ENCODINGS
+            rate: Sample rate of the PCM passed to encode()
+            trim: Whether to cut leading and trailing silence
+            opus_bitrate: Bitrate for the 'opus' encoding (ffmpeg syntax)
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown upload encoding {encoding!r}, expected one of {ENCODINGS}")
+        self.encoding = encoding
+        self.rate = rate
+        self.trim = trim
+        self.opus_bitrate = opus_bitrate
+        self.unavailable = set()
+        if (encoding == 'flac' and not FLAC_AVAILABLE) or (encoding == 'opus' and not OPUS_AVAILABLE):
+            print(f"WARNING: {encoding} encoding not available, uploading WAV instead")
+            self.unavailable.add(encoding)
+        self.stats = {'phrases': 0, 'wav_bytes': 0, 'sent_bytes': 0, 'trimmed_seconds': 0.0,
+                      'encode_seconds': 0.0, 'fallbacks': 0}
+    
+    def _encode(self, encoding, pcm):
+        if encoding == 'flac':
+            return sr.AudioData(pcm, self.rate, 2).get_flac_data()
+        if encoding == 'opus':
+            buffer = io.BytesIO()
+            segment = AudioSegment(pcm, sample_width=2, frame_rate=self.rate, channels=1)
+            segment.export(buffer, format="ogg", codec="libopus", bitrate=self.opus_bitrate)
+            return buffer.getvalue()
+        return pcm_to_wav(pcm, self.rate)
+    
+    def encode(self, pcm, filename="audio.wav"):
+        """
+        Trim and encode a phrase.
+        
+        Args:
+            pcm: Raw mono int16 PCM bytes
+            filename: Upload filename; its extension is replaced to match the encoding
+        
+        Returns:
+            (encoded bytes, upload filename)
+        """
+        start_time = time.perf_counter()
+        original_length = len(pcm)
+        if self.trim:
+            pcm = trim_upload_silence(pcm, self.rate)
+        
+        encoding = self.encoding
+        if encoding in self.unavailable:
+            encoding = 'wav'
+        try:
+            data = self._encode(encoding, pcm)
+        except Exception as e:
+            print(f"Error encoding upload as {encoding}, sending WAV from now on: {e}")
+            self.unavailable.add(encoding)
+            self.stats['fallbacks'] += 1
+            encoding = 'wav'
+            data = pcm_to_wav(pcm, self.rate)
+        
+        self.stats['phrases'] += 1
+        self.stats['wav_bytes'] += original_length + 44
+        self.stats['sent_bytes'] += len(data)
+        self.stats['trimmed_seconds'] += (original_length - len(pcm)) / (2 * self.rate)
+        self.stats['encode_seconds'] += time.perf_counter() - start_time
+        return data, f"{os.path.splitext(filename)[0]}.{EXTENSIONS[encoding]}"
+    
+    def format_stats(self):
+        """Summarize upload sizes against plain WAV and the encoding cost"""
+        stats = self.stats
+        if not stats['phrases']:
+            return f"{self.encoding}: no phrases encoded"
+        ratio = stats['sent_bytes'] / max(1, stats['wav_bytes']) * 100
+        return (f"{self.encoding}: {stats['phrases']} phrases, {stats['sent_bytes'] / 1024:.1f} KB sent "
+                f"for {stats['wav_bytes'] / 1024:.1f} KB of WAV ({ratio:.0f}%), "
+                f"{stats['trimmed_seconds']:.1f} s of silence trimmed, "
+                f"{stats['encode_seconds'] / stats['phrases'] * 1000:.1f} ms per phrase, "
+                f"{stats['fallbacks']} fallbacks to WAV")
@@ -0,0 +1,201 @@
+"""
+Benchmarks for the GLTF loader and the avatar renderer.
+
+Runs against a standalone ModernGL context, so no window or display is needed
+(use --backend egl on headless Linux machines).
+
+Usage:
+    python benchmark_gltf.py [--backend egl] load [--runs 5]
+    python benchmark_gltf.py [--backend egl] draw [--frames 300]
+    python benchmark_gltf.py [--backend egl] render [--frames 300] [--size 800x600] [--save frame.png]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import moderngl
+import numpy as np
+from pyrr import Matrix44
+
+import gltf_loader
+from halo import create_halo, render_halo
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'tokovt', 'scene.gltf')
+
+def create_context(backend=None):
+    """Create a standalone ModernGL context, optionally with a specific backend (e.g. 'egl')"""
+    if backend:
+        return moderngl.create_standalone_context(backend=backend)
+    return moderngl.create_standalone_context()
+
+def time_load(model_path, backend, **load_kwargs):
+    """Load the model into a fresh context and return the wall time including the GPU upload"""
+    ctx = create_context(backend)
+    try:
+        start_time = time.perf_counter()
+        gltf_loader.load_gltf(ctx, model_path, **load_kwargs)
+        ctx.finish()
+        return time.perf_counter() - start_time
+    finally:
+        ctx.release()
+
+def benchmark_load(args):
+    """Compare uncached, cold-cache and warm-cache load times"""
+    cache_dir = tempfile.mkdtemp(prefix='gltf_cache_')
+    results = {'no cache': [], 'cold cache': [], 'warm cache': []}
+    
+    try:
+        for run in range(args.runs):
+            results['no cache'].append(time_load(args.model, args.backend, use_cache=False))
+            
+            # A cold load starts from an empty cache directory and writes the cache
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            results['cold cache'].append(time_load(args.model, args.backend, cache_dir=cache_dir))
+            
+            # A warm load reads the cache written by the cold load
+            results['warm cache'].append(time_load(args.model, args.backend, cache_dir=cache_dir))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    
+    print()
+    print(f"Load times for {os.path.basename(args.model)} over {args.runs} runs:")
+    for name, times in results.items():
+        print(f"  {name:<11} median {statistics.median(times) * 1000:8.1f} ms   "
+              f"min {min(times) * 1000:8.1f} ms   max {max(times) * 1000:8.1f} ms")
+    
+    speedup = statistics.median(results['no cache']) / statistics.median(results['warm cache'])
+    print(f"  Warm start is {speedup:.1f}x faster than loading without the cache")
+
+def benchmark_draw(args):
+    """Compare draw calls and CPU time per frame with and without primitive merging, animating the model if it can"""
+    ctx = create_context(args.backend)
+    try:
+        framebuffer = ctx.simple_framebuffer((800, 600))
+        framebuffer.use()
+        ctx.enable(moderngl.DEPTH_TEST)
+        
+        projection = Matrix44.perspective_projection(50.0, 800 / 600, 0.1, 100.0)
+        view = Matrix44.look_at((0, 2.5, 5.0), (0, 1.5, 0), (0, 1, 0))
+        model_matrix = Matrix44.from_scale((0.5, 0.5, 0.5))
+        
+        print()
+        print(f"Rendering {args.frames} frames of {os.path.basename(args.model)}:")
+        for merge_primitives in (False, True):
+            model = gltf_loader.load_gltf(ctx, args.model, merge_primitives=merge_primitives)
+            for frame in range(args.frames):
+                ctx.clear(0.0, 0.0, 0.0, 1.0)
+                if model['animations']:
+                    gltf_loader.animate_gltf(model, 0, frame / 60.0)
+                gltf_loader.render_gltf(model, model_matrix, view, projection)
+            ctx.finish()
+            
+            name = 'merged' if merge_primitives else 'unmerged'
+            print(f"  {name:<9} {gltf_loader.format_render_stats(model)}")
+    finally:
+        ctx.release()
+
+def benchmark_render(args):
+    """Render the animated avatar and halo offscreen and report frame time percentiles"""
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    ctx = create_context(args.backend)
+    try:
+        # Offscreen framebuffer with the same state the app window uses
+        framebuffer = ctx.framebuffer(
+            color_attachments=[ctx.renderbuffer((width, height), 4)],
+            depth_attachment=ctx.depth_renderbuffer((width, height))
+        )
+        framebuffer.use()
+        ctx.enable(moderngl.DEPTH_TEST)
+        ctx.enable(moderngl.CULL_FACE)
+        ctx.enable(moderngl.BLEND)
+        ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
+        
+        frame_uniforms = gltf_loader.create_frame_uniforms(ctx)
+        model = gltf_loader.load_gltf(ctx, args.model, merge_primitives=True, frame_uniforms=frame_uniforms,
+                                      lighting=args.lighting)
+        halo = create_halo(ctx)
+        
+        projection = Matrix44.perspective_projection(50.0, width / height, 0.1, 100.0)
+        view = Matrix44.look_at((0, 2.5, 5.0), (0, 1.5, 0), (0, 1, 0))
+        translation_matrix = Matrix44.from_translation((0.0, 0.5, -1.0))
+        model_matrix = translation_matrix @ Matrix44.from_scale((1.5, 1.5, 1.5))
+        
+        frame_times = []
+        for frame in range(args.warmup + args.frames):
+            # Advance a fixed 60 FPS clock so every run renders the same frames
+            frame_time = frame / 60.0
+            start_time = time.perf_counter()
+            
+            ctx.clear(0.0, 0.0, 0.0, 1.0)
+            gltf_loader.update_frame_uniforms(frame_uniforms, view, projection)
+            if model['animations']:
+                gltf_loader.animate_gltf(model, 0, frame_time)
+            gltf_loader.render_gltf(model, model_matrix)
+            
+            halo_radius = 1.5 * (0.8 + 0.2 * np.sin(frame_time * 3.0))
+            halo_matrix = translation_matrix @ Matrix44.from_scale((halo_radius, halo_radius, halo_radius))
+            render_halo(halo, halo_matrix, (0.4, 0.8, 1.0), 0.4 + 0.2 * np.sin(frame_time * 2.0), frame_uniforms)
+            
+            # Wait for the GPU so the frame time covers the whole frame
+            ctx.finish()
+            if frame >= args.warmup:
+                frame_times.append(time.perf_counter() - start_time)
+        
+        frame_times = np.array(frame_times) * 1000
+        p50, p95, p99 = np.percentile(frame_times, [50, 95, 99])
+        render_stats = model['render_stats']
+        upload_stats = model['upload_stats']
+        rendered_frames = args.warmup + args.frames
+        uniform_bytes = (render_stats['uniform_bytes'] + model['animation_stats']['uniform_bytes']
+                         + halo['render_stats']['uniform_bytes'] + frame_uniforms['data'].nbytes * rendered_frames)
+        
+        print()
+        print(f"Rendered {args.frames} frames of {os.path.basename(args.model)} at {width}x{height} "
+              f"({args.warmup} warmup frames, {args.lighting} lighting):")
+        print(f"  frame time   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   p99 {p99:7.2f} ms   "
+              f"mean {frame_times.mean():7.2f} ms ({1000 / frame_times.mean():.1f} FPS)")
+        print(f"  draw calls   {render_stats['last_draw_calls'] + 1}/frame "
+              f"({render_stats['last_draw_calls']} model + 1 halo)")
+        print(f"  GPU uploads  {upload_stats['buffer_bytes'] / 1e6:.1f} MB buffers + "
+              f"{upload_stats['texture_bytes'] / 1e6:.1f} MB textures at load, "
+              f"{uniform_bytes / rendered_frames / 1024:.2f} KB uniforms/frame")
+        print(f"  model        {gltf_loader.format_render_stats(model)}")
+        
+        if args.save:
+            from PIL import Image
+            Image.frombytes('RGBA', (width, height), framebuffer.read(components=4)).transpose(Image.FLIP_TOP_BOTTOM).save(args.save)
+            print(f"  saved last frame to {args.save}")
+    finally:
+        ctx.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the GLTF loader")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Path to the GLTF file")
+    parser.add_argument('--backend', default=None, help="ModernGL standalone backend (e.g. egl)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    load_parser = subparsers.add_parser('load', help="Cold vs warm model load time")
+    load_parser.add_argument('--runs', type=int, default=5, help="Number of runs per mode")
+    load_parser.set_defaults(func=benchmark_load)
+    
+    draw_parser = subparsers.add_parser('draw', help="Draw calls and CPU time per frame, merged vs unmerged")
+    draw_parser.add_argument('--frames', type=int, default=300, help="Number of frames to render per mode")
+    draw_parser.set_defaults(func=benchmark_draw)
+    
+    render_parser = subparsers.add_parser('render', help="Offscreen frame time percentiles for the avatar and halo")
+    render_parser.add_argument('--frames', type=int, default=300, help="Number of timed frames")
+    render_parser.add_argument('--warmup', type=int, default=10, help="Untimed frames rendered first")
+    render_parser.add_argument('--size', default='800x600', help="Framebuffer size as WIDTHxHEIGHT")
+    render_parser.add_argument('--lighting', default=gltf_loader.DEFAULT_LIGHTING,
+                               choices=sorted(gltf_loader.LIGHTING_MODES), help="Lighting shader variant")
+    render_parser.add_argument('--save', default=None, help="Save the last frame as an image")
+    render_parser.set_defaults(func=benchmark_render)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the transcription dispatcher against local mock servers.
+
+Starts two mock_transcription_server instances standing in for the
+preferred backend (fast, with an occasional slow tail and optional
+failures) and the fallback backend (slower but steady), then transcribes
+the same phrase repeatedly in each dispatch mode and reports end-to-end
+latency percentiles, how many backend requests each phrase cost, and the
+circuit breaker activity. Requests go through a pooled keep-alive session
+(http_client.py) unless --no-pool is given, which opens a new connection
+per request like bare requests.post.
+
+Usage:
+    python benchmark_transcription.py [--phrases 40] [--modes fallback hedge parallel]
+                                      [--slow-rate 0.1] [--error-rate 0.0] [--no-pool]
+"""
+import argparse
+import io
+import time
+import wave
+
+import numpy as np
+
+import http_client
+import mock_transcription_server
+import transcription
+
+def make_wav(seconds=1.5, rate=16000):
+    """WAV bytes of a quiet test phrase"""
+    samples = (np.random.default_rng(0).standard_normal(int(seconds * rate)) * 100).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def http_backend(base_url, session=None):
+    """Transcription backend callable for an OpenAI-compatible endpoint"""
+    def transcribe(wav_data, audio, filename):
+        return transcription.transcribe_with_groq(wav_data, "mock-key", filename, base_url=base_url,
+                                                  session=session)
+    return transcribe
+
+def run_mode(mode, args, wav_data):
+    """Transcribe the phrase args.phrases times in one mode and print the results"""
+    primary = mock_transcription_server.start_in_background(mock_transcription_server.create_server(
+        delay=args.primary_delay, jitter=args.primary_delay / 4, slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay, error_rate=args.error_rate, seed=1))
+    fallback = mock_transcription_server.start_in_background(mock_transcription_server.create_server(
+        delay=args.fallback_delay, jitter=args.fallback_delay / 4, seed=2))
+    
+    session, adapter = (None, None) if args.no_pool else http_client.create_session()
+    dispatcher = transcription.TranscriptionDispatcher(
+        [('primary', http_backend(primary.base_url, session)), ('fallback', http_backend(fallback.base_url, session))],
+        mode=mode, reset_timeout=args.reset_timeout)
+    
+    latencies = []
+    failures = 0
+    for _ in range(args.phrases):
+        start_time = time.perf_counter()
+        try:
+            dispatcher.transcribe(wav_data, filename="phrase.wav")
+            latencies.append(time.perf_counter() - start_time)
+        except transcription.TranscriptionError:
+            failures += 1
+    
+    # Let losing requests finish so the request counts are complete
+    time.sleep(args.slow_delay)
+    dispatcher.close()
+    for server in (primary, fallback):
+        server.shutdown()
+        server.server_close()
+    
+    latencies = np.array(latencies) * 1000
+    backend_requests = primary.stats['requests'] + fallback.stats['requests']
+    print(f"{mode}:")
+    if len(latencies):
+        print(f"  latency   p50 {np.percentile(latencies, 50):6.0f} ms   p95 {np.percentile(latencies, 95):6.0f} ms   "
+              f"p99 {np.percentile(latencies, 99):6.0f} ms   max {latencies.max():6.0f} ms")
+    print(f"  requests  {backend_requests / args.phrases:.2f} backend requests per phrase "
+          f"(primary {primary.stats['requests']}, fallback {fallback.stats['requests']}), {failures} phrases failed")
+    connections = len(primary.stats['connections']) + len(fallback.stats['connections'])
+    print(f"  sockets   {connections} connections for {backend_requests} requests"
+          + (f" ({http_client.format_connection_stats(adapter)})" if adapter else " (no pooling)"))
+    print(f"  {dispatcher.format_stats()}")
+    if session is not None:
+        session.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--phrases', type=int, default=40, help="Phrases to transcribe per mode")
+    parser.add_argument('--modes', nargs='+', default=list(transcription.MODES), choices=transcription.MODES)
+    parser.add_argument('--primary-delay', type=float, default=0.15, help="Typical primary response time")
+    parser.add_argument('--fallback-delay', type=float, default=0.4, help="Typical fallback response time")
+    parser.add_argument('--slow-rate', type=float, default=0.1, help="Fraction of slow primary responses")
+    parser.add_argument('--slow-delay', type=float, default=2.0, help="Response time of slow primary responses")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of failing primary responses")
+    parser.add_argument('--no-pool', action='store_true', help="Open a new connection for every request")
+    parser.add_argument('--reset-timeout', type=float, default=2.0, help="Circuit breaker cool-down in seconds")
+    args = parser.parse_args()
+    
+    wav_data = make_wav()
+    for mode in args.modes:
+        run_mode(mode, args, wav_data)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Upload size and transcription latency of each upload encoding.
+
+Replays recorded phrases the way the capture cuts them (with the pre-roll
+before and the ending pause after the speech), encodes each one with
+audio_encoding.UploadEncoder and sends it to a local mock transcription
+server that simulates a limited uplink. Reports bytes on the wire per
+phrase, encoding time and end-to-end latency (encode + upload + response)
+for plain WAV as sent before, trimmed WAV, FLAC and Opus.
+
+Usage:
+    python benchmark_upload.py [recordings ...] [--upload-kbps 1000] [--delay 0.2] [--repeat 2]
+"""
+import argparse
+import glob
+import time
+
+import numpy as np
+
+import audio_capture
+import audio_encoding
+import http_client
+import mock_transcription_server
+import transcription
+import wake_word
+
+def load_phrases(paths):
+    """PCM bytes of each recording, padded like a captured segment"""
+    phrases = []
+    pre_roll = np.zeros(int(audio_capture.PRE_ROLL_SECONDS * audio_capture.SAMPLE_RATE), dtype=np.int16)
+    pause = np.zeros(int(audio_capture.PAUSE_SECONDS * audio_capture.SAMPLE_RATE), dtype=np.int16)
+    rng = np.random.default_rng(0)
+    for path in paths:
+        samples = wake_word.load_audio(path)
+        if samples is None:
+            continue
+        samples = np.clip(samples * 32768.0, -32768, 32767).astype(np.int16)
+        samples = np.concatenate([pre_roll, samples, pause])
+        # Quiet room noise so the silence isn't digital zero
+        noise = rng.standard_normal(len(samples)) * 10
+        phrases.append(np.clip(samples + noise, -32768, 32767).astype('<i2').tobytes())
+    return phrases
+
+def run_variant(name, encoder, phrases, server, session, repeat):
+    """Send every phrase repeat times and print size and latency"""
+    requests_before = server.stats['requests']
+    bytes_before = server.stats['bytes_received']
+    latencies = []
+    encode_times = []
+    for _ in range(repeat):
+        for pcm in phrases:
+            start_time = time.perf_counter()
+            if encoder is None:
+                data, filename = audio_encoding.pcm_to_wav(pcm), "command.wav"
+            else:
+                data, filename = encoder.encode(pcm, "command.wav")
+            encode_times.append(time.perf_counter() - start_time)
+            transcription.transcribe_with_groq(data, "mock-key", filename, base_url=server.base_url,
+                                               session=session)
+            latencies.append(time.perf_counter() - start_time)
+    
+    request_bytes = (server.stats['bytes_received'] - bytes_before) / (server.stats['requests'] - requests_before)
+    latencies = np.array(latencies) * 1000
+    encode_times = np.array(encode_times) * 1000
+    print(f"{name:12s} {request_bytes / 1024:7.1f} KB/request   encode {encode_times.mean():5.1f} ms   "
+          f"latency p50 {np.percentile(latencies, 50):5.0f} ms  p95 {np.percentile(latencies, 95):5.0f} ms   "
+          f"(sent as {filename})")
+    return request_bytes, np.percentile(latencies, 50)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recordings', nargs='*', default=['temp/*.wav'], help="WAV files or glob patterns")
+    parser.add_argument('--upload-kbps', type=float, default=1000, help="Simulated uplink bandwidth in kbit/s")
+    parser.add_argument('--delay', type=float, default=0.2, help="Server processing time per request")
+    parser.add_argument('--repeat', type=int, default=2, help="Times each phrase is sent per variant")
+    args = parser.parse_args()
+    
+    paths = sorted({path for pattern in args.recordings for path in glob.glob(pattern)})
+    phrases = load_phrases(paths)
+    if not phrases:
+        print("No recordings found")
+        return
+    seconds = sum(len(pcm) for pcm in phrases) / (2 * audio_capture.SAMPLE_RATE)
+    print(f"{len(phrases)} phrases, {seconds / len(phrases):.1f} s each on average, "
+          f"uplink {args.upload_kbps:.0f} kbit/s, server time {args.delay * 1000:.0f} ms")
+    
+    server = mock_transcription_server.start_in_background(mock_transcription_server.create_server(
+        delay=args.delay, upload_kbps=args.upload_kbps))
+    session, _ = http_client.create_session()
+    variants = [
+        ('wav', None),
+        ('wav trimmed', audio_encoding.UploadEncoder('wav')),
+        ('flac', audio_encoding.UploadEncoder('flac')),
+        ('opus', audio_encoding.UploadEncoder('opus')),
+    ]
+    results = {}
+    try:
+        for name, encoder in variants:
+            results[name] = run_variant(name, encoder, phrases, server, session, args.repeat)
+            if encoder is not None and encoder.encoding in encoder.unavailable:
+                print(f"  {name} fell back to WAV (encoder unavailable)")
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+    
+    base_size, base_latency = results['wav']
+    print()
+    for name, (size, latency) in results.items():
+        print(f"{name:12s} {size / base_size * 100:5.0f}% of the WAV bytes, "
+              f"p50 latency {latency - base_latency:+6.0f} ms")
+
+if __name__ == '__main__':
+    main()
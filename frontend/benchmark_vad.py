@@ -0,0 +1,149 @@
+"""
+Replay benchmark for the capture endpointing (audio_capture.py + vad.py).
+
+Feeds recorded WAV files through AudioCapture.process_block in microphone
+sized blocks, as fast as possible, and reports:
+
+- endpoint latency: audio time from the end of speech to the phrase being
+  queued. Speech ends are found offline with a non-causal energy analysis
+  of the whole file (noise floor from the quietest frames), which the
+  streaming detector can't do.
+- CPU cost per second of audio and the processing time per block, which
+  has to stay far below the block length on the audio thread.
+
+Usage:
+    python benchmark_vad.py [recordings ...] [--noise-db 30] [--block-size 480]
+"""
+import argparse
+import glob
+import time
+
+import numpy as np
+
+import audio_capture
+import vad
+import wake_word
+
+def reference_speech_ends(samples, detector, recording_length):
+    """
+    Find where speech ends with a non-causal analysis of the whole recording.
+    
+    Args:
+        samples: int16 samples, possibly with silence appended
+        detector: VoiceActivityDetector whose frame and threshold settings are used
+        recording_length: Number of samples that came from the recording; the
+            noise floor is measured on those only
+    
+    Returns:
+        Sorted array of sample positions where a stretch of speech ends
+    """
+    usable = len(samples) - len(samples) % detector.frame_length
+    energies = detector.frame_energies(samples[:usable])
+    noise_db = np.percentile(energies[:max(1, recording_length // detector.frame_length)], 10)
+    voiced = np.flatnonzero(energies > max(noise_db + detector.snr_db, detector.min_speech_db))
+    if len(voiced) == 0:
+        return np.array([], dtype=np.int64)
+    
+    # Voiced frames closer than the hangover belong to the same stretch
+    gaps = np.flatnonzero(np.diff(voiced) > detector.hangover_frames)
+    last_frames = np.append(voiced[gaps], voiced[-1])
+    return (last_frames + 1) * detector.frame_length
+
+def replay(samples, block_size):
+    """
+    Stream a recording through a fresh AudioCapture.
+    
+    Returns:
+        (segment ends, per-block processing seconds, CPU seconds, capture)
+    """
+    capture = audio_capture.AudioCapture(buffer_seconds=max(audio_capture.BUFFER_SECONDS,
+                                                            len(samples) / audio_capture.SAMPLE_RATE + 1))
+    block_times = []
+    start_cpu = time.process_time()
+    for index in range(0, len(samples), block_size):
+        start_time = time.perf_counter()
+        capture.process_block(samples[index:index + block_size])
+        block_times.append(time.perf_counter() - start_time)
+    cpu_seconds = time.process_time() - start_cpu
+    
+    ends = []
+    while not capture.segments.empty():
+        ends.append(capture.segments.get()[1])
+    return np.array(ends, dtype=np.int64), np.array(block_times), cpu_seconds, capture
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recordings', nargs='*', default=['temp/*.wav'], help="WAV files or glob patterns")
+    parser.add_argument('--block-size', type=int, default=audio_capture.BLOCK_SIZE, help="Samples per block")
+    parser.add_argument('--noise-db', type=float, default=None,
+                        help="Mix in white noise at this level (dB re 16-bit full scale)")
+    parser.add_argument('--tail', type=float, default=1.0, help="Seconds of silence appended to each file")
+    args = parser.parse_args()
+    
+    paths = sorted({path for pattern in args.recordings for path in glob.glob(pattern)})
+    if not paths:
+        print("No recordings found")
+        return
+    
+    rng = np.random.default_rng(0)
+    reference = vad.VoiceActivityDetector(hangover_seconds=audio_capture.PAUSE_SECONDS)
+    latencies = []
+    block_times = []
+    cpu_seconds = 0.0
+    audio_seconds = 0.0
+    reference_count = 0
+    missed = 0
+    extra = 0
+    
+    for path in paths:
+        samples = wake_word.load_audio(path)
+        if samples is None:
+            continue
+        recording_length = len(samples)
+        samples = np.append(samples, np.zeros(int(args.tail * audio_capture.SAMPLE_RATE), dtype=np.float32))
+        samples = samples * 32768.0
+        if args.noise_db is not None:
+            samples = samples + rng.standard_normal(len(samples)) * 10 ** (args.noise_db / 20)
+        samples = np.clip(samples, -32768, 32767).astype(np.int16)
+        
+        speech_ends = reference_speech_ends(samples, reference, recording_length)
+        segment_ends, file_block_times, file_cpu_seconds, capture = replay(samples, args.block_size)
+        
+        # Match every queued phrase to the last reference speech end before it
+        matched = set()
+        for end in segment_ends:
+            candidates = np.flatnonzero(speech_ends <= end)
+            if len(candidates) == 0 or candidates[-1] in matched:
+                extra += 1
+                continue
+            matched.add(candidates[-1])
+            latencies.append((end - speech_ends[candidates[-1]]) / audio_capture.SAMPLE_RATE)
+        missed += len(speech_ends) - len(matched)
+        reference_count += len(speech_ends)
+        
+        block_times.append(file_block_times)
+        cpu_seconds += file_cpu_seconds
+        audio_seconds += len(samples) / audio_capture.SAMPLE_RATE
+        print(f"{path}: {len(segment_ends)} phrases, {len(speech_ends)} reference speech ends, "
+              f"noise floor {capture.vad.noise_db:.1f} dB")
+    
+    block_times = np.concatenate(block_times) * 1e6
+    block_seconds = args.block_size / audio_capture.SAMPLE_RATE
+    latencies = np.array(latencies) * 1000
+    
+    print()
+    print(f"Replayed {audio_seconds:.1f} s of audio from {len(paths)} files in {args.block_size}-sample blocks "
+          f"({block_seconds * 1000:.0f} ms):")
+    if len(latencies):
+        print(f"  endpoint latency  mean {latencies.mean():.0f} ms, p50 {np.percentile(latencies, 50):.0f} ms, "
+              f"p95 {np.percentile(latencies, 95):.0f} ms (hangover {audio_capture.PAUSE_SECONDS * 1000:.0f} ms)")
+    print(f"  phrases           {reference_count - missed}/{reference_count} speech ends endpointed, "
+          f"{extra} extra")
+    print(f"  block processing  p50 {np.percentile(block_times, 50):.0f} us, "
+          f"p99 {np.percentile(block_times, 99):.0f} us, max {block_times.max():.0f} us "
+          f"(budget {block_seconds * 1e6:.0f} us)")
+    print(f"  CPU cost          {cpu_seconds / max(audio_seconds, 1e-9) * 1000:.1f} ms per second of audio, "
+          f"no calibration pauses")
+
+if __name__ == '__main__':
+    main()
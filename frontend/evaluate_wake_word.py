@@ -0,0 +1,124 @@
+"""
+Offline evaluation of the local wake word detector.
+
+Scores archived recordings with wake_word.WakeWordDetector and reports the
+false accept rate (non-wake phrases that would still be sent for
+transcription), the false reject rate (wake phrases the detector would
+drop) and the CPU time the detector spends per second of audio.
+
+Wake phrases are scored leave-one-out: each wake_* recording is matched
+against templates built from the other ones. Negatives default to the
+archived command recordings, which contain speech but no wake word; add
+recordings of background chatter with --negatives.
+
+Usage:
+    python evaluate_wake_word.py [--dir temp] [--negatives "noise/*.wav"] [--threshold 9.5]
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+import wake_word
+
+def load_recordings(patterns):
+    """Load every readable recording matching the glob patterns as (path, samples) pairs"""
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)}, key=os.path.getmtime)
+    recordings = []
+    for path in paths:
+        samples = wake_word.load_audio(path)
+        if samples is not None and len(samples):
+            recordings.append((path, samples))
+    return recordings
+
+def build_detector(templates, threshold):
+    """Create a detector from template recordings (most recent last)"""
+    detector = wake_word.WakeWordDetector(threshold=threshold)
+    for _, samples in templates[-detector.templates.maxlen:]:
+        detector.add_template(samples, calibrate=False)
+    detector.calibrate()
+    return detector
+
+def error_rates(positive_scores, negative_scores, threshold):
+    """False reject and false accept rates at a threshold"""
+    false_rejects = np.mean(positive_scores > threshold) if len(positive_scores) else 0.0
+    false_accepts = np.mean(negative_scores <= threshold) if len(negative_scores) else 0.0
+    return false_rejects, false_accepts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default='temp', help="Directory with the archived recordings")
+    parser.add_argument('--positives', nargs='+', default=None,
+                        help="Glob patterns of wake word recordings (default: DIR/wake_*)")
+    parser.add_argument('--negatives', nargs='+', default=None,
+                        help="Glob patterns of recordings without the wake word "
+                             "(default: DIR/command_* and DIR/unknown_command_*)")
+    parser.add_argument('--threshold', type=float, default=None,
+                        help="Fixed DTW distance threshold (default: calibrated from the templates)")
+    args = parser.parse_args()
+    
+    positives = load_recordings(args.positives or [os.path.join(args.dir, 'wake_*')])
+    negatives = load_recordings(args.negatives or [os.path.join(args.dir, 'command_*'),
+                                                   os.path.join(args.dir, 'unknown_command_*')])
+    if len(positives) < wake_word.MIN_TEMPLATES + 1:
+        print(f"Need at least {wake_word.MIN_TEMPLATES + 1} wake word recordings, found {len(positives)}")
+        return
+    
+    print(f"Evaluating {len(positives)} wake word and {len(negatives)} other recordings")
+    
+    cpu_seconds = 0.0
+    audio_seconds = 0.0
+    
+    # Leave-one-out scores of the wake recordings at each fold's own threshold
+    positive_scores = []
+    positive_rejects = 0
+    for index, (_, samples) in enumerate(positives):
+        detector = build_detector(positives[:index] + positives[index + 1:], args.threshold)
+        start_cpu = time.process_time()
+        score = detector.score(samples)
+        cpu_seconds += time.process_time() - start_cpu
+        audio_seconds += len(samples) / wake_word.SAMPLE_RATE
+        positive_scores.append(score)
+        positive_rejects += score > detector.threshold
+    
+    # Negatives against templates from every wake recording
+    detector = build_detector(positives, args.threshold)
+    negative_scores = []
+    for _, samples in negatives:
+        start_cpu = time.process_time()
+        negative_scores.append(detector.score(samples))
+        cpu_seconds += time.process_time() - start_cpu
+        audio_seconds += len(samples) / wake_word.SAMPLE_RATE
+    
+    positive_scores = np.array(positive_scores)
+    negative_scores = np.array(negative_scores)
+    false_rejects = positive_rejects / len(positives)
+    _, false_accepts = error_rates(positive_scores, negative_scores, detector.threshold)
+    
+    print()
+    print(f"Threshold {detector.threshold:.2f} ({'fixed' if args.threshold is not None else 'calibrated'}, "
+          f"{len(detector.templates)} templates):")
+    print(f"  false reject rate  {false_rejects * 100:5.1f}% of wake phrases dropped")
+    print(f"  false accept rate  {false_accepts * 100:5.1f}% of other phrases sent for transcription")
+    print(f"  CPU cost           {cpu_seconds / max(audio_seconds, 1e-9) * 1000:.1f} ms per second of audio "
+          f"({audio_seconds:.1f} s scored)")
+    
+    # Sweep thresholds over the observed scores to show the trade-off
+    finite_scores = np.concatenate([positive_scores, negative_scores])
+    finite_scores = finite_scores[np.isfinite(finite_scores)]
+    if len(finite_scores):
+        print()
+        print("  threshold    FRR     FAR")
+        best = None
+        for threshold in np.linspace(finite_scores.min(), finite_scores.max(), 11):
+            frr, far = error_rates(positive_scores, negative_scores, threshold)
+            print(f"  {threshold:9.2f}  {frr * 100:5.1f}%  {far * 100:5.1f}%")
+            if best is None or abs(frr - far) < abs(best[1] - best[2]):
+                best = (threshold, frr, far)
+        print(f"  closest to equal error rate: threshold {best[0]:.2f} "
+              f"(FRR {best[1] * 100:.1f}%, FAR {best[2] * 100:.1f}%)")
+
+if __name__ == '__main__':
+    main()
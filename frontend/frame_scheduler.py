@@ -0,0 +1,127 @@
+"""
+Adaptive frame scheduling for the avatar window.
+
+The overlay only needs 60 FPS while something on screen is moving quickly
+(voice activation, speech, the halo). The rest of the time the avatar is
+still apart from a slow head drift, so the main loop drops to a low idle
+rate and only redraws when the head rotation moves by a perceptible amount
+or the displayed scene otherwise changes.
+"""
+import time
+
+# Main loop rates in frames per second
+ACTIVE_FPS = 60
+IDLE_FPS = 15
+
+# Smallest head rotation change (radians) worth redrawing for while idle
+ROTATION_THRESHOLD = 0.002
+
+# Longest time an idle window goes without a redraw
+MAX_IDLE_INTERVAL = 1.0
+
+class FrameScheduler:
+    """
+    Decides the main loop rate and whether each iteration needs a redraw.
+    
+    Call should_render() once per loop iteration after updating the scene
+    state and before work only a drawn frame needs (posing the skeleton,
+    drawing), draw and flip only if it returns True, sleep with
+    clock.tick(scheduler.frame_rate) and then call end_frame(). Frame rates
+    and CPU time are accumulated per mode ('active' and 'idle') for
+    format_stats().
+    """
+    
+    def __init__(self, active_fps=ACTIVE_FPS, idle_fps=IDLE_FPS,
+                 rotation_threshold=ROTATION_THRESHOLD, max_idle_interval=MAX_IDLE_INTERVAL):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            active_fps: Loop and render rate while the scene is active
+            idle_fps: Loop rate while idle (frames are only drawn on change)
+            rotation_threshold: Head rotation change in radians that triggers an idle redraw
+            max_idle_interval: Seconds after which an idle window is redrawn anyway
+        """
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.rotation_threshold = rotation_threshold
+        self.max_idle_interval = max_idle_interval
+        
+        self.mode = 'active'
+        self.frame_rate = active_fps
+        self._rendered = False
+        self._last_rotation = None
+        self._last_scene_key = None
+        self._last_render_time = 0.0
+        
+        self._frame_start = time.perf_counter()
+        self._frame_cpu_start = time.process_time()
+        self.stats = {
+            mode: {'loops': 0, 'frames': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0}
+            for mode in ('active', 'idle')
+        }
+    
+    def should_render(self, active, rotation, scene_key=None, animating=False):
+        """
+        Pick the mode for this loop iteration and decide whether to redraw.
+        
+        Args:
+            active: Whether anything on screen animates quickly (activation,
+                speech, the halo); active frames are always drawn
+            rotation: Current head rotation as a sequence of angles in radians
+            scene_key: Any hashable summary of the rest of the displayed scene
+                (e.g. the speech bubble text); a change forces a redraw
+            animating: Whether a skeletal animation clip is playing; its
+                frames are drawn at the active rate
+        
+        Returns:
+            True if the frame should be drawn and flipped
+        """
+        now = time.perf_counter()
+        active = active or animating
+        self.mode = 'active' if active else 'idle'
+        self.frame_rate = self.active_fps if active else self.idle_fps
+        
+        if active or self._last_rotation is None or scene_key != self._last_scene_key:
+            render = True
+        elif now - self._last_render_time >= self.max_idle_interval:
+            render = True
+        else:
+            render = any(abs(angle - last) >= self.rotation_threshold
+                         for angle, last in zip(rotation, self._last_rotation))
+        
+        if render:
+            self._last_rotation = tuple(rotation)
+            self._last_scene_key = scene_key
+            self._last_render_time = now
+        self._rendered = render
+        return render
+    
+    def end_frame(self):
+        """Attribute the wall and CPU time since the previous call to the current mode"""
+        now = time.perf_counter()
+        cpu_now = time.process_time()
+        
+        stats = self.stats[self.mode]
+        stats['loops'] += 1
+        stats['frames'] += 1 if self._rendered else 0
+        stats['wall_seconds'] += now - self._frame_start
+        stats['cpu_seconds'] += cpu_now - self._frame_cpu_start
+        
+        self._frame_start = now
+        self._frame_cpu_start = cpu_now
+    
+    def format_stats(self):
+        """Summarize the average frame rate and process CPU time of each mode"""
+        lines = []
+        for mode, stats in self.stats.items():
+            if not stats['loops']:
+                continue
+            wall_seconds = max(stats['wall_seconds'], 1e-9)
+            lines.append(
+                f"{mode}: {wall_seconds:.1f}s, {stats['frames'] / wall_seconds:.1f} FPS drawn "
+                f"({stats['loops'] / wall_seconds:.1f} loops/s), "
+                f"{stats['cpu_seconds'] / wall_seconds * 100:.1f}% CPU, "
+                f"{stats['cpu_seconds'] / stats['loops'] * 1000:.2f} ms CPU/loop"
+            )
+        return "; ".join(lines)
@@ -0,0 +1,350 @@
+"""
+Skeletal animation for models loaded by gltf_loader.
+
+The loader parses the skin, the nodes above its joints and the animation
+samplers into compact NumPy arrays; this module evaluates them. Keyframes for all channels
+of an animation are sampled together with vectorized interpolation, and node
+matrices are composed one hierarchy level at a time, so a pose costs a
+handful of NumPy calls rather than a Python loop per joint.
+
+What doesn't change from frame to frame is worked out once per animation:
+the keyframe times of a channel group flattened into one sorted array, so
+a single searchsorted finds every channel's keyframe (keyframe_search),
+and which nodes the animation moves at all (pose_plan). Nodes it doesn't
+move, directly or through an ancestor, keep their rest world and joint
+matrices and are left out of the hierarchy walk.
+
+All matrices are row-major in the pyrr convention (points are row vectors,
+`a @ b` applies a first). Their bytes read as column-major GLSL matrices, so
+joint matrices are written to the skinning uniform block as-is.
+"""
+import numpy as np
+
+# Interpolation modes of GLTF animation samplers
+INTERPOLATIONS = ('LINEAR', 'STEP', 'CUBICSPLINE')
+# Node properties animated by GLTF channels and their component counts
+ANIMATION_PATHS = {
+    'translation': 3,
+    'rotation': 4,
+    'scale': 3,
+}
+
+def _rotation_coefficients():
+    """(16, 9) matrix taking the quaternion products q_i * q_j to the rotation block minus the identity"""
+    x, y, z, w = range(4)
+    terms = [
+        [(y, y, -2), (z, z, -2)], [(x, y, 2), (z, w, 2)], [(x, z, 2), (y, w, -2)],
+        [(x, y, 2), (z, w, -2)], [(x, x, -2), (z, z, -2)], [(y, z, 2), (x, w, 2)],
+        [(x, z, 2), (y, w, 2)], [(y, z, 2), (x, w, -2)], [(x, x, -2), (y, y, -2)],
+    ]
+    coefficients = np.zeros((16, 9), dtype=np.float32)
+    for element, products in enumerate(terms):
+        for i, j, factor in products:
+            coefficients[i * 4 + j, element] = factor
+    return coefficients
+
+# Rows of the transposed rotation matrix as one product with the quaternion products
+ROTATION_COEFFICIENTS = _rotation_coefficients()
+IDENTITY_3 = np.eye(3, dtype=np.float32)
+
+def compose_matrices(translations, rotations, scales, out=None):
+    """
+    Build local node matrices from translation, rotation and scale arrays.
+    
+    Args:
+        translations: (n, 3) array of translations
+        rotations: (n, 4) array of unit quaternions (x, y, z, w)
+        scales: (n, 3) array of scales
+        out: Optional (n, 4, 4) float32 array to write into
+    
+    Returns:
+        (n, 4, 4) array of row-major matrices (scale, then rotate, then translate)
+    """
+    count = len(translations)
+    if out is None:
+        out = np.empty((count, 4, 4), dtype=np.float32)
+    
+    # Rows of the transposed rotation matrix, each scaled by its axis scale:
+    # every element is a signed sum of quaternion products, so all nine come
+    # from one matrix product
+    rotations = np.asarray(rotations, dtype=np.float32)
+    products = (rotations[:, :, np.newaxis] * rotations[:, np.newaxis, :]).reshape(count, 16)
+    rotation = (products @ ROTATION_COEFFICIENTS).reshape(count, 3, 3)
+    rotation += IDENTITY_3
+    np.multiply(rotation, scales[:, :, np.newaxis], out=out[:, :3, :3])
+    
+    out[:, :3, 3] = 0.0
+    out[:, 3, :3] = translations
+    out[:, 3, 3] = 1.0
+    return out
+
+def create_pose(skeleton):
+    """
+    Preallocate the arrays a skeleton is posed into.
+    
+    Args:
+        skeleton: Skeleton data parsed by gltf_loader
+    
+    Returns:
+        Dictionary with local and world node matrices and the joint matrices,
+        initialized to the rest pose
+    """
+    pose = {
+        'local': np.array(skeleton['matrices'], dtype=np.float32),
+        'world': np.zeros_like(skeleton['matrices'], dtype=np.float32),
+        'joint_matrices': np.zeros((len(skeleton['joints']), 4, 4), dtype=np.float32),
+        # Animation the arrays were last posed with (None for the rest pose)
+        'animation': None
+    }
+    update_pose(skeleton, pose)
+    pose['rest_world'] = pose['world'].copy()
+    pose['rest_joint_matrices'] = pose['joint_matrices'].copy()
+    return pose
+
+def keyframe_search(channels):
+    """
+    Flatten a channel group's keyframe times for one searchsorted per sample.
+    
+    Row r's times are offset by r * stride, one second more than the span of
+    all keyframes, and its +inf padding is replaced by half a second after
+    the last keyframe, so the rows form one sorted array. Sample times are
+    clamped to a quarter second before the first keyframe (or 0) and the
+    last keyframe, which keeps every query inside its own row without
+    changing which keyframes it falls between.
+    
+    Returns:
+        Dictionary with the flat times, the per-row query offsets and the
+        clamp range, cached in channels['search']
+    """
+    search = channels.get('search')
+    if search is None:
+        times = np.asarray(channels['times'], dtype=np.float64)
+        finite = times[np.isfinite(times)]
+        last_time = float(finite.max()) if len(finite) else 0.0
+        first_time = float(finite.min()) if len(finite) else 0.0
+        stride = last_time - min(first_time, 0.0) + 1.0
+        offsets = np.arange(len(times)) * stride
+        padded = np.where(np.isfinite(times), times, last_time + 0.5)
+        search = channels['search'] = {
+            'flat_times': (padded + offsets[:, np.newaxis]).ravel(),
+            'offsets': offsets,
+            'row_starts': np.arange(len(times)) * times.shape[1],
+            'min_time': min(first_time, 0.0) - 0.25,
+            'max_time': last_time
+        }
+    return search
+
+def pose_plan(skeleton, animation, rest_world):
+    """
+    Nodes and joints an animation moves, cached in animation['plan'].
+    
+    A node moves when it or one of its ancestors is animated; the others
+    keep their rest world matrices. The world matrices of the moving nodes
+    are composed by pointer jumping rather than level by level: each node
+    starts with its local matrix (times its parent's rest world matrix if
+    the parent doesn't move) and a pointer to its moving parent, and every
+    step multiplies in the product its pointer holds and follows the
+    pointer's pointer. A chain of depth d takes ceil(log2(d)) batched
+    products instead of d.
+    
+    Args:
+        skeleton: Skeleton data parsed by gltf_loader
+        animation: Animation data parsed by gltf_loader
+        rest_world: World matrices of the rest pose
+    
+    Returns:
+        Dictionary with the moving nodes, the fixed factors of their
+        chains, the pointers of every step, a work buffer and the moving
+        joints with their inverse bind matrices
+    """
+    plan = animation.get('plan')
+    if plan is None:
+        parents = skeleton['parents']
+        moving = np.zeros(len(parents), dtype=bool)
+        moving[animation['nodes']] = True
+        # Nodes are sorted by depth, so parents are settled before their children
+        for node in range(len(parents)):
+            if parents[node] >= 0 and moving[parents[node]]:
+                moving[node] = True
+        nodes = np.flatnonzero(moving)
+        count = len(nodes)
+        positions = np.full(len(parents), count, dtype=np.int64)
+        positions[nodes] = np.arange(count)
+        
+        # Position count is the end of every chain: an identity matrix
+        bases = np.tile(np.eye(4, dtype=np.float32), (count, 1, 1))
+        pointers = np.full(count + 1, count, dtype=np.int64)
+        for position, node in enumerate(nodes):
+            parent = parents[node]
+            if parent < 0:
+                continue
+            if moving[parent]:
+                pointers[position] = positions[parent]
+            else:
+                bases[position] = rest_world[parent]
+        steps = []
+        while (pointers[:count] != count).any():
+            steps.append(pointers[:count].copy())
+            pointers = pointers[pointers]
+        
+        buffer = np.zeros((count + 1, 4, 4), dtype=np.float32)
+        buffer[count] = np.eye(4, dtype=np.float32)
+        joints = np.flatnonzero(moving[skeleton['joints']])
+        plan = animation['plan'] = {
+            'nodes': nodes,
+            'bases': bases,
+            'steps': steps,
+            'buffer': buffer,
+            'joints': joints,
+            'joint_nodes': np.asarray(skeleton['joints'])[joints],
+            'inverse_bind_matrices': np.asarray(skeleton['inverse_bind_matrices'])[joints]
+        }
+    return plan
+
+def sample_channels(channels, time):
+    """
+    Sample every channel of a sampler group at the same time.
+    
+    Args:
+        channels: Channel group parsed by gltf_loader (same path and interpolation)
+        time: Animation time in seconds
+    
+    Returns:
+        (channels, components) array of sampled values
+    """
+    times = channels['times']
+    counts = channels['counts']
+    values = channels['values']
+    rows = np.arange(len(times))
+    
+    # The number of keys at or before the time is the next keyframe of every
+    # channel; one search over the flattened rows finds them all at once
+    search = keyframe_search(channels)
+    # Compared in float32 like the keyframe times
+    query = min(max(float(np.float32(time)), search['min_time']), search['max_time'])
+    keys_before = np.searchsorted(search['flat_times'], search['offsets'] + query, side='right') - search['row_starts']
+    next_keys = np.minimum(keys_before, counts - 1)
+    previous_keys = np.maximum(next_keys - 1, 0)
+    start_times = times[rows, previous_keys]
+    durations = times[rows, next_keys] - start_times
+    
+    # Before the first or after the last keyframe both keys are the same
+    # (or the factor clamps to 1), which holds the end value
+    factors = np.zeros(len(times), dtype=np.float32)
+    np.divide(time - start_times, durations, out=factors, where=durations > 0)
+    np.clip(factors, 0.0, 1.0, out=factors)
+    
+    interpolation = channels['interpolation']
+    if interpolation == 'STEP':
+        return values[rows, np.where(factors >= 1.0, next_keys, previous_keys)]
+    
+    if interpolation == 'CUBICSPLINE':
+        # Values are stored as (in-tangent, value, out-tangent) triplets
+        s = factors[:, np.newaxis]
+        s2 = s * s
+        s3 = s2 * s
+        scaled_durations = durations[:, np.newaxis]
+        result = ((2 * s3 - 3 * s2 + 1) * values[rows, previous_keys, 1]
+                  + (s3 - 2 * s2 + s) * scaled_durations * values[rows, previous_keys, 2]
+                  + (-2 * s3 + 3 * s2) * values[rows, next_keys, 1]
+                  + (s3 - s2) * scaled_durations * values[rows, next_keys, 0])
+        if channels['path'] == 'rotation':
+            result /= np.linalg.norm(result, axis=1, keepdims=True)
+        return result
+    
+    start_values = values[rows, previous_keys]
+    end_values = values[rows, next_keys]
+    if channels['path'] != 'rotation':
+        return start_values + (end_values - start_values) * factors[:, np.newaxis]
+    
+    # Spherical linear interpolation along the shorter arc, falling back to
+    # linear interpolation for nearly identical rotations
+    dots = np.einsum('ij,ij->i', start_values, end_values)
+    end_values = np.where(dots[:, np.newaxis] < 0.0, -end_values, end_values)
+    dots = np.abs(dots)
+    angles = np.arccos(np.minimum(dots, 1.0))
+    sines = np.sin(angles)
+    small = sines < 1e-6
+    safe_sines = np.where(small, 1.0, sines)
+    start_weights = np.where(small, 1.0 - factors, np.sin((1.0 - factors) * angles) / safe_sines)
+    end_weights = np.where(small, factors, np.sin(factors * angles) / safe_sines)
+    result = start_values * start_weights[:, np.newaxis] + end_values * end_weights[:, np.newaxis]
+    result /= np.linalg.norm(result, axis=1, keepdims=True)
+    return result
+
+def update_pose(skeleton, pose, animation=None, time=0.0, loop=True):
+    """
+    Pose a skeleton at an animation time and compute its joint matrices.
+    
+    Args:
+        skeleton: Skeleton data parsed by gltf_loader
+        pose: Pose arrays from create_pose, updated in place
+        animation: Animation data parsed by gltf_loader (None for the rest pose)
+        time: Animation time in seconds
+        loop: Wrap the time around the animation's duration instead of
+            holding the last keyframe
+    
+    Returns:
+        The (joints, 4, 4) joint matrix array in pose['joint_matrices']
+    """
+    local = pose['local']
+    world = pose['world']
+    
+    if animation is None or 'rest_world' not in pose:
+        # The rest pose (or any pose while create_pose sets up): every node
+        local[...] = skeleton['matrices']
+        if animation is not None:
+            _pose_animated(skeleton, local, animation, time, loop)
+        
+        # Compose world matrices one hierarchy level at a time; nodes are
+        # sorted by depth so every level is a contiguous slice
+        parents = skeleton['parents']
+        levels = skeleton['levels']
+        world[:levels[1]] = local[:levels[1]]
+        for start, end in zip(levels[1:-1], levels[2:]):
+            np.matmul(local[start:end], world[parents[start:end]], out=world[start:end])
+        
+        # Joint matrices take bind-pose vertices to the posed joints
+        np.matmul(skeleton['inverse_bind_matrices'], world[skeleton['joints']], out=pose['joint_matrices'])
+        pose['animation'] = animation
+        return pose['joint_matrices']
+    
+    if pose['animation'] is not animation:
+        # Nodes the previous animation moved go back to rest
+        local[...] = skeleton['matrices']
+        world[...] = pose['rest_world']
+        pose['joint_matrices'][...] = pose['rest_joint_matrices']
+        pose['animation'] = animation
+    
+    _pose_animated(skeleton, local, animation, time, loop)
+    
+    # Only the nodes the animation moves are composed again
+    plan = pose_plan(skeleton, animation, pose['rest_world'])
+    nodes = plan['nodes']
+    chains = plan['buffer']
+    products = chains[:len(nodes)]
+    np.matmul(local[nodes], plan['bases'], out=products)
+    for pointers in plan['steps']:
+        products[...] = np.matmul(products, chains[pointers])
+    world[nodes] = products
+    
+    pose['joint_matrices'][plan['joints']] = np.matmul(plan['inverse_bind_matrices'], world[plan['joint_nodes']])
+    return pose['joint_matrices']
+
+def _pose_animated(skeleton, local, animation, time, loop):
+    """Write the local matrices of the nodes an animation targets at a time"""
+    if loop and animation['duration'] > 0:
+        time = time % animation['duration']
+    
+    # Start the animated nodes from their rest transforms and override
+    # the animated properties
+    nodes = animation['nodes']
+    properties = {
+        'translation': skeleton['translations'][nodes],
+        'rotation': skeleton['rotations'][nodes],
+        'scale': skeleton['scales'][nodes],
+    }
+    for channels in animation['channels']:
+        properties[channels['path']][channels['targets']] = sample_channels(channels, time)
+    
+    local[nodes] = compose_matrices(properties['translation'], properties['rotation'], properties['scale'])
@@ -4,9 +4,16 @@ from pygltflib import GLTF2
 import base64
 import os
 import struct
+import json
+import re
+import time
+import hashlib
+import weakref
 from PIL import Image
 import io
 
+import gltf_animation
+
 # OpenGL constants for texture parameters
 # Filters
 GL_NEAREST = 9728
@@ -20,30 +27,434 @@ GL_CLAMP_TO_EDGE = 33071
 GL_MIRRORED_REPEAT = 33648
 GL_REPEAT = 10497
 
-def load_gltf(ctx, file_path):
+# Precompiled model cache settings
+# Bump CACHE_VERSION whenever the layout of the cached data changes so caches
+# written by an older loader are rebuilt instead of misread.
+CACHE_VERSION = 4
+CACHE_DIR_NAME = '.cache'
+CACHE_ALIGNMENT = 16
+
+# Accessor component types (GLTF componentType) and their NumPy dtypes
+COMPONENT_DTYPES = {
+    5120: np.int8,     # GL_BYTE
+    5121: np.uint8,    # GL_UNSIGNED_BYTE
+    5122: np.int16,    # GL_SHORT
+    5123: np.uint16,   # GL_UNSIGNED_SHORT
+    5125: np.uint32,   # GL_UNSIGNED_INT
+    5126: np.float32,  # GL_FLOAT
+}
+# Number of components for each accessor type
+TYPE_COMPONENTS = {
+    'SCALAR': 1,
+    'VEC2': 2,
+    'VEC3': 3,
+    'VEC4': 4,
+    'MAT2': 4,
+    'MAT3': 9,
+    'MAT4': 16,
+}
+# Vertex attribute format characters (ModernGL) for each component type
+ATTRIBUTE_FORMATS = {
+    5120: 'i1',
+    5121: 'u1',
+    5122: 'i2',
+    5123: 'u2',
+    5125: 'u4',
+    5126: 'f',
+}
+# NumPy dtypes for the ModernGL attribute format characters above
+FORMAT_DTYPES = {
+    'i1': np.int8,
+    'u1': np.uint8,
+    'i2': np.int16,
+    'u2': np.uint16,
+    'u4': np.uint32,
+    'f': np.float32,
+}
+# Shader attribute names and the GLTF attributes they are read from
+VERTEX_ATTRIBUTES = [
+    ('in_position', 'POSITION'),
+    ('in_normal', 'NORMAL'),
+    ('in_texcoord_0', 'TEXCOORD_0'),
+    ('in_joints_0', 'JOINTS_0'),
+    ('in_weights_0', 'WEIGHTS_0'),
+]
+# Attributes read as integers by the shaders (bound with ModernGL's 'i' class)
+INTEGER_ATTRIBUTES = {'in_joints_0'}
+
+# Uniform block binding points shared by every program
+CAMERA_BLOCK_BINDING = 0
+MODEL_BLOCK_BINDING = 1
+SKIN_BLOCK_BINDING = 2
+
+# Size of the joint matrix array in the skinning shader; skins with more
+# joints are drawn in their bind pose
+MAX_JOINTS = 128
+
+# GLSL declarations of the shared per-frame uniform blocks. Shaders include
+# this after their #version line to read the camera and model matrices.
+# The model block carries the model-view-projection and normal matrices
+# precomputed on the CPU, so vertex shaders don't multiply or invert
+# matrices per vertex (the normal matrix is a std140 mat3, i.e. three
+# vec4-padded columns).
+UNIFORM_BLOCKS_GLSL = '''
+        layout(std140) uniform Camera {
+            mat4 view;
+            mat4 projection;
+        };
+        
+        layout(std140) uniform Model {
+            mat4 model;
+            mat4 mvp;
+            mat3 normal_matrix;
+        };
+'''
+
+# Lighting functions for the model fragment shader, selected with the
+# lighting argument of load_gltf/set_lighting. Each one returns the light
+# reaching a fragment from its normalized normal and world position.
+DEFAULT_LIGHTING = 'three_point'
+LIGHTING_MODES = {
+    # Warm key light, cool back light and neutral fill light
+    'three_point': '''
+        vec3 lighting(vec3 norm, vec3 world_position) {
+            // Multiple light positions for better texture visibility
+            vec3 lightPos1 = vec3(5.0, 8.0, 5.0);
+            vec3 lightPos2 = vec3(-5.0, 5.0, -2.0); // Back light
+            vec3 lightPos3 = vec3(0.0, 3.0, 8.0);   // Front light
+            
+            vec3 lightColor1 = vec3(1.0, 0.9, 0.8); // Warm main light
+            vec3 lightColor2 = vec3(0.6, 0.7, 1.0); // Cool back light
+            vec3 lightColor3 = vec3(0.9, 0.9, 1.0); // Neutral fill light
+            
+            // Ambient lighting - brighter for better texture visibility
+            float ambientStrength = 0.45;
+            vec3 ambient = ambientStrength * vec3(1.0, 1.0, 1.0);
+            
+            // Calculate diffuse lighting for each light
+            vec3 lightDir1 = normalize(lightPos1 - world_position);
+            float diff1 = max(dot(norm, lightDir1), 0.0);
+            vec3 diffuse1 = diff1 * lightColor1;
+            
+            vec3 lightDir2 = normalize(lightPos2 - world_position);
+            float diff2 = max(dot(norm, lightDir2), 0.0);
+            vec3 diffuse2 = diff2 * lightColor2 * 0.5; // Dimmer back light
+            
+            vec3 lightDir3 = normalize(lightPos3 - world_position);
+            float diff3 = max(dot(norm, lightDir3), 0.0);
+            vec3 diffuse3 = diff3 * lightColor3 * 0.7; // Medium fill light
+            
+            // Combine lighting
+            return ambient + diffuse1 + diffuse2 + diffuse3;
+        }
+    ''',
+    # Single directional key light, cheaper on software GL
+    'key_light': '''
+        vec3 lighting(vec3 norm, vec3 world_position) {
+            vec3 lightDir = normalize(vec3(0.4, 0.6, 0.7));
+            float diff = max(dot(norm, lightDir), 0.0);
+            return vec3(0.45) + diff * vec3(1.0, 0.95, 0.9);
+        }
+    ''',
+    # Base color only
+    'unlit': '''
+        vec3 lighting(vec3 norm, vec3 world_position) {
+            return vec3(1.0);
+        }
+    ''',
+}
+
+# Compiled model programs per context and lighting mode
+_programs = weakref.WeakKeyDictionary()
+
+def create_frame_uniforms(ctx):
+    """
+    Create the per-frame camera uniform buffer shared by all programs and models.
+    
+    Args:
+        ctx: The ModernGL context
+    
+    Returns:
+        Dictionary with the preallocated float32 block data and its uniform buffer
+    """
+    data = np.zeros((2, 4, 4), dtype='f4')
+    return {'data': data, 'buffer': ctx.buffer(reserve=data.nbytes)}
+
+def update_frame_uniforms(frame_uniforms, view_matrix, projection_matrix):
+    """Write the camera block once per frame and bind it for every program"""
+    data = frame_uniforms['data']
+    np.copyto(data[0], view_matrix, casting='unsafe')
+    np.copyto(data[1], projection_matrix, casting='unsafe')
+    frame_uniforms['buffer'].write(data)
+    frame_uniforms['buffer'].bind_to_uniform_block(CAMERA_BLOCK_BINDING)
+
+def create_model_uniforms(ctx):
+    """
+    Create a model block uniform buffer (one per rendered object).
+    
+    Args:
+        ctx: The ModernGL context
+    
+    Returns:
+        Dictionary with the preallocated float32 block data, views of its
+        model, mvp and normal matrices, and its uniform buffer
+    """
+    data = np.zeros(16 + 16 + 12, dtype='f4')
+    return {
+        'data': data,
+        'model': data[0:16].reshape(4, 4),
+        'mvp': data[16:32].reshape(4, 4),
+        'normal_matrix': data[32:44].reshape(3, 4),
+        'buffer': ctx.buffer(reserve=data.nbytes)
+    }
+
+def update_model_uniforms(model_uniforms, model_matrix, frame_uniforms):
+    """
+    Compute an object's MVP and normal matrices and write its model block.
+    
+    Matrices are row-major pyrr matrices, which read as column-major GLSL
+    matrices, so the GLSL projection * view * model product is
+    model @ view @ projection here. Call this after update_frame_uniforms
+    for the frame, since the MVP matrix uses the current camera block.
+    
+    Args:
+        model_uniforms: Model block from create_model_uniforms
+        model_matrix: The object's model matrix
+        frame_uniforms: Camera block from create_frame_uniforms
+    """
+    model = model_uniforms['model']
+    np.copyto(model, model_matrix, casting='unsafe')
+    view, projection = frame_uniforms['data']
+    np.matmul(np.matmul(model, view), projection, out=model_uniforms['mvp'])
+    
+    # The GLSL normal matrix transpose(inverse(mat3(model))) is written
+    # column-major, so as a row-major array it's the transposed inverse of
+    # the pyrr matrix
+    model_uniforms['normal_matrix'][:, :3] = np.linalg.inv(model[:3, :3]).T
+    
+    model_uniforms['buffer'].write(model_uniforms['data'])
+    model_uniforms['buffer'].bind_to_uniform_block(MODEL_BLOCK_BINDING)
+
+def create_skin_uniforms(ctx):
+    """
+    Create a skin block uniform buffer holding a skinned model's joint matrices.
+    
+    Args:
+        ctx: The ModernGL context
+    
+    Returns:
+        Dictionary with the uniform buffer, sized for MAX_JOINTS matrices
+    """
+    return {'buffer': ctx.buffer(reserve=MAX_JOINTS * 64)}
+
+def bind_uniform_blocks(program):
+    """Point a program's Camera, Model and Skin blocks at the shared binding points"""
+    if 'Camera' in program:
+        program['Camera'].binding = CAMERA_BLOCK_BINDING
+    if 'Model' in program:
+        program['Model'].binding = MODEL_BLOCK_BINDING
+    if 'Skin' in program:
+        program['Skin'].binding = SKIN_BLOCK_BINDING
+
+def get_program(ctx, lighting=DEFAULT_LIGHTING, skinned=False):
+    """
+    Get the model shader program for a lighting mode, compiling it on first use.
+    
+    Args:
+        ctx: The ModernGL context
+        lighting: Name of a lighting mode in LIGHTING_MODES
+        skinned: Whether to get the skinning variant, which reads joint
+            matrices from the Skin uniform block
+    
+    Returns:
+        The ModernGL program, shared by every model using this variant
+    """
+    if lighting not in LIGHTING_MODES:
+        raise ValueError(f"Unknown lighting mode {lighting!r}, expected one of {sorted(LIGHTING_MODES)}")
+    
+    programs = _programs.setdefault(ctx, {})
+    if (lighting, skinned) not in programs:
+        programs[(lighting, skinned)] = _create_program(ctx, LIGHTING_MODES[lighting], skinned)
+    return programs[(lighting, skinned)]
+
+def _create_program(ctx, lighting_glsl, skinned):
+    """Compile the model program with the given lighting function"""
+    if skinned:
+        skinning_glsl = '''
+        layout(std140) uniform Skin {
+            mat4 joint_matrices[''' + str(MAX_JOINTS) + '''];
+        };
+        
+        in ivec4 in_joints_0;
+        in vec4 in_weights_0;
+        
+        mat4 skin_matrix() {
+            return in_weights_0.x * joint_matrices[in_joints_0.x]
+                 + in_weights_0.y * joint_matrices[in_joints_0.y]
+                 + in_weights_0.z * joint_matrices[in_joints_0.z]
+                 + in_weights_0.w * joint_matrices[in_joints_0.w];
+        }
+        '''
+    else:
+        skinning_glsl = '''
+        mat4 skin_matrix() {
+            return mat4(1.0);
+        }
+        '''
+    
+    vertex_shader = '''
+        #version 330
+    ''' + UNIFORM_BLOCKS_GLSL + skinning_glsl + '''
+        in vec3 in_position;
+        in vec3 in_normal;
+        in vec2 in_texcoord_0;
+        
+        out vec3 normal;
+        out vec2 texcoord_0;
+        out vec3 world_position;
+        
+        void main() {
+            mat4 skin = skin_matrix();
+            vec4 skinned_position = skin * vec4(in_position, 1.0);
+            world_position = vec3(model * skinned_position);
+            normal = normal_matrix * (mat3(skin) * in_normal);
+            texcoord_0 = in_texcoord_0;
+            gl_Position = mvp * skinned_position;
+        }
+    '''
+    
+    fragment_shader = '''
+        #version 330
+        
+        uniform vec4 baseColorFactor;
+        uniform sampler2D baseColorTexture;
+        uniform bool hasBaseColorTexture;
+        
+        in vec3 normal;
+        in vec2 texcoord_0;
+        in vec3 world_position;
+        
+        out vec4 fragColor;
+    ''' + lighting_glsl + '''
+        void main() {
+            // Normalize the normal vector
+            vec3 norm = normalize(normal);
+            
+            // Get base color from material and/or texture
+            vec4 baseColor = baseColorFactor;
+            if (hasBaseColorTexture) {
+                // Sample the texture with the corrected UV coordinates
+                baseColor *= texture(baseColorTexture, texcoord_0);
+            }
+            
+            // Apply lighting to the color
+            vec3 finalColor = lighting(norm, world_position) * baseColor.rgb;
+            
+            // Output final color with original alpha
+            fragColor = vec4(finalColor, baseColor.a);
+        }
+    '''
+    
+    program = ctx.program(
+        vertex_shader=vertex_shader,
+        fragment_shader=fragment_shader
+    )
+    bind_uniform_blocks(program)
+    return program
+
+def load_gltf(ctx, file_path, use_cache=True, cache_dir=None, merge_primitives=False, frame_uniforms=None,
+              lighting=DEFAULT_LIGHTING):
     """
     Load a GLTF file and prepare it for rendering with ModernGL.
     
+    The first load parses the GLTF file and writes a precompiled binary cache
+    (GPU-ready vertex/index arrays and decoded RGBA texture data). Later loads
+    memory-map that cache and upload it directly, skipping the GLTF parse, the
+    PNG decode and the per-primitive array rebuilding.
+    
     Args:
         ctx: The ModernGL context
         file_path: Path to the GLTF file
-        
+        use_cache: Whether to read and write the precompiled model cache
+        cache_dir: Directory for the cache files (defaults to a .cache folder next to the GLTF file)
+        merge_primitives: Merge primitives that share a material into a single
+            draw call (node transforms are ignored by the renderer, so this
+            doesn't change the rendered result)
+        frame_uniforms: Camera uniforms from create_frame_uniforms to share
+            with other models (a new one is created if not given)
+        lighting: Name of a lighting mode in LIGHTING_MODES (see also set_lighting)
+    
     Returns:
         Dictionary containing the loaded model data and rendering information
     """
+    start_time = time.perf_counter()
+    
+    model_data = None
+    cache_status = 'disabled'
+    if use_cache:
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(file_path), CACHE_DIR_NAME)
+        model_data = _read_model_cache(file_path, cache_dir, merge_primitives)
+        cache_status = 'hit' if model_data is not None else 'miss'
+    
+    if model_data is None:
+        model_data = _parse_gltf(file_path)
+        if merge_primitives:
+            _merge_primitives(model_data)
+        if use_cache:
+            _write_model_cache(file_path, cache_dir, model_data, merge_primitives)
+    
+    model = _upload_model(ctx, model_data, lighting)
+    model['frame_uniforms'] = frame_uniforms if frame_uniforms is not None else create_frame_uniforms(ctx)
+    model['model_uniforms'] = create_model_uniforms(ctx)
+    
+    # Skinned models start in the rest pose until animate_gltf is called
+    if model['skeleton'] is not None:
+        model['pose'] = gltf_animation.create_pose(model['skeleton'])
+        model['skin_uniforms'] = create_skin_uniforms(ctx)
+        model['skin_uniforms']['buffer'].write(model['pose']['joint_matrices'])
+    
+    model['load_stats'] = {
+        'cache': cache_status,
+        'seconds': time.perf_counter() - start_time
+    }
+    print(f"Loaded model {os.path.basename(file_path)} in {model['load_stats']['seconds']:.3f}s (cache: {cache_status})")
+    
+    return model
+
+def _parse_gltf(file_path):
+    """
+    Parse a GLTF file into plain NumPy arrays and dictionaries.
+    
+    Nothing in the returned data depends on the ModernGL context, which is
+    what allows it to be cached on disk and uploaded later.
+    
+    Args:
+        file_path: Path to the GLTF file
+    
+    Returns:
+        Dictionary with the model's source files, buffer views, samplers, images,
+        textures, primitives, skeleton and animations. Primitives reference
+        their vertex and index data as (bufferView, offset, stride, format)
+        bindings rather than holding their own arrays.
+    """
     # Load the GLTF file
     gltf = GLTF2().load(file_path)
     
     model_dir = os.path.dirname(file_path)
     
     # Dictionary to store the model data
-    model = {
-        'meshes': [],
-        'buffers': [],
+    model_data = {
+        'sources': [file_path],
+        'buffer_views': [None] * len(gltf.bufferViews),
+        'primitives': [],
         'images': [],
         'textures': [],
-        'samplers': []
+        'samplers': [],
+        'skeleton': None,
+        'animations': []
     }
+    buffers = []
     
     # Load buffers
     for i, buffer in enumerate(gltf.buffers):
@@ -52,15 +463,16 @@ def load_gltf(ctx, file_path):
                 # Handle embedded buffer (data URI)
                 _, data_str = buffer.uri.split(',', 1)
                 data = base64.b64decode(data_str)
-                model['buffers'].append(data)
+                buffers.append(np.frombuffer(data, dtype=np.uint8))
             else:
                 # Handle external buffer file
+                # Memory-map it so accessors become views instead of copies
                 buffer_path = os.path.join(model_dir, buffer.uri)
-                with open(buffer_path, 'rb') as f:
-                    model['buffers'].append(f.read())
+                buffers.append(np.memmap(buffer_path, dtype=np.uint8, mode='r'))
+                model_data['sources'].append(buffer_path)
         else:
             # Handle GLB buffer (already embedded in the GLTF file)
-            model['buffers'].append(gltf.binary_blob())
+            buffers.append(np.frombuffer(gltf.binary_blob(), dtype=np.uint8))
     
     # Process samplers
     for i, sampler in enumerate(gltf.samplers):
@@ -79,7 +491,7 @@ def load_gltf(ctx, file_path):
         if hasattr(sampler, 'wrapT') and sampler.wrapT is not None:
             wrap_t = sampler.wrapT
         
-        model['samplers'].append({
+        model_data['samplers'].append({
             'magFilter': mag_filter,
             'minFilter': min_filter,
             'wrapS': wrap_s,
@@ -98,30 +510,594 @@ def load_gltf(ctx, file_path):
                 # Handle external image file
                 image_path = os.path.join(model_dir, image.uri)
                 img = Image.open(image_path)
+                model_data['sources'].append(image_path)
             
             # Convert to RGBA if needed
             if img.mode != 'RGBA':
                 img = img.convert('RGBA')
             
-            # Flip the image vertically AND horizontally for correct orientation
-            # This is fixing the texture orientation issue
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            
-            # Get image data as bytes
-            img_data = img.tobytes()
+            # The image is uploaded top row first, which matches the GLTF UV
+            # convention (v = 0 at the top), so neither the image nor the
+            # texture coordinates need flipping
             
-            # Create a texture
-            texture = ctx.texture(img.size, 4, img_data)
-            
-            model['images'].append(texture)
+            # Keep the raw RGBA pixels so they can be cached and uploaded as-is
+            model_data['images'].append({
+                'size': list(img.size),
+                'pixels': np.asarray(img, dtype=np.uint8)
+            })
     
-    # Process textures by connecting samplers with images
+    # Record which sampler and image each texture uses
     for i, texture in enumerate(gltf.textures):
         sampler_index = 0  # Default to first sampler if not specified
         if hasattr(texture, 'sampler') and texture.sampler is not None:
             sampler_index = texture.sampler
         
-        image_index = texture.source
+        model_data['textures'].append({
+            'sampler': sampler_index,
+            'source': texture.source
+        })
+    
+    # Parse the skin and the animations that move its joints
+    skinned_meshes = set()
+    skeleton = _parse_skeleton(gltf, buffers)
+    if skeleton is not None:
+        model_data['skeleton'] = skeleton
+        model_data['animations'] = _parse_animations(gltf, buffers, skeleton)
+        skinned_meshes = {node.mesh for node in gltf.nodes if node.mesh is not None and node.skin == skeleton['skin']}
+    
+    # Process meshes
+    for mesh_index, mesh in enumerate(gltf.meshes):
+        for primitive_index, primitive in enumerate(mesh.primitives):
+            # Get material
+            material = None
+            if primitive.material >= 0 and primitive.material < len(gltf.materials):
+                material = gltf.materials[primitive.material]
+            
+            # Get indices, keeping their stored component type
+            indices = None
+            if primitive.indices is not None:
+                indices = _index_binding(gltf, buffers, model_data['buffer_views'], primitive.indices)
+            
+            # Bind vertex attributes straight to their buffer views
+            attributes = {}
+            vertex_count = 0
+            for attribute_name, gltf_attribute in VERTEX_ATTRIBUTES:
+                accessor_index = getattr(primitive.attributes, gltf_attribute, None)
+                if accessor_index is not None:
+                    attributes[attribute_name] = _attribute_binding(
+                        gltf, buffers, model_data['buffer_views'], accessor_index,
+                        integer=attribute_name in INTEGER_ATTRIBUTES
+                    )
+                    vertex_count = max(vertex_count, gltf.accessors[accessor_index].count)
+            
+            # Only primitives of meshes bound to the parsed skin are skinned
+            skinned = mesh_index in skinned_meshes and 'in_joints_0' in attributes and 'in_weights_0' in attributes
+            if not skinned:
+                attributes.pop('in_joints_0', None)
+                attributes.pop('in_weights_0', None)
+            
+            # Material properties
+            base_color_factor = [1.0, 1.0, 1.0, 1.0]
+            base_color_texture = None
+            
+            if material is not None and hasattr(material, 'pbrMetallicRoughness'):
+                pbr = material.pbrMetallicRoughness
+                if hasattr(pbr, 'baseColorFactor') and pbr.baseColorFactor is not None:
+                    base_color_factor = pbr.baseColorFactor
+                
+                if hasattr(pbr, 'baseColorTexture') and pbr.baseColorTexture is not None:
+                    base_color_texture = pbr.baseColorTexture.index
+            
+            model_data['primitives'].append({
+                'attributes': attributes,
+                'indices': indices,
+                'vertex_count': vertex_count,
+                'skinned': skinned,
+                'material': {
+                    'index': primitive.material,
+                    'baseColorFactor': list(base_color_factor),
+                    'baseColorTexture': base_color_texture
+                }
+            })
+    
+    return model_data
+
+def _parse_skeleton(gltf, buffers):
+    """
+    Parse the first skin and the nodes that pose it into NumPy arrays.
+    
+    Only the joints and their ancestors are kept, sorted by depth in the
+    hierarchy so gltf_animation can compose world matrices one level (a
+    contiguous slice) at a time. Rest transforms are kept both as
+    translation/rotation/scale arrays (for nodes moved by animations) and as
+    row-major local matrices.
+    
+    Args:
+        gltf: The loaded GLTF2 document
+        buffers: Buffer data as uint8 NumPy arrays
+    
+    Returns:
+        Dictionary with the skeleton arrays, or None if the model has no
+        usable skin
+    """
+    if not gltf.skins:
+        return None
+    
+    skin = gltf.skins[0]
+    if len(skin.joints) > MAX_JOINTS:
+        print(f"Skin has {len(skin.joints)} joints, more than the {MAX_JOINTS} supported; drawing the bind pose")
+        return None
+    
+    node_parents = {}
+    for node_index, node in enumerate(gltf.nodes):
+        for child in node.children or []:
+            node_parents[child] = node_index
+    
+    # Find the depth of every joint and ancestor of a joint
+    depths = {}
+    for joint in skin.joints:
+        chain = []
+        node_index = joint
+        while node_index is not None and node_index not in depths:
+            chain.append(node_index)
+            node_index = node_parents.get(node_index)
+        depth = depths[node_index] if node_index is not None else -1
+        for node_index in reversed(chain):
+            depth += 1
+            depths[node_index] = depth
+    
+    nodes = sorted(depths, key=lambda node_index: (depths[node_index], node_index))
+    positions = {node_index: position for position, node_index in enumerate(nodes)}
+    level_count = depths[nodes[-1]] + 1
+    levels = np.searchsorted([depths[node_index] for node_index in nodes], np.arange(level_count + 1))
+    
+    translations = np.zeros((len(nodes), 3), dtype=np.float32)
+    rotations = np.tile(np.array([0.0, 0.0, 0.0, 1.0], dtype=np.float32), (len(nodes), 1))
+    scales = np.ones((len(nodes), 3), dtype=np.float32)
+    matrix_nodes = {}
+    for position, node_index in enumerate(nodes):
+        node = gltf.nodes[node_index]
+        if node.matrix is not None:
+            # Column-major GLTF matrices read as row-major pyrr matrices
+            matrix_nodes[position] = np.array(node.matrix, dtype=np.float32).reshape(4, 4)
+            continue
+        if node.translation is not None:
+            translations[position] = node.translation
+        if node.rotation is not None:
+            rotations[position] = node.rotation
+        if node.scale is not None:
+            scales[position] = node.scale
+    
+    matrices = gltf_animation.compose_matrices(translations, rotations, scales)
+    for position, matrix in matrix_nodes.items():
+        matrices[position] = matrix
+    
+    if skin.inverseBindMatrices is not None:
+        inverse_bind_matrices = np.asarray(read_accessor(gltf, buffers, skin.inverseBindMatrices), dtype=np.float32).reshape(-1, 4, 4)
+    else:
+        inverse_bind_matrices = np.tile(np.eye(4, dtype=np.float32), (len(skin.joints), 1, 1))
+    
+    return {
+        'skin': 0,
+        'nodes': np.array(nodes, dtype=np.int32),
+        'parents': np.array([positions.get(node_parents.get(node_index), -1) for node_index in nodes], dtype=np.int32),
+        'levels': levels.astype(np.int32),
+        'translations': translations,
+        'rotations': rotations,
+        'scales': scales,
+        'matrices': matrices,
+        'joints': np.array([positions[joint] for joint in skin.joints], dtype=np.int32),
+        'inverse_bind_matrices': inverse_bind_matrices
+    }
+
+def _parse_animations(gltf, buffers, skeleton):
+    """
+    Parse the animation samplers that move a skeleton into padded keyframe arrays.
+    
+    Channels of an animation are grouped by animated property and
+    interpolation mode. Each group stores its keyframe times as one
+    (channels, keys) array padded with +inf and its values as one
+    (channels, keys, components) array padded with the last value (with an
+    extra tangent axis for cubic splines), so gltf_animation can sample the
+    whole group with a few vectorized operations.
+    
+    Args:
+        gltf: The loaded GLTF2 document
+        buffers: Buffer data as uint8 NumPy arrays
+        skeleton: Skeleton from _parse_skeleton; channels targeting other
+            nodes are skipped
+    
+    Returns:
+        List of animation dictionaries
+    """
+    positions = {int(node_index): position for position, node_index in enumerate(skeleton['nodes'])}
+    
+    animations = []
+    for animation_index, animation in enumerate(gltf.animations):
+        groups = {}
+        nodes = []
+        duration = 0.0
+        
+        for channel in animation.channels:
+            path = channel.target.path
+            if path not in gltf_animation.ANIMATION_PATHS or channel.target.node not in positions:
+                # Morph target weights and nodes outside the skeleton don't
+                # affect the skinned meshes
+                continue
+            
+            sampler = animation.samplers[channel.sampler]
+            interpolation = sampler.interpolation or 'LINEAR'
+            if interpolation not in gltf_animation.INTERPOLATIONS:
+                interpolation = 'LINEAR'
+            
+            times = np.asarray(read_accessor(gltf, buffers, sampler.input), dtype=np.float32).reshape(-1)
+            values = np.asarray(read_accessor(gltf, buffers, sampler.output), dtype=np.float32)
+            values = values.reshape(len(times), -1, gltf_animation.ANIMATION_PATHS[path])
+            if interpolation != 'CUBICSPLINE':
+                values = values[:, 0]
+            
+            position = positions[channel.target.node]
+            if position not in nodes:
+                nodes.append(position)
+            duration = max(duration, float(times[-1]))
+            groups.setdefault((path, interpolation), []).append((nodes.index(position), times, values))
+        
+        channel_groups = []
+        for (path, interpolation), channels in groups.items():
+            key_count = max(len(times) for _, times, _ in channels)
+            padded_times = np.full((len(channels), key_count), np.inf, dtype=np.float32)
+            padded_values = np.empty((len(channels), key_count) + channels[0][2].shape[1:], dtype=np.float32)
+            for row, (_, times, values) in enumerate(channels):
+                padded_times[row, :len(times)] = times
+                padded_values[row, :len(times)] = values
+                padded_values[row, len(times):] = values[-1]
+            
+            channel_groups.append({
+                'path': path,
+                'interpolation': interpolation,
+                'targets': np.array([target for target, _, _ in channels], dtype=np.int32),
+                'times': padded_times,
+                'counts': np.array([len(times) for _, times, _ in channels], dtype=np.int32),
+                'values': padded_values
+            })
+        
+        animations.append({
+            'name': animation.name or f"animation_{animation_index}",
+            'duration': duration,
+            'nodes': np.array(nodes, dtype=np.int32),
+            'channels': channel_groups
+        })
+    
+    return animations
+
+def read_accessor(gltf, buffers, accessor_index, normalize=True):
+    """
+    Read a GLTF accessor as a NumPy array.
+    
+    The result is a view into the buffer that honours bufferView.byteStride,
+    so interleaved data is read without copying. A copy is only made when
+    the stored layout can't be used as-is: normalized integers converted to
+    float32, padded byte/short matrix columns and sparse substitutions.
+    
+    Args:
+        gltf: The parsed GLTF2 document
+        buffers: Buffer contents as uint8 NumPy arrays (e.g. memory maps), indexed like gltf.buffers
+        accessor_index: Index of the accessor to read
+        normalize: Convert normalized integer components to float32 in [0, 1] / [-1, 1]
+    
+    Returns:
+        Array of shape (count,) for scalars or (count, components) otherwise
+    """
+    accessor = gltf.accessors[accessor_index]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor.componentType])
+    components = TYPE_COMPONENTS[accessor.type]
+    count = accessor.count
+    
+    if accessor.bufferView is None:
+        # Accessors without a bufferView are all zeros (possibly with sparse values)
+        values = np.zeros((count, components), dtype=dtype)
+    else:
+        buffer_view = gltf.bufferViews[accessor.bufferView]
+        buffer = buffers[buffer_view.buffer]
+        byte_offset = (buffer_view.byteOffset or 0) + (accessor.byteOffset or 0)
+        
+        # Matrix columns of 1 and 2 byte components are padded to 4 bytes
+        column_rows = {'MAT2': 2, 'MAT3': 3}.get(accessor.type)
+        padded_columns = column_rows is not None and dtype.itemsize < 4
+        if padded_columns:
+            column_stride = (column_rows * dtype.itemsize + 3) & ~3
+            element_size = column_stride * column_rows
+        else:
+            element_size = components * dtype.itemsize
+        stride = buffer_view.byteStride or element_size
+        
+        # Build a strided view covering exactly the accessor's elements
+        view_size = stride * (count - 1) + element_size if count else 0
+        raw = buffer[byte_offset:byte_offset + view_size]
+        if padded_columns:
+            values = np.lib.stride_tricks.as_strided(
+                raw.view(np.uint8), shape=(count, column_rows, column_rows, dtype.itemsize),
+                strides=(stride, column_stride, dtype.itemsize, 1)
+            ).copy().view(dtype).reshape(count, components)
+        else:
+            values = np.ndarray(
+                shape=(count, components),
+                dtype=dtype,
+                buffer=raw,
+                strides=(stride, dtype.itemsize)
+            )
+    
+    # Apply sparse substitutions
+    if accessor.sparse is not None and accessor.sparse.count:
+        sparse = accessor.sparse
+        index_view = gltf.bufferViews[sparse.indices.bufferView]
+        index_offset = (index_view.byteOffset or 0) + (sparse.indices.byteOffset or 0)
+        sparse_indices = np.frombuffer(
+            buffers[index_view.buffer],
+            dtype=COMPONENT_DTYPES[sparse.indices.componentType],
+            count=sparse.count,
+            offset=index_offset
+        )
+        value_view = gltf.bufferViews[sparse.values.bufferView]
+        value_offset = (value_view.byteOffset or 0) + (sparse.values.byteOffset or 0)
+        sparse_values = np.frombuffer(
+            buffers[value_view.buffer],
+            dtype=dtype,
+            count=sparse.count * components,
+            offset=value_offset
+        ).reshape(sparse.count, components)
+        values = values.copy()
+        values[sparse_indices] = sparse_values
+    
+    # Convert normalized integers to floats as described in the GLTF spec
+    if normalize and accessor.normalized and dtype.kind in 'iu':
+        max_value = np.iinfo(dtype).max
+        values = values.astype(np.float32) / max_value
+        if dtype.kind == 'i':
+            values = np.maximum(values, -1.0)
+    
+    if components == 1:
+        return values.reshape(count) if values.flags['C_CONTIGUOUS'] else values[:, 0]
+    return values
+
+def _use_buffer_view(gltf, buffers, buffer_views, index):
+    """Add a GLTF bufferView's bytes to the list of buffer views to upload"""
+    if buffer_views[index] is None:
+        buffer_view = gltf.bufferViews[index]
+        offset = buffer_view.byteOffset or 0
+        buffer_views[index] = buffers[buffer_view.buffer][offset:offset + buffer_view.byteLength]
+    return index
+
+def _add_buffer_view(buffer_views, values):
+    """Add a repacked array as an extra buffer view and return its index"""
+    buffer_views.append(np.ascontiguousarray(values).view(np.uint8).reshape(-1))
+    return len(buffer_views) - 1
+
+def _attribute_binding(gltf, buffers, buffer_views, accessor_index, integer=False):
+    """
+    Describe how to bind an accessor as a vertex attribute.
+    
+    Accessors are bound in place (offset and stride into their bufferView).
+    Sparse accessors, accessors without a bufferView and normalized integers
+    (which ModernGL's VertexArray.bind can't normalize) are repacked into a
+    tightly packed float32 buffer view instead, or uint16 for integer
+    attributes such as joint indices.
+    """
+    accessor = gltf.accessors[accessor_index]
+    components = TYPE_COMPONENTS[accessor.type]
+    
+    if integer and (accessor.bufferView is None or accessor.sparse is not None):
+        values = np.asarray(read_accessor(gltf, buffers, accessor_index), dtype=np.uint16)
+        return {
+            'bufferView': _add_buffer_view(buffer_views, values),
+            'offset': 0,
+            'stride': components * 2,
+            'format': f"{components}u2"
+        }
+    
+    if not integer and (accessor.bufferView is None or accessor.sparse is not None or (accessor.normalized and accessor.componentType != 5126)):
+        values = np.asarray(read_accessor(gltf, buffers, accessor_index), dtype=np.float32)
+        return {
+            'bufferView': _add_buffer_view(buffer_views, values),
+            'offset': 0,
+            'stride': components * 4,
+            'format': f"{components}f"
+        }
+    
+    buffer_view = gltf.bufferViews[accessor.bufferView]
+    element_size = components * np.dtype(COMPONENT_DTYPES[accessor.componentType]).itemsize
+    return {
+        'bufferView': _use_buffer_view(gltf, buffers, buffer_views, accessor.bufferView),
+        'offset': accessor.byteOffset or 0,
+        'stride': buffer_view.byteStride or element_size,
+        'format': f"{components}{ATTRIBUTE_FORMATS[accessor.componentType]}"
+    }
+
+def _index_binding(gltf, buffers, buffer_views, accessor_index):
+    """
+    Describe how to draw from an index accessor.
+    
+    Indices are used in their stored type (uint8/16/32) straight from their
+    bufferView; only sparse or bufferView-less accessors are repacked.
+    """
+    accessor = gltf.accessors[accessor_index]
+    element_size = np.dtype(COMPONENT_DTYPES[accessor.componentType]).itemsize
+    
+    if accessor.bufferView is None or accessor.sparse is not None:
+        buffer_view_index = _add_buffer_view(buffer_views, read_accessor(gltf, buffers, accessor_index))
+        offset = 0
+    else:
+        buffer_view_index = _use_buffer_view(gltf, buffers, buffer_views, accessor.bufferView)
+        offset = accessor.byteOffset or 0
+    
+    return {
+        'bufferView': buffer_view_index,
+        'element_size': element_size,
+        'first': offset // element_size,
+        'count': accessor.count
+    }
+
+def _binding_values(buffer_views, binding, count):
+    """Get a strided NumPy view of the data described by an attribute binding"""
+    components = int(binding['format'][0])
+    dtype = np.dtype(FORMAT_DTYPES[binding['format'][1:]])
+    return np.ndarray(
+        shape=(count, components),
+        dtype=dtype,
+        buffer=buffer_views[binding['bufferView']],
+        offset=binding['offset'],
+        strides=(binding['stride'], dtype.itemsize)
+    )
+
+def _index_values(buffer_views, indices):
+    """Get the index values described by an index binding"""
+    dtype = {1: np.uint8, 2: np.uint16, 4: np.uint32}[indices['element_size']]
+    return np.frombuffer(
+        buffer_views[indices['bufferView']],
+        dtype=dtype,
+        count=indices['count'],
+        offset=indices['first'] * indices['element_size']
+    )
+
+def _merge_primitives(model_data):
+    """
+    Merge primitives that share a material into one primitive each.
+    
+    Vertex attributes are concatenated into new buffer views and the indices
+    are rebased onto the merged vertex range, so every material is drawn with
+    a single draw call. Indices are stored as uint16 whenever the merged
+    vertex count allows it. Buffer views only used by merged primitives are
+    dropped so they aren't uploaded.
+    """
+    buffer_views = model_data['buffer_views']
+    
+    # Group primitives by material (and whether they're skinned, which
+    # selects the shader), keeping the order materials first appear in
+    groups = {}
+    for primitive in model_data['primitives']:
+        groups.setdefault((primitive['material']['index'], primitive['skinned']), []).append(primitive)
+    
+    merged_primitives = []
+    for (material_index, skinned), primitives in groups.items():
+        if len(primitives) == 1:
+            merged_primitives.append(primitives[0])
+            continue
+        
+        # Use the stored format when all primitives agree, float32 (uint16
+        # for integer attributes) otherwise
+        formats = {}
+        for primitive in primitives:
+            for attribute_name, binding in primitive['attributes'].items():
+                if formats.get(attribute_name, binding['format']) != binding['format']:
+                    binding_format = f"{binding['format'][0]}{'u2' if attribute_name in INTEGER_ATTRIBUTES else 'f'}"
+                else:
+                    binding_format = binding['format']
+                formats[attribute_name] = binding_format
+        
+        attributes = {}
+        for attribute_name, binding_format in formats.items():
+            components = int(binding_format[0])
+            dtype = FORMAT_DTYPES[binding_format[1:]]
+            parts = []
+            for primitive in primitives:
+                if attribute_name in primitive['attributes']:
+                    parts.append(_binding_values(buffer_views, primitive['attributes'][attribute_name], primitive['vertex_count']))
+                else:
+                    parts.append(np.zeros((primitive['vertex_count'], components), dtype=dtype))
+            values = np.concatenate(parts).astype(dtype, copy=False)
+            attributes[attribute_name] = {
+                'bufferView': _add_buffer_view(buffer_views, values),
+                'offset': 0,
+                'stride': values.shape[1] * values.itemsize,
+                'format': binding_format
+            }
+        
+        # Rebase each primitive's indices onto the merged vertex range
+        vertex_count = sum(primitive['vertex_count'] for primitive in primitives)
+        index_dtype = np.uint16 if vertex_count <= 65536 else np.uint32
+        parts = []
+        base_vertex = 0
+        for primitive in primitives:
+            if primitive['indices'] is not None:
+                indices = _index_values(buffer_views, primitive['indices'])
+            else:
+                indices = np.arange(primitive['vertex_count'])
+            parts.append((indices.astype(np.uint32) + base_vertex).astype(index_dtype))
+            base_vertex += primitive['vertex_count']
+        indices = np.concatenate(parts)
+        
+        merged_primitives.append({
+            'attributes': attributes,
+            'indices': {
+                'bufferView': _add_buffer_view(buffer_views, indices),
+                'element_size': indices.itemsize,
+                'first': 0,
+                'count': len(indices)
+            },
+            'vertex_count': vertex_count,
+            'skinned': skinned,
+            'material': primitives[0]['material']
+        })
+    
+    # Drop buffer views that are no longer referenced
+    referenced = set()
+    for primitive in merged_primitives:
+        referenced.update(binding['bufferView'] for binding in primitive['attributes'].values())
+        if primitive['indices'] is not None:
+            referenced.add(primitive['indices']['bufferView'])
+    for index in range(len(buffer_views)):
+        if index not in referenced:
+            buffer_views[index] = None
+    
+    print(f"Merged {len(model_data['primitives'])} primitives into {len(merged_primitives)} draw calls")
+    model_data['primitives'] = merged_primitives
+
+def _upload_model(ctx, model_data, lighting=DEFAULT_LIGHTING):
+    """
+    Create the ModernGL textures, program and vertex arrays for parsed model data.
+    
+    Args:
+        ctx: The ModernGL context
+        model_data: Model data from _parse_gltf or _read_model_cache
+        lighting: Name of a lighting mode in LIGHTING_MODES
+    
+    Returns:
+        Dictionary containing the loaded model data and rendering information
+    """
+    # Dictionary to store the model data
+    model = {
+        'meshes': [],
+        'buffers': [],
+        'images': [],
+        'textures': [],
+        'samplers': model_data['samplers'],
+        'skeleton': model_data['skeleton'],
+        'animations': model_data['animations'],
+        'upload_stats': {'buffers': 0, 'buffer_bytes': 0, 'texture_bytes': 0},
+        'render_stats': {'frames': 0, 'draw_calls': 0, 'cpu_seconds': 0.0, 'uniform_bytes': 0,
+                         'last_draw_calls': 0, 'last_cpu_seconds': 0.0},
+        'animation_stats': {'updates': 0, 'cpu_seconds': 0.0, 'uniform_bytes': 0, 'last_cpu_seconds': 0.0}
+    }
+    
+    # Upload each referenced buffer view once; primitives share these buffers
+    for buffer_view in model_data['buffer_views']:
+        if buffer_view is None:
+            model['buffers'].append(None)
+            continue
+        model['buffers'].append(ctx.buffer(buffer_view))
+        model['upload_stats']['buffers'] += 1
+        model['upload_stats']['buffer_bytes'] += buffer_view.nbytes
+    
+    # Upload images
+    for image in model_data['images']:
+        texture = ctx.texture(tuple(image['size']), 4, image['pixels'])
+        model['images'].append(texture)
+        model['upload_stats']['texture_bytes'] += image['pixels'].nbytes
+    
+    # Process textures by connecting samplers with images
+    for texture in model_data['textures']:
+        sampler_index = texture['sampler']
+        image_index = texture['source']
         
         # Ensure indices are valid
         if sampler_index < len(model['samplers']) and image_index < len(model['images']):
@@ -135,7 +1111,7 @@ def load_gltf(ctx, file_path):
             texture_obj.repeat_y = True if sampler['wrapT'] == GL_REPEAT else False
             
             # Build mipmaps if using mipmapping
-            if sampler['minFilter'] in [GL_NEAREST_MIPMAP_NEAREST, GL_LINEAR_MIPMAP_NEAREST, 
+            if sampler['minFilter'] in [GL_NEAREST_MIPMAP_NEAREST, GL_LINEAR_MIPMAP_NEAREST,
                                    GL_NEAREST_MIPMAP_LINEAR, GL_LINEAR_MIPMAP_LINEAR]:
                 texture_obj.build_mipmaps()
             
@@ -145,294 +1121,361 @@ def load_gltf(ctx, file_path):
             # If indices are invalid, still add something to maintain indices
             model['textures'].append(None)
     
-    # Create shaders
-    vertex_shader = '''
-        #version 330
-        
-        uniform mat4 model;
-        uniform mat4 view;
-        uniform mat4 projection;
-        
-        in vec3 in_position;
-        in vec3 in_normal;
-        in vec2 in_texcoord_0;
+    model['lighting'] = lighting
+    
+    # Create a VAO for every primitive, ordered by material so render_gltf
+    # only has to switch material uniforms when the material changes
+    materials = {}
+    primitives = sorted(model_data['primitives'], key=lambda primitive: primitive['material']['index'])
+    for primitive in primitives:
+        indices = primitive['indices']
+        program = get_program(ctx, lighting, primitive['skinned'])
+        vao = _create_vertex_array(ctx, program, model['buffers'], primitive)
         
-        out vec3 normal;
-        out vec2 texcoord_0;
-        out vec3 position;
-        out vec3 world_position;
+        # Resolve the material's texture index to the configured texture.
+        # Meshes with the same material share one material dictionary.
+        material_index = primitive['material']['index']
+        if material_index not in materials:
+            base_color_texture = None
+            texture_index = primitive['material']['baseColorTexture']
+            if texture_index is not None and texture_index < len(model['textures']) and model['textures'][texture_index] is not None:
+                base_color_texture = model['textures'][texture_index]
+            
+            materials[material_index] = {
+                'baseColorFactor': np.array(primitive['material']['baseColorFactor'], dtype='f4'),
+                'baseColorTexture': base_color_texture,
+                'hasBaseColorTexture': base_color_texture is not None
+            }
         
-        void main() {
-            world_position = vec3(model * vec4(in_position, 1.0));
-            position = vec3(view * vec4(world_position, 1.0));
-            normal = mat3(transpose(inverse(model))) * in_normal;
-            texcoord_0 = in_texcoord_0;
-            gl_Position = projection * view * model * vec4(in_position, 1.0);
+        # Add the mesh to the model
+        model['meshes'].append({
+            'vao': vao,
+            'program': program,
+            'primitive': primitive,
+            'material': materials[material_index],
+            'first': indices['first'] if indices is not None else 0,
+            'vertices': indices['count'] if indices is not None else primitive['vertex_count']
+        })
+    
+    return model
+
+def _create_vertex_array(ctx, program, buffers, primitive):
+    """Create a VAO reading a primitive's attributes from the uploaded buffer views"""
+    indices = primitive['indices']
+    if indices is not None:
+        vao = ctx.vertex_array(
+            program, [],
+            index_buffer=buffers[indices['bufferView']],
+            index_element_size=indices['element_size']
+        )
+    else:
+        vao = ctx.vertex_array(program, [])
+    
+    # Bind attributes with their offsets and strides into the shared buffers.
+    # Attributes the primitive doesn't have keep the default value (0, 0, 0, 1).
+    for attribute_name, binding in primitive['attributes'].items():
+        if attribute_name in program:
+            vao.bind(
+                program[attribute_name].location, 'i' if attribute_name in INTEGER_ATTRIBUTES else 'f',
+                buffers[binding['bufferView']], binding['format'],
+                offset=binding['offset'], stride=binding['stride']
+            )
+    return vao
+
+def set_lighting(ctx, model, lighting):
+    """
+    Switch a loaded model to another lighting mode.
+    
+    Only the vertex arrays are recreated; the GPU buffers and textures are kept.
+    
+    Args:
+        ctx: The ModernGL context the model was loaded into
+        model: The loaded model data
+        lighting: Name of a lighting mode in LIGHTING_MODES
+    """
+    for mesh in model['meshes']:
+        program = get_program(ctx, lighting, mesh['primitive']['skinned'])
+        mesh['vao'].release()
+        mesh['vao'] = _create_vertex_array(ctx, program, model['buffers'], mesh['primitive'])
+        mesh['program'] = program
+    model['lighting'] = lighting
+
+def _cache_prefix(file_path, merge_primitives):
+    """Get the file name prefix shared by all cache entries of a model variant"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    variant = 'merged' if merge_primitives else 'split'
+    return f"{stem}-{variant}-"
+
+def _model_cache_paths(file_path, cache_dir, merge_primitives):
+    """
+    Get the manifest and blob paths of the cache entry for a GLTF file.
+    
+    The cache key hashes the loader's cache version together with the GLTF
+    file's path, size and modification time, so editing or replacing the
+    model automatically selects a new cache entry. Merged and unmerged models
+    are cached separately.
+    """
+    stat = os.stat(file_path)
+    key_source = f"{CACHE_VERSION}:{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()[:16]
+    base_path = os.path.join(cache_dir, _cache_prefix(file_path, merge_primitives) + key)
+    return base_path + '.json', base_path + '.bin'
+
+def _source_stats(paths):
+    """Get the (path, size, mtime) records used to validate a cache entry"""
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return stats
+
+def _pack_cache_value(value, blob):
+    """
+    Replace the NumPy arrays in a nested structure with references into a blob.
+    
+    Arrays are appended to blob['chunks'] at CACHE_ALIGNMENT-aligned offsets so
+    they can be viewed straight out of the memory-mapped blob later.
+    """
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        padding = -blob['size'] % CACHE_ALIGNMENT
+        if padding:
+            blob['chunks'].append(bytes(padding))
+            blob['size'] += padding
+        reference = {
+            '__array__': True,
+            'offset': blob['size'],
+            'dtype': array.dtype.str,
+            'shape': list(array.shape)
         }
-    '''
+        blob['chunks'].append(array)
+        blob['size'] += array.nbytes
+        return reference
+    if isinstance(value, dict):
+        return {key: _pack_cache_value(item, blob) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pack_cache_value(item, blob) for item in value]
+    return value
 
-    fragment_shader = '''
-        #version 330
+def _unpack_cache_value(value, blob):
+    """Resolve the array references written by _pack_cache_value against a memory-mapped blob"""
+    if isinstance(value, dict):
+        if value.get('__array__'):
+            # Plain ndarray views avoid np.memmap's per-operation overhead
+            # in code that works on the arrays every frame (animation)
+            return np.ndarray(shape=value['shape'], dtype=np.dtype(value['dtype']), buffer=blob, offset=value['offset'])
+        return {key: _unpack_cache_value(item, blob) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unpack_cache_value(item, blob) for item in value]
+    return value
+
+def _prune_model_cache(file_path, cache_dir, manifest_path):
+    """
+    Remove the cache entries left behind by older versions of a model.
+    
+    Only names of the exact f"{stem}-{variant}-{key}.json|.bin" form are
+    considered, so models whose names merely start with the same stem (such
+    as avatar-v2 next to avatar) are never touched, and a stale entry is only
+    removed when its manifest was written for the same GLTF file. Both
+    variants share the current key, so only stale keys are removed.
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    key = os.path.splitext(os.path.basename(manifest_path))[0].rsplit('-', 1)[1]
+    pattern = re.compile(re.escape(stem) + r"-(?:merged|split)-([0-9a-f]{16})\.(?:json|bin)")
+    source_path = os.path.abspath(file_path)
+    
+    stale = {}
+    for name in os.listdir(cache_dir):
+        match = pattern.fullmatch(name)
+        if match and match.group(1) != key:
+            stale.setdefault(os.path.splitext(name)[0], []).append(name)
+    
+    for base_name, names in stale.items():
+        try:
+            with open(os.path.join(cache_dir, base_name + '.json'), 'r') as f:
+                sources = json.load(f)['sources']
+        except (OSError, ValueError, KeyError):
+            continue
+        if sources and sources[0][0] == source_path:
+            for name in names:
+                os.remove(os.path.join(cache_dir, name))
+
+def _write_model_cache(file_path, cache_dir, model_data, merge_primitives):
+    """
+    Write parsed model data to the precompiled binary cache.
+    
+    The cache is a JSON manifest plus one binary blob holding every array. The
+    blob is written first and both files are moved into place atomically, so
+    a manifest only ever exists next to a complete blob.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest_path, blob_path = _model_cache_paths(file_path, cache_dir, merge_primitives)
         
-        uniform vec4 baseColorFactor;
-        uniform sampler2D baseColorTexture;
-        uniform bool hasBaseColorTexture;
+        blob = {'chunks': [], 'size': 0}
+        manifest = {
+            'version': CACHE_VERSION,
+            'sources': _source_stats(model_data['sources']),
+            'model': _pack_cache_value({key: value for key, value in model_data.items() if key != 'sources'}, blob),
+            'blob_size': blob['size']
+        }
         
-        in vec3 normal;
-        in vec2 texcoord_0;
-        in vec3 position;
-        in vec3 world_position;
+        with open(blob_path + '.tmp', 'wb') as f:
+            for chunk in blob['chunks']:
+                f.write(chunk)
+        os.replace(blob_path + '.tmp', blob_path)
         
-        out vec4 fragColor;
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
         
-        void main() {
-            // Normalize the normal vector
-            vec3 norm = normalize(normal);
-            
-            // Multiple light positions for better texture visibility
-            vec3 lightPos1 = vec3(5.0, 8.0, 5.0);
-            vec3 lightPos2 = vec3(-5.0, 5.0, -2.0); // Back light
-            vec3 lightPos3 = vec3(0.0, 3.0, 8.0);   // Front light
-            
-            vec3 lightColor1 = vec3(1.0, 0.9, 0.8); // Warm main light
-            vec3 lightColor2 = vec3(0.6, 0.7, 1.0); // Cool back light
-            vec3 lightColor3 = vec3(0.9, 0.9, 1.0); // Neutral fill light
-            
-            // Ambient lighting - brighter for better texture visibility
-            float ambientStrength = 0.45;
-            vec3 ambient = ambientStrength * vec3(1.0, 1.0, 1.0);
-            
-            // Calculate diffuse lighting for each light
-            vec3 lightDir1 = normalize(lightPos1 - world_position);
-            float diff1 = max(dot(norm, lightDir1), 0.0);
-            vec3 diffuse1 = diff1 * lightColor1;
-            
-            vec3 lightDir2 = normalize(lightPos2 - world_position);
-            float diff2 = max(dot(norm, lightDir2), 0.0);
-            vec3 diffuse2 = diff2 * lightColor2 * 0.5; // Dimmer back light
-            
-            vec3 lightDir3 = normalize(lightPos3 - world_position);
-            float diff3 = max(dot(norm, lightDir3), 0.0);
-            vec3 diffuse3 = diff3 * lightColor3 * 0.7; // Medium fill light
-            
-            // Combine lighting
-            vec3 lighting = ambient + diffuse1 + diffuse2 + diffuse3;
-            
-            // Get base color from material and/or texture
-            vec4 baseColor = baseColorFactor;
-            if (hasBaseColorTexture) {
-                // Sample the texture with the corrected UV coordinates
-                baseColor *= texture(baseColorTexture, texcoord_0);
-            }
-            
-            // Apply lighting to the color with a slight boost to saturation
-            vec3 finalColor = lighting * baseColor.rgb;
-            
-            // Output final color with original alpha
-            fragColor = vec4(finalColor, baseColor.a);
-        }
-    '''
-    
-    # Create program
-    program = ctx.program(
-        vertex_shader=vertex_shader,
-        fragment_shader=fragment_shader
-    )
-    
-    # Process meshes
-    for mesh_index, mesh in enumerate(gltf.meshes):
-        for primitive_index, primitive in enumerate(mesh.primitives):
-            # Get material
-            material = None
-            if primitive.material >= 0 and primitive.material < len(gltf.materials):
-                material = gltf.materials[primitive.material]
-            
-            # Get indices
-            indices = None
-            if primitive.indices is not None:
-                indices_accessor = gltf.accessors[primitive.indices]
-                indices_buffer_view = gltf.bufferViews[indices_accessor.bufferView]
-                indices_buffer = model['buffers'][indices_buffer_view.buffer]
-                
-                # Get the byte offset
-                byte_offset = indices_buffer_view.byteOffset if hasattr(indices_buffer_view, 'byteOffset') else 0
-                if hasattr(indices_accessor, 'byteOffset') and indices_accessor.byteOffset:
-                    byte_offset += indices_accessor.byteOffset
-                
-                # Calculate the count and component type
-                count = indices_accessor.count
-                component_type = indices_accessor.componentType
-                
-                # Extract indices based on component type
-                if component_type == 5121:  # GL_UNSIGNED_BYTE
-                    indices = np.frombuffer(
-                        indices_buffer,
-                        dtype=np.uint8,
-                        count=count,
-                        offset=byte_offset
-                    )
-                elif component_type == 5123:  # GL_UNSIGNED_SHORT
-                    indices = np.frombuffer(
-                        indices_buffer,
-                        dtype=np.uint16,
-                        count=count,
-                        offset=byte_offset
-                    )
-                elif component_type == 5125:  # GL_UNSIGNED_INT
-                    indices = np.frombuffer(
-                        indices_buffer,
-                        dtype=np.uint32,
-                        count=count,
-                        offset=byte_offset
-                    )
-            
-            # Get vertex positions
-            vertices = None
-            if hasattr(primitive.attributes, 'POSITION'):
-                position_accessor = gltf.accessors[primitive.attributes.POSITION]
-                position_buffer_view = gltf.bufferViews[position_accessor.bufferView]
-                position_buffer = model['buffers'][position_buffer_view.buffer]
-                
-                # Get byte offset
-                byte_offset = position_buffer_view.byteOffset if hasattr(position_buffer_view, 'byteOffset') else 0
-                if hasattr(position_accessor, 'byteOffset') and position_accessor.byteOffset:
-                    byte_offset += position_accessor.byteOffset
-                
-                # Calculate count and extract vertices
-                count = position_accessor.count
-                vertices = np.frombuffer(
-                    position_buffer,
-                    dtype=np.float32,
-                    count=count * 3,
-                    offset=byte_offset
-                ).reshape(count, 3)
-            
-            # Get normals
-            normals = None
-            if hasattr(primitive.attributes, 'NORMAL'):
-                normal_accessor = gltf.accessors[primitive.attributes.NORMAL]
-                normal_buffer_view = gltf.bufferViews[normal_accessor.bufferView]
-                normal_buffer = model['buffers'][normal_buffer_view.buffer]
-                
-                # Get byte offset
-                byte_offset = normal_buffer_view.byteOffset if hasattr(normal_buffer_view, 'byteOffset') else 0
-                if hasattr(normal_accessor, 'byteOffset') and normal_accessor.byteOffset:
-                    byte_offset += normal_accessor.byteOffset
-                
-                # Calculate count and extract normals
-                count = normal_accessor.count
-                normals = np.frombuffer(
-                    normal_buffer,
-                    dtype=np.float32,
-                    count=count * 3,
-                    offset=byte_offset
-                ).reshape(count, 3)
-            
-            # Get texture coordinates
-            texcoords = None
-            if hasattr(primitive.attributes, 'TEXCOORD_0'):
-                texcoord_accessor = gltf.accessors[primitive.attributes.TEXCOORD_0]
-                texcoord_buffer_view = gltf.bufferViews[texcoord_accessor.bufferView]
-                texcoord_buffer = model['buffers'][texcoord_buffer_view.buffer]
-                
-                # Get byte offset
-                byte_offset = texcoord_buffer_view.byteOffset if hasattr(texcoord_buffer_view, 'byteOffset') else 0
-                if hasattr(texcoord_accessor, 'byteOffset') and texcoord_accessor.byteOffset:
-                    byte_offset += texcoord_accessor.byteOffset
-                
-                # Calculate count and extract texture coordinates
-                count = texcoord_accessor.count
-                original_texcoords = np.frombuffer(
-                    texcoord_buffer,
-                    dtype=np.float32,
-                    count=count * 2,
-                    offset=byte_offset
-                ).reshape(count, 2)
-                
-                # Create a new array to modify the texture coordinates
-                # This avoids the read-only issue
-                texcoords = np.copy(original_texcoords)
-                
-                # Fix texture coordinate orientation
-                # Flip the V coordinate for correct texture orientation
-                texcoords[:, 1] = 1.0 - texcoords[:, 1]
-            
-            # Create VAO with the model data
-            vao_content = {}
-            
-            if vertices is not None:
-                vao_content['in_position'] = vertices.astype('f4')
-            
-            if normals is not None:
-                vao_content['in_normal'] = normals.astype('f4')
-            
-            if texcoords is not None:
-                vao_content['in_texcoord_0'] = texcoords.astype('f4')
-            
-            # Create the VAO
-            vao = ctx.vertex_array(
-                program,
-                [
-                    (ctx.buffer(vao_content.get('in_position', np.zeros((1, 3), dtype='f4'))), '3f', 'in_position'),
-                    (ctx.buffer(vao_content.get('in_normal', np.zeros((1, 3), dtype='f4'))), '3f', 'in_normal'),
-                    (ctx.buffer(vao_content.get('in_texcoord_0', np.zeros((1, 2), dtype='f4'))), '2f', 'in_texcoord_0'),
-                ],
-                ctx.buffer(indices.astype('i4')) if indices is not None else None
-            )
-            
-            # Material properties
-            base_color_factor = [1.0, 1.0, 1.0, 1.0]
-            base_color_texture = None
-            
-            if material is not None and hasattr(material, 'pbrMetallicRoughness'):
-                pbr = material.pbrMetallicRoughness
-                if hasattr(pbr, 'baseColorFactor') and pbr.baseColorFactor is not None:
-                    base_color_factor = pbr.baseColorFactor
-                
-                if hasattr(pbr, 'baseColorTexture') and pbr.baseColorTexture is not None:
-                    # Get the texture from the baseColorTexture
-                    texture_index = pbr.baseColorTexture.index
-                    if texture_index < len(model['textures']) and model['textures'][texture_index] is not None:
-                        base_color_texture = model['textures'][texture_index]
-            
-            # Add the mesh to the model
-            model['meshes'].append({
-                'vao': vao,
-                'program': program,
-                'material': {
-                    'baseColorFactor': base_color_factor,
-                    'baseColorTexture': base_color_texture,
-                    'hasBaseColorTexture': base_color_texture is not None
-                },
-                'indices': indices
-            })
+        _prune_model_cache(file_path, cache_dir, manifest_path)
+        
+        print(f"Wrote model cache {manifest_path} ({blob['size'] / (1024 * 1024):.1f} MB)")
+    except Exception as e:
+        print(f"Error writing model cache: {e}")
+
+def _read_model_cache(file_path, cache_dir, merge_primitives):
+    """
+    Read parsed model data from the precompiled binary cache.
     
-    return model
+    Returns:
+        The cached model data with arrays backed by a memory map, or None if
+        there is no valid cache entry
+    """
+    try:
+        manifest_path, blob_path = _model_cache_paths(file_path, cache_dir, merge_primitives)
+        if not os.path.exists(manifest_path) or not os.path.exists(blob_path):
+            return None
+        
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        
+        # Validate the cache against the loader version and every source file
+        if manifest.get('version') != CACHE_VERSION:
+            return None
+        if manifest['sources'] != _source_stats([source[0] for source in manifest['sources']]):
+            return None
+        if os.path.getsize(blob_path) != manifest['blob_size']:
+            return None
+        
+        blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        model_data = _unpack_cache_value(manifest['model'], blob)
+        model_data['sources'] = [source[0] for source in manifest['sources']]
+        return model_data
+    except Exception as e:
+        print(f"Error reading model cache, rebuilding it: {e}")
+        return None
 
-def render_gltf(model, model_matrix, view_matrix, projection_matrix):
+def render_gltf(model, model_matrix, view_matrix=None, projection_matrix=None):
     """
     Render a GLTF model with the given matrices.
     
+    The model, MVP and normal matrices are computed on the CPU and written to
+    the model's uniform block once per call. The camera block is shared
+    between programs and models; callers drawing several objects should write
+    it once per frame with update_frame_uniforms and leave
+    view_matrix/projection_matrix unset here. Material uniforms are only
+    written when the material changes. Draw calls, CPU time and the bytes of
+    uniform data written are recorded in model['render_stats'].
+    
     Args:
         model: The loaded model data
         model_matrix: The model transformation matrix
-        view_matrix: The view matrix
-        projection_matrix: The projection matrix
+        view_matrix: The view matrix (optional, updates the camera block)
+        projection_matrix: The projection matrix (optional, updates the camera block)
     """
+    start_time = time.perf_counter()
+    
+    # Set matrices
+    uniform_bytes = model['model_uniforms']['data'].nbytes
+    if view_matrix is not None and projection_matrix is not None:
+        update_frame_uniforms(model['frame_uniforms'], view_matrix, projection_matrix)
+        uniform_bytes += model['frame_uniforms']['data'].nbytes
+    update_model_uniforms(model['model_uniforms'], model_matrix, model['frame_uniforms'])
+    if 'skin_uniforms' in model:
+        model['skin_uniforms']['buffer'].bind_to_uniform_block(SKIN_BLOCK_BINDING)
+    
+    current_program = None
+    current_material = None
+    draw_calls = 0
+    
     for mesh in model['meshes']:
-        # Set matrices
-        mesh['program']['model'].write(model_matrix.astype('f4').tobytes())
-        mesh['program']['view'].write(view_matrix.astype('f4').tobytes())
-        mesh['program']['projection'].write(projection_matrix.astype('f4').tobytes())
+        program = mesh['program']
+        material = mesh['material']
         
-        # Set material uniforms
-        mesh['program']['baseColorFactor'].write(np.array(mesh['material']['baseColorFactor'], dtype='f4'))
-        mesh['program']['hasBaseColorTexture'].value = mesh['material']['hasBaseColorTexture']
+        if program is not current_program:
+            current_program = program
+            current_material = None
         
-        # Bind texture if it exists
-        if mesh['material']['hasBaseColorTexture']:
-            mesh['material']['baseColorTexture'].use(0)
-            mesh['program']['baseColorTexture'].value = 0
+        # Set material uniforms
+        if material is not current_material:
+            program['baseColorFactor'].write(material['baseColorFactor'])
+            program['hasBaseColorTexture'].value = material['hasBaseColorTexture']
+            
+            # Bind texture if it exists
+            if material['hasBaseColorTexture']:
+                material['baseColorTexture'].use(0)
+                program['baseColorTexture'].value = 0
+            current_material = material
         
         # Render the mesh
-        mesh['vao'].render(moderngl.TRIANGLES) 
\ No newline at end of file
+        mesh['vao'].render(moderngl.TRIANGLES, vertices=mesh['vertices'], first=mesh['first'])
+        draw_calls += 1
+    
+    # Update the draw call and CPU time counters
+    cpu_seconds = time.perf_counter() - start_time
+    stats = model['render_stats']
+    stats['frames'] += 1
+    stats['draw_calls'] += draw_calls
+    stats['cpu_seconds'] += cpu_seconds
+    stats['uniform_bytes'] += uniform_bytes
+    stats['last_draw_calls'] = draw_calls
+    stats['last_cpu_seconds'] = cpu_seconds
+
+def animate_gltf(model, animation, time_seconds, loop=True):
+    """
+    Pose a skinned model at a point in one of its animations.
+    
+    The keyframes are sampled and the joint matrices computed on the CPU
+    (see gltf_animation), then written to the model's skin block for the
+    skinning shader. The CPU time is recorded in model['animation_stats'].
+    
+    Args:
+        model: The loaded model data
+        animation: Animation name or index in model['animations'], or None
+            for the rest pose
+        time_seconds: Time since the start of the animation
+        loop: Whether to loop the animation instead of holding its last frame
+    """
+    if model['skeleton'] is None:
+        return
+    
+    start_time = time.perf_counter()
+    
+    if isinstance(animation, str):
+        animation = next((a for a in model['animations'] if a['name'] == animation), None)
+    elif animation is not None:
+        animation = model['animations'][animation]
+    
+    joint_matrices = gltf_animation.update_pose(model['skeleton'], model['pose'], animation, time_seconds, loop)
+    model['skin_uniforms']['buffer'].write(joint_matrices)
+    
+    cpu_seconds = time.perf_counter() - start_time
+    stats = model['animation_stats']
+    stats['updates'] += 1
+    stats['cpu_seconds'] += cpu_seconds
+    stats['uniform_bytes'] += joint_matrices.nbytes
+    stats['last_cpu_seconds'] = cpu_seconds
+
+def format_render_stats(model):
+    """Summarize model['render_stats'] as average draw calls and CPU time per frame"""
+    stats = model['render_stats']
+    frames = max(stats['frames'], 1)
+    summary = (f"{stats['frames']} frames, {stats['draw_calls'] / frames:.1f} draw calls/frame, "
+               f"{stats['cpu_seconds'] / frames * 1000:.3f} ms CPU/frame")
+    
+    animation_stats = model['animation_stats']
+    if animation_stats['updates']:
+        summary += f", {animation_stats['cpu_seconds'] / animation_stats['updates'] * 1000:.3f} ms animation/frame"
+    return summary
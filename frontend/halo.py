@@ -0,0 +1,114 @@
+"""
+Pulsing activation halo drawn behind the avatar.
+
+Only needs a ModernGL context, so the halo can be drawn both in the app
+window (main.py) and in offscreen benchmarks.
+"""
+import moderngl
+import numpy as np
+
+import gltf_loader
+
+def create_halo(ctx):
+    """
+    Create the halo quad, shader program and model uniforms.
+    
+    Args:
+        ctx: The ModernGL context
+    
+    Returns:
+        Dictionary with the halo's GL objects and render stats
+    """
+    # Create a quad for the halo effect
+    vertices = np.array([
+        # x,    y,    z,    u,    v
+        -1.0, -1.0, 0.0,  0.0,  0.0,
+         1.0, -1.0, 0.0,  1.0,  0.0,
+         1.0,  1.0, 0.0,  1.0,  1.0,
+        -1.0,  1.0, 0.0,  0.0,  1.0,
+    ], dtype='f4')
+    
+    indices = np.array([0, 1, 2, 0, 2, 3], dtype='i4')
+    
+    vbo = ctx.buffer(vertices)
+    ibo = ctx.buffer(indices)
+    
+    program = ctx.program(
+        vertex_shader='''
+            #version 330
+        ''' + gltf_loader.UNIFORM_BLOCKS_GLSL + '''
+            uniform float scale;
+            
+            in vec3 in_position;
+            in vec2 in_texcoord;
+            
+            out vec2 v_texcoord;
+            
+            void main() {
+                gl_Position = mvp * vec4(in_position * scale, 1.0);
+                v_texcoord = in_texcoord;
+            }
+        ''',
+        fragment_shader='''
+            #version 330
+            uniform vec4 color;
+            uniform float alpha;
+            
+            in vec2 v_texcoord;
+            out vec4 f_color;
+            
+            void main() {
+                // Calculate distance from center for circular gradient
+                float dist = distance(v_texcoord, vec2(0.5, 0.5)) * 2.0;
+                // Create a soft circular gradient that fades at the edges
+                float intensity = 1.0 - smoothstep(0.0, 1.0, dist);
+                // Apply color with calculated alpha
+                f_color = vec4(color.rgb, color.a * alpha * intensity);
+            }
+        '''
+    )
+    gltf_loader.bind_uniform_blocks(program)
+    
+    vao = ctx.vertex_array(
+        program,
+        [(vbo, '3f 2f', 'in_position', 'in_texcoord')],
+        index_buffer=ibo
+    )
+    
+    return {
+        'ctx': ctx,
+        'vao': vao,
+        'program': program,
+        # The halo has its own model block so it doesn't overwrite the avatar's
+        'model_uniforms': gltf_loader.create_model_uniforms(ctx),
+        'render_stats': {'frames': 0, 'draw_calls': 0, 'uniform_bytes': 0}
+    }
+
+def render_halo(halo, halo_matrix, color, alpha, frame_uniforms):
+    """
+    Draw the halo with alpha blending.
+    
+    Args:
+        halo: Halo data from create_halo
+        halo_matrix: Model matrix placing and scaling the halo quad
+        color: RGB(A) color; the alpha component is replaced by alpha
+        alpha: Overall opacity (0-1)
+        frame_uniforms: Camera uniforms written for this frame (gltf_loader.update_frame_uniforms)
+    """
+    # Set uniforms for the halo shader
+    gltf_loader.update_model_uniforms(halo['model_uniforms'], halo_matrix, frame_uniforms)
+    program = halo['program']
+    program['scale'].value = 1.0
+    program['color'].value = tuple(color[:3]) + (alpha,)
+    program['alpha'].value = alpha
+    
+    # Enable blend for transparency
+    halo['ctx'].blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
+    
+    # Render the halo
+    halo['vao'].render()
+    
+    stats = halo['render_stats']
+    stats['frames'] += 1
+    stats['draw_calls'] += 1
+    stats['uniform_bytes'] += halo['model_uniforms']['data'].nbytes
@@ -0,0 +1,175 @@
+"""
+Shared keep-alive HTTP session for the frontend's API clients.
+
+Every request used to go through the bare requests.get/post functions,
+which open (and for HTTPS, TLS-handshake) a new connection each time and
+close it afterwards. get_session() returns one process-wide
+requests.Session whose connection pools keep connections to the
+transcription API and the backend open between utterances, with a default
+timeout and retries for failures that are safe to retry:
+
+- connection errors (the request never reached the server) for any method
+- 502/503/504 responses for idempotent methods only; POSTs are never
+  resent, so a command or a transcription can't run twice
+
+connection_stats() reports how many requests reused a pooled connection.
+json_headers() adds the Idempotency-Key the backend uses to run the
+requests of one interaction only once.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connection pools kept (one per host) and connections kept per host. The
+# transcription dispatcher can have a few requests in flight to one host
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+# (connect, read) timeout used when a call doesn't pass its own
+DEFAULT_TIMEOUT = (3.05, 10)
+
+CONNECT_RETRIES = 2
+STATUS_RETRIES = 1
+RETRY_BACKOFF = 0.2
+RETRY_STATUSES = (502, 503, 504)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+_session = None
+_adapter = None
+_lock = threading.Lock()
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout that counts the requests it sends"""
+    
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        """
+        Initialize the adapter.
+        
+        Args:
+            timeout: Timeout used when a request doesn't specify one
+            **kwargs: Passed on to HTTPAdapter (pool sizes, max_retries)
+        """
+        self.timeout = timeout
+        self.requests_sent = 0
+        self.errors = 0
+        # Counts of pools that were evicted or closed, so totals stay cumulative
+        self.retired = {'connections': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+        super().__init__(**kwargs)
+    
+    def send(self, request, timeout=None, **kwargs):
+        with self._stats_lock:
+            self.requests_sent += 1
+        try:
+            return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+        except requests.RequestException:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+    
+    def pool_counts(self):
+        """
+        Connections opened and requests made by the live connection pools.
+        
+        Returns:
+            (connections, requests) summed over all hosts, including retries
+        """
+        connections = self.retired['connections']
+        total_requests = self.retired['requests']
+        pools = self.poolmanager.pools
+        with pools.lock:
+            live = list(pools._container.values())
+        for pool in live:
+            connections += pool.num_connections
+            total_requests += pool.num_requests
+        return connections, total_requests
+    
+    def close(self):
+        connections, total_requests = self.pool_counts()
+        self.retired = {'connections': connections, 'requests': total_requests}
+        super().close()
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT,
+                   connect_retries=CONNECT_RETRIES, status_retries=STATUS_RETRIES):
+    """
+    Create a pooled session with the frontend's timeout and retry policy.
+    
+    Args:
+        pool_connections: Number of hosts to keep connection pools for
+        pool_maxsize: Idle connections kept per host
+        timeout: Default (connect, read) timeout
+        connect_retries: Retries after connection errors
+        status_retries: Retries of idempotent requests after 502/503/504
+    
+    Returns:
+        (session, adapter) - the adapter holds the reuse counters
+    """
+    retry = Retry(
+        total=connect_retries + status_retries,
+        connect=connect_retries,
+        read=0,
+        status=status_retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    )
+    adapter = PooledAdapter(timeout=timeout, pool_connections=pool_connections,
+                            pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session, adapter
+
+def get_session():
+    """The process-wide pooled session (created on first use)"""
+    global _session, _adapter
+    with _lock:
+        if _session is None:
+            _session, _adapter = create_session()
+        return _session
+
+def json_headers(idempotency_key=None):
+    """Headers for a JSON POST to the backend, with the idempotency key if there is one"""
+    headers = {"Content-Type": "application/json"}
+    if idempotency_key:
+        headers[IDEMPOTENCY_HEADER] = idempotency_key
+    return headers
+
+def connection_stats(adapter=None):
+    """
+    Connection reuse counters of a pooled session.
+    
+    Args:
+        adapter: PooledAdapter to report on (default: the shared session's)
+    
+    Returns:
+        Dictionary with requests, errors, connections_opened and reused
+        (requests that went over an already open connection)
+    """
+    adapter = adapter or _adapter
+    if adapter is None:
+        return {'requests': 0, 'errors': 0, 'connections_opened': 0, 'reused': 0}
+    connections, total_requests = adapter.pool_counts()
+    return {
+        'requests': adapter.requests_sent,
+        'errors': adapter.errors,
+        'connections_opened': connections,
+        'reused': max(0, total_requests - connections)
+    }
+
+def format_connection_stats(adapter=None):
+    """One-line summary of connection_stats()"""
+    stats = connection_stats(adapter)
+    reuse = stats['reused'] / max(1, stats['reused'] + stats['connections_opened']) * 100
+    return (f"{stats['requests']} HTTP requests, {stats['connections_opened']} connections opened, "
+            f"{stats['reused']} reused ({reuse:.0f}%), {stats['errors']} errors")
+
+def close_session():
+    """Close the shared session's pooled connections"""
+    with _lock:
+        if _session is not None:
+            _session.close()
@@ -5,14 +5,17 @@ import moderngl
 import numpy as np
 from pyrr import Matrix44
 import gltf_loader
+from frame_scheduler import FrameScheduler
+from speech_bubble import SpeechBubbleRenderer
+from halo import create_halo, render_halo
 import ctypes
 from ctypes import wintypes
 import time
 import threading
 import math
 import random
-import requests
 import json
+from http_client import close_session, format_connection_stats, get_session, json_headers
 
 # Add ElevenLabs imports for text-to-speech
 try:
@@ -163,7 +166,7 @@ ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
 def initialize_tts():
     if not TTS_AVAILABLE:
         return None
-        
+    
     # Try to initialize ElevenLabs client with API key
     try:
         # Initialize ElevenLabs client
@@ -172,7 +175,7 @@ def initialize_tts():
         # Test the connection
         print("ElevenLabs TTS initialized successfully.")
         return tts_client
-            
+    
     except Exception as e:
         print(f"Failed to initialize ElevenLabs TTS: {e}")
         return None
@@ -205,7 +208,7 @@ def speak_text(tts_client, text, voice_id="FGY2WhTYpPnrIDTdsKH5"):
         delay_thread = threading.Thread(target=delayed_speak, daemon=True)
         delay_thread.start()
         return delay_thread
-        
+    
     # Define a function to be run in a separate thread
     def tts_thread_func():
         global is_speaking
@@ -226,7 +229,7 @@ def speak_text(tts_client, text, voice_id="FGY2WhTYpPnrIDTdsKH5"):
             
             # Play audio using elevenlabs play function (handles playback automatically)
             play(audio_data)
-            
+        
         except Exception as e:
             print(f"Error in TTS playback: {e}")
         finally:
@@ -395,13 +398,16 @@ def process_confirmation(voice_recognizer, command, is_confirmed):
     """Process the confirmation response from the user"""
     if is_confirmed:
         print(f"Confirmed! Processing command: {command}")
+        # Sent with every request for this command, so the backend runs it once
+        # even though the interaction's metadata already carried it
+        idempotency_key = voice_recognizer.idempotency_key_for(command) if voice_recognizer else None
         
         # Check if the API server is available
         def check_api_health():
             try:
                 health_url = "http://localhost:8000/health"
                 print(f"[DEBUG] Checking API health at: {health_url}")
-                health_response = requests.get(health_url, timeout=2)
+                health_response = get_session().get(health_url, timeout=2)
                 print(f"[DEBUG] Health check response status: {health_response.status_code}")
                 print(f"[DEBUG] Health check response body: {health_response.text[:100]}")
                 if health_response.status_code == 200:
@@ -495,10 +501,10 @@ def process_confirmation(voice_recognizer, command, is_confirmed):
                     try:
                         print(f"Sending email request: {email_payload}")
                         print(f"[DEBUG] Email API URL: {api_url}")
-                        response = requests.post(
+                        response = get_session().post(
                             api_url,
                             json=email_payload,
-                            headers={"Content-Type": "application/json"},
+                            headers=json_headers(idempotency_key),
                             timeout=5
                         )
                         
@@ -550,10 +556,10 @@ def process_confirmation(voice_recognizer, command, is_confirmed):
                         print(f"[DEBUG] Sending command request to {api_url}")
                         print(f"[DEBUG] Payload: {json.dumps(payload, indent=2)}")
                         print(f"[DEBUG] *** STARTING POST REQUEST to {api_url} at {time.strftime('%H:%M:%S')} ***")
-                        response = requests.post(
+                        response = get_session().post(
                             api_url,
                             json=payload,
-                            headers={"Content-Type": "application/json"},
+                            headers=json_headers(idempotency_key),
                             timeout=5
                         )
                         print(f"[DEBUG] *** POST REQUEST COMPLETED at {time.strftime('%H:%M:%S')} ***")
@@ -577,10 +583,10 @@ def process_confirmation(voice_recognizer, command, is_confirmed):
                             try:
                                 print(f"[DEBUG] Sending to fallback with payload: {json.dumps(payload, indent=2)}")
                                 print(f"[DEBUG] *** STARTING FALLBACK POST REQUEST to {fallback_url} at {time.strftime('%H:%M:%S')} ***")
-                                fallback_response = requests.post(
+                                fallback_response = get_session().post(
                                     fallback_url,
                                     json=payload,
-                                    headers={"Content-Type": "application/json"},
+                                    headers=json_headers(idempotency_key),
                                     timeout=5
                                 )
                                 print(f"[DEBUG] *** FALLBACK POST REQUEST COMPLETED at {time.strftime('%H:%M:%S')} ***")
@@ -609,10 +615,10 @@ def process_confirmation(voice_recognizer, command, is_confirmed):
                         try:
                             print(f"[DEBUG] Sending to fallback with payload: {json.dumps(payload, indent=2)}")
                             print(f"[DEBUG] *** STARTING FALLBACK POST REQUEST to {fallback_url} at {time.strftime('%H:%M:%S')} ***")
-                            fallback_response = requests.post(
+                            fallback_response = get_session().post(
                                 fallback_url,
                                 json=payload,
-                                headers={"Content-Type": "application/json"},
+                                headers=json_headers(idempotency_key),
                                 timeout=5
                             )
                             print(f"[DEBUG] *** FALLBACK POST REQUEST COMPLETED at {time.strftime('%H:%M:%S')} ***")
@@ -658,7 +664,11 @@ def main():
         if VOICE_RECOGNITION_AVAILABLE:
             try:
                 # Initialize with wake words ("hey ava" or "hi ava")
-                voice_recognizer = VoiceRecognizer(wake_words=["hi.", "hi, hey, hey."])
+                # Set ARCHIVE_RECORDINGS=0 to keep captured audio in memory only
+                voice_recognizer = VoiceRecognizer(
+                    wake_words=["hey ava", "hi ava"],
+                    archive_recordings=os.getenv("ARCHIVE_RECORDINGS", "1") != "0"
+                )
                 
                 # Initialize confirmation state 
                 voice_recognizer.awaiting_confirmation = False
@@ -695,6 +705,15 @@ def main():
         speech_bubble_border_radius = 10
         max_bubble_width = 300
         
+        # Bubble textures are cached per message, font and width
+        speech_bubble = SpeechBubbleRenderer(
+            ctx,
+            text_color=text_color,
+            bubble_color=speech_bubble_color,
+            padding=speech_bubble_padding,
+            border_radius=speech_bubble_border_radius
+        )
+        
         # Speech bubble state
         current_message = "Hello, I'm AVA. Your Personal Browsing Assistant"
         message_timer = 0
@@ -732,7 +751,11 @@ def main():
         
         # Load the model
         model_path = os.path.join(os.path.dirname(__file__), 'models', 'tokovt', 'scene.gltf')
-        model = gltf_loader.load_gltf(ctx, model_path)
+        # Camera uniforms shared by the model and halo programs, written once per frame
+        frame_uniforms = gltf_loader.create_frame_uniforms(ctx)
+        
+        # Primitives sharing a material are merged so the avatar takes 2 draw calls instead of 31
+        model = gltf_loader.load_gltf(ctx, model_path, merge_primitives=True, frame_uniforms=frame_uniforms)
         
         # Create projection matrix with slightly wider FOV for better visibility
         projection = Matrix44.perspective_projection(50.0, WIDTH / HEIGHT, 0.1, 100.0)
@@ -781,6 +804,14 @@ def main():
         return_to_center_chance = 0.6  # 60% chance to return to center
         center_bias = 0.7  # Bias toward center position
         
+        # Skeletal animations shipped with the model (evaluated by gltf_loader.animate_gltf)
+        idle_animation = 'metarig|Finger'                  # Relaxed hand pose held while idle
+        activation_animation = 'metarig|Empty.003Action'   # Turnaround played once on activation
+        animation_time = 0.0
+        was_activated = False
+        activation_clip = next((a for a in model['animations'] if a['name'] == activation_animation), None)
+        activation_clip_duration = activation_clip['duration'] if activation_clip else 0.0
+        
         # Callback function for voice activation
         def on_voice_activation(activated, command=None):
             nonlocal is_activated, activation_timer, current_message, message_timer, show_message, last_command
@@ -874,7 +905,7 @@ def main():
         # Set callback for voice recognition if available
         if voice_recognizer:
             voice_recognizer.callback = on_voice_activation
-            
+        
         # For testing: Allow manual activation with spacebar
         manual_activation_key = pygame.K_SPACE
         
@@ -888,58 +919,12 @@ def main():
         scissor_x = -100  # Keep original x position
         scissor_y = HEIGHT - 175  # Adjust y to show more of the model
         
-        # Create a quad for the halo effect
-        halo_vertices = np.array([
-            # x,    y,    z,    u,    v
-            -1.0, -1.0, 0.0,  0.0,  0.0,
-             1.0, -1.0, 0.0,  1.0,  0.0,
-             1.0,  1.0, 0.0,  1.0,  1.0,
-            -1.0,  1.0, 0.0,  0.0,  1.0,
-        ], dtype='f4')
-        
-        halo_indices = np.array([0, 1, 2, 0, 2, 3], dtype='i4')
-        
-        halo_vbo = ctx.buffer(halo_vertices)
-        halo_ibo = ctx.buffer(halo_indices)
+        # Quad, shader and uniforms for the activation halo
+        halo = create_halo(ctx)
         
-        halo_vao = ctx.vertex_array(
-            ctx.program(
-                vertex_shader='''
-                    #version 330
-                    uniform mat4 mvp;
-                    uniform float scale;
-                    
-                    in vec3 in_position;
-                    in vec2 in_texcoord;
-                    
-                    out vec2 v_texcoord;
-                    
-                    void main() {
-                        gl_Position = mvp * vec4(in_position * scale, 1.0);
-                        v_texcoord = in_texcoord;
-                    }
-                ''',
-                fragment_shader='''
-                    #version 330
-                    uniform vec4 color;
-                    uniform float alpha;
-                    
-                    in vec2 v_texcoord;
-                    out vec4 f_color;
-                    
-                    void main() {
-                        // Calculate distance from center for circular gradient
-                        float dist = distance(v_texcoord, vec2(0.5, 0.5)) * 2.0;
-                        // Create a soft circular gradient that fades at the edges
-                        float intensity = 1.0 - smoothstep(0.0, 1.0, dist);
-                        // Apply color with calculated alpha
-                        f_color = vec4(color.rgb, color.a * alpha * intensity);
-                    }
-                '''
-            ),
-            [(halo_vbo, '3f 2f', 'in_position', 'in_texcoord')],
-            index_buffer=halo_ibo
-        )
+        # Full frame rate while activated, speaking or showing the halo,
+        # a low idle rate with redraw-on-change otherwise
+        frame_scheduler = FrameScheduler()
         
         # Modify the command handling in the main loop
         while running:            
@@ -1066,24 +1051,25 @@ def main():
                 
                 direction_change_timer = 0
             
-            # Smoothly interpolate current rotation towards target rotation
-            head_rot_x += (target_rot_x - head_rot_x) * movement_speed
-            head_rot_y += (target_rot_y - head_rot_y) * movement_speed
+            # Smoothly interpolate current rotation towards target rotation.
+            # The speeds are per 60 FPS frame; scale them by dt since the
+            # frame scheduler lowers the loop rate while idle.
+            frame_steps = dt * 60.0
+            movement_factor = 1.0 - (1.0 - movement_speed) ** frame_steps
+            head_rot_x += (target_rot_x - head_rot_x) * movement_factor
+            head_rot_y += (target_rot_y - head_rot_y) * movement_factor
             
-            # Composite micro-movements for more realistic motion
-            # Faster, smaller movements for eye/head micro-adjustments
-            micro_x = (math.sin(time.time() * 0.7) * 0.005 + 
-                      math.sin(time.time() * 1.3) * 0.003)
+            # Advance the animation clock: the activation animation plays once
+            # from the start whenever the assistant is activated, otherwise the
+            # idle pose is held. The skeleton is posed below, on drawn frames only
+            if is_activated and not was_activated:
+                animation_time = 0.0
+            was_activated = is_activated
+            animation_time += dt
+            activation_playing = is_activated and animation_time < activation_clip_duration
             
-            micro_y = (math.sin(time.time() * 0.5) * 0.006 + 
-                      math.sin(time.time() * 1.1) * 0.004)
-            
-            # Add subtle breathing motion
-            breathing = math.sin(time.time() * 0.8) * 0.004
-            
-            # Combine all movements
-            final_rot_x = head_rot_x + micro_x + breathing
-            final_rot_y = head_rot_y + micro_y
+            final_rot_x = head_rot_x
+            final_rot_y = head_rot_y
             
             # Handle activation state and scale
             if is_activated:
@@ -1116,7 +1102,7 @@ def main():
                     halo_alpha = 0.0
             
             # Smoothly interpolate scale - more responsive
-            current_scale += (target_scale - current_scale) * scale_speed * 7
+            current_scale += (target_scale - current_scale) * (1.0 - (1.0 - scale_speed * 7) ** frame_steps)
             
             # Create model matrix with natural head rotations
             model_matrix = Matrix44.from_y_rotation(final_rot_y) @ Matrix44.from_x_rotation(final_rot_x)
@@ -1130,6 +1116,21 @@ def main():
             # Combine transformations: first rotate, then scale, then translate
             model_matrix = translation_matrix @ scale_matrix @ model_matrix
             
+            # While idle, only redraw when the head has moved perceptibly or
+            # the speech bubble changed
+            scene_active = is_activated or is_speaking or halo_alpha > 0.0
+            if not frame_scheduler.should_render(scene_active, (final_rot_x, final_rot_y), (show_message, current_message),
+                                                 animating=activation_playing):
+                clock.tick(frame_scheduler.frame_rate)
+                frame_scheduler.end_frame()
+                continue
+            
+            # Pose the skeleton for this frame
+            if is_activated:
+                gltf_loader.animate_gltf(model, activation_animation, animation_time, loop=False)
+            else:
+                gltf_loader.animate_gltf(model, idle_animation, animation_time)
+            
             # Clear the entire screen first
             ctx.clear(*BACKGROUND_COLOR)
             
@@ -1137,124 +1138,50 @@ def main():
             # ModernGL doesn't use SCISSOR_TEST constant, we just set the scissor box directly
             ctx.scissor = (scissor_x, scissor_y, scissor_width, scissor_height)
             
+            # Write the camera block once for every program drawn this frame
+            gltf_loader.update_frame_uniforms(frame_uniforms, view, projection)
+            
             # Render the model (only visible in scissor region)
-            gltf_loader.render_gltf(model, model_matrix, view, projection)
+            gltf_loader.render_gltf(model, model_matrix)
             
             # Render halo effect if activated
             if halo_alpha > 0.0:
-                # Set up MVP matrix for the halo (centered on model but slightly behind)
+                # Set up the model matrix for the halo (centered on model but slightly behind)
                 halo_matrix = translation_matrix @ Matrix44.from_scale((halo_radius, halo_radius, halo_radius))
-                
-                # Set uniforms for the halo shader
-                halo_vao.program['mvp'].write((projection @ view @ halo_matrix).astype('f4').tobytes())
-                halo_vao.program['scale'].value = 1.0
-                halo_vao.program['color'].value = halo_color[:3] + (halo_alpha,)
-                halo_vao.program['alpha'].value = halo_alpha
-                
-                # Enable blend for transparency
-                ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
-                
-                # Render the halo
-                halo_vao.render()
+                render_halo(halo, halo_matrix, halo_color, halo_alpha, frame_uniforms)
             
             # Disable scissor test after rendering (set to None or reset to full viewport)
             ctx.scissor = None
             
-            # Render speech bubble with text if needed
+            # Render speech bubble with text if needed. The bubble is laid out
+            # and uploaded once per message and drawn as a single textured quad.
             if show_message and current_message:
-                # Get a reference to the screen surface for 2D drawing
-                screen_surface = pygame.display.get_surface()
-                
-                # Function to render text with word wrapping
-                def render_text_with_wrap(text, font, color, max_width, pos_x, pos_y):
-                    words = text.split(' ')
-                    lines = []
-                    current_line = []
-                    
-                    for word in words:
-                        test_line = ' '.join(current_line + [word])
-                        test_width, _ = font.size(test_line)
-                        
-                        if test_width <= max_width:
-                            current_line.append(word)
-                        else:
-                            if current_line:  # If the current line has words, add it to lines
-                                lines.append(' '.join(current_line))
-                                current_line = [word]
-                            else:  # If current_line is empty, the word is too long by itself
-                                lines.append(word)
-                                current_line = []
-                    
-                    # Add the last line
-                    if current_line:
-                        lines.append(' '.join(current_line))
-                    
-                    # Render each line
-                    line_surfaces = []
-                    max_line_width = 0
-                    total_height = 0
-                    
-                    for line in lines:
-                        line_surf = font.render(line, True, color)
-                        line_surfaces.append(line_surf)
-                        max_line_width = max(max_line_width, line_surf.get_width())
-                        total_height += line_surf.get_height()
-                    
-                    # Calculate bubble size
-                    bubble_width = max_line_width + speech_bubble_padding * 2
-                    bubble_height = total_height + speech_bubble_padding * 2
-                    
-                    # Draw speech bubble
-                    bubble_rect = pygame.Rect(pos_x - bubble_width // 2, 
-                                             pos_y - bubble_height - 10,
-                                             bubble_width, bubble_height)
-                    
-                    # Semi-transparent background (create a surface with per-pixel alpha)
-                    bubble_surface = pygame.Surface((bubble_width, bubble_height), pygame.SRCALPHA)
-                    bubble_surface.fill((0, 0, 0, 180))  # RGBA: semi-transparent black
-                    
-                    # Draw rounded rectangle (simulate with multiple circles and rects)
-                    pygame.draw.rect(bubble_surface, speech_bubble_color, 
-                                    pygame.Rect(0, 0, bubble_width, bubble_height), 
-                                    border_radius=speech_bubble_border_radius)
-                    
-                    # Draw little triangle pointing to character
-                    triangle_points = [
-                        (bubble_width // 2 - 10, bubble_height),
-                        (bubble_width // 2 + 10, bubble_height),
-                        (bubble_width // 2, bubble_height + 10)
-                    ]
-                    pygame.draw.polygon(bubble_surface, speech_bubble_color, triangle_points)
-                    
-                    # Blit the bubble
-                    screen_surface.blit(bubble_surface, bubble_rect)
-                    
-                    # Draw text onto bubble
-                    current_y = pos_y - bubble_height + speech_bubble_padding - 10
-                    for line_surf in line_surfaces:
-                        screen_surface.blit(line_surf, 
-                                         (pos_x - line_surf.get_width() // 2, current_y))
-                        current_y += line_surf.get_height()
-                
                 # Render the speech bubble with text at the top of the model
                 bubble_x = WIDTH // 2
                 bubble_y = HEIGHT // 2 - 50  # Positioned above the model
                 
-                # We need to temporarily switch to Pygame rendering for the text
-                # Save the OpenGL state first
-                ctx.finish()
-                
-                render_text_with_wrap(current_message, speech_font, text_color, 
-                                    max_bubble_width, bubble_x, bubble_y)
+                speech_bubble.draw(current_message, speech_font, max_bubble_width,
+                                   bubble_x, bubble_y, (WIDTH, HEIGHT))
             
             # Always flip only once per frame at the end
             pygame.display.flip()
-            clock.tick(60)
+            clock.tick(frame_scheduler.frame_rate)
+            frame_scheduler.end_frame()
     
     finally:
+        # Report draw calls and CPU time per frame for the model
+        if 'model' in locals():
+            print(f"Render stats: {gltf_loader.format_render_stats(model)}")
+        if 'frame_scheduler' in locals():
+            print(f"Frame scheduler: {frame_scheduler.format_stats()}")
+        if 'speech_bubble' in locals():
+            print(f"Speech bubble cache: {speech_bubble.format_stats()}")
+        
         # Make sure to stop the voice recognizer when done
         if 'voice_recognizer' in locals() and voice_recognizer:
             voice_recognizer.stop_listening()
+        print(f"HTTP connections: {format_connection_stats()}")
+        close_session()
         pygame.quit()
 
 if __name__ == "__main__":
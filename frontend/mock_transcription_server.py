@@ -0,0 +1,140 @@
+"""
+Local stand-in for an OpenAI-compatible transcription API (Groq).
+
+Answers POST .../audio/transcriptions with a fixed transcript after a
+configurable delay, and GET .../models so API key validation passes.
+An uplink bandwidth can be simulated so upload size shows up in latency.
+Slow tails and failures can be injected to exercise hedging and circuit
+breakers without network access or API keys. Point the frontend at it
+with GROQ_API_BASE=http://127.0.0.1:PORT/openai/v1.
+
+Usage:
+    python mock_transcription_server.py [--port 8100] [--delay 0.2] [--jitter 0.05]
+                                        [--slow-rate 0.1 --slow-delay 2.0] [--error-rate 0.0]
+                                        [--upload-kbps 1000]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockTranscriptionHandler(BaseHTTPRequestHandler):
+    """Request handler; behaviour comes from the server's settings"""
+    
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the body
+    # waits for the client's delayed ACK on kept-alive connections
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        """Keep the console quiet"""
+    
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": "distil-whisper-large-v3-en"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+    
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/audio/transcriptions'):
+            self._send_json(404, {"error": "not found"})
+            return
+        
+        with server.lock:
+            server.stats['requests'] += 1
+            server.stats['bytes_received'] += len(body)
+            server.stats['connections'].add(self.client_address)
+            roll = server.random.random()
+            jitter = server.random.uniform(-server.jitter, server.jitter)
+        
+        delay = server.slow_delay if roll < server.slow_rate else max(0.0, server.delay + jitter)
+        if server.upload_kbps:
+            delay += len(body) * 8 / (server.upload_kbps * 1000)
+        time.sleep(delay)
+        
+        if server.random.random() < server.error_rate:
+            with server.lock:
+                server.stats['errors'] += 1
+            self._send_json(500, {"error": {"message": "injected failure"}})
+            return
+        self._send_json(200, {"text": server.text})
+
+def create_server(port=0, delay=0.2, jitter=0.0, slow_rate=0.0, slow_delay=2.0, error_rate=0.0,
+                  text="hey ava", seed=None, upload_kbps=None):
+    """
+    Create a mock transcription server.
+    
+    Args:
+        port: Port to listen on (0 picks a free one)
+        delay: Typical response time in seconds
+        jitter: Uniform +/- variation of the response time
+        slow_rate: Fraction of requests that take slow_delay instead
+        slow_delay: Response time of slow requests
+        error_rate: Fraction of requests answered with HTTP 500
+        text: Transcript returned for every request
+        seed: Random seed for reproducible runs
+        upload_kbps: Simulated uplink bandwidth; the request body's transfer
+            time is added to the response time (None for no limit)
+    
+    Returns:
+        ThreadingHTTPServer with a 'stats' dictionary (requests, errors,
+        bytes_received, connections) and a 'base_url' attribute
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockTranscriptionHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.jitter = jitter
+    server.slow_rate = slow_rate
+    server.slow_delay = slow_delay
+    server.error_rate = error_rate
+    server.text = text
+    server.random = random.Random(seed)
+    server.upload_kbps = upload_kbps
+    server.lock = threading.Lock()
+    server.stats = {'requests': 0, 'errors': 0, 'bytes_received': 0, 'connections': set()}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1"
+    return server
+
+def start_in_background(server):
+    """Serve requests on a daemon thread and return the server"""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--delay', type=float, default=0.2, help="Typical response time in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Uniform +/- response time variation")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fraction of slow responses")
+    parser.add_argument('--slow-delay', type=float, default=2.0, help="Response time of slow responses")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument('--text', default="hey ava", help="Transcript to return")
+    parser.add_argument('--upload-kbps', type=float, default=None, help="Simulated uplink bandwidth in kbit/s")
+    args = parser.parse_args()
+    
+    server = create_server(args.port, args.delay, args.jitter, args.slow_rate, args.slow_delay,
+                           args.error_rate, args.text, upload_kbps=args.upload_kbps)
+    print(f"Mock transcription API at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats['requests']} requests, {server.stats['errors']} errors, "
+              f"{server.stats['bytes_received'] / 1024:.1f} KB received")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+SQLite index of the archived recordings and interaction metadata.
+
+Every wake word recording, command recording and metadata file is
+recorded with its interaction, size and creation time when it is saved,
+and each interaction with its transcripts. The file count and total size
+are kept up to date by triggers, so retention only has to look at the
+totals and the oldest rows instead of listing and sorting the whole
+archive directory, and queries like "the last N commands" are a single
+indexed lookup.
+
+The index lives next to the recordings (recordings.db). Files that were
+archived before the index existed are imported once when it is created.
+
+Usage:
+    python recording_store.py [temp] [--last 10] [--max-files 100] [--max-mb 200]
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+INDEX_FILENAME = "recordings.db"
+
+# Kinds of archived files, from the filename prefix
+FILE_PATTERN = re.compile(r'^(wake|command|unknown_command|metadata)_(\d{8}_\d{6})\.(wav|mp3|json)$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    interaction TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_interaction ON files (interaction);
+CREATE INDEX IF NOT EXISTS files_kind ON files (kind, id);
+
+CREATE TABLE IF NOT EXISTS interactions (
+    interaction TEXT PRIMARY KEY,
+    wake_text TEXT,
+    command_text TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_created ON interactions (created);
+
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (1, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS files_added AFTER INSERT ON files BEGIN
+    UPDATE totals SET file_count = file_count + 1, total_bytes = total_bytes + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS files_removed AFTER DELETE ON files BEGIN
+    UPDATE totals SET file_count = file_count - 1, total_bytes = total_bytes - OLD.size WHERE id = 1;
+END;
+"""
+
+class RecordingStore:
+    """Index of archived files with count and size based retention"""
+    
+    def __init__(self, directory, filename=INDEX_FILENAME):
+        """
+        Open (or create) the index of an archive directory.
+        
+        Args:
+            directory: Directory holding the recordings
+            filename: Index database filename inside the directory
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        is_new = not os.path.exists(path)
+        # Used from the listening thread and the archive worker
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+        if is_new:
+            imported = self.import_existing()
+            if imported:
+                print(f"Indexed {imported} existing recordings in {path}")
+    
+    def import_existing(self):
+        """
+        Index archived files that aren't in the index yet (one directory scan).
+        
+        The transcripts of interactions are read from their metadata files.
+        
+        Returns:
+            Number of files added
+        """
+        rows = []
+        interactions = []
+        for name in os.listdir(self.directory):
+            match = FILE_PATTERN.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            rows.append((match.group(2), match.group(1), path, stat.st_size, stat.st_ctime))
+            if match.group(1) == 'metadata':
+                try:
+                    with open(path) as f:
+                        interaction = json.load(f)['interaction']
+                    interactions.append((match.group(2), interaction['wake_word']['text'],
+                                         interaction['command']['text'], stat.st_ctime))
+                except (OSError, ValueError, KeyError, TypeError):
+                    pass
+        
+        # Oldest first, so ids follow creation order like new entries do
+        rows.sort(key=lambda row: row[4])
+        with self.lock, self.connection:
+            before = self.connection.execute("SELECT file_count FROM totals WHERE id = 1").fetchone()[0]
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO files (interaction, kind, path, size, created) VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO interactions (interaction, wake_text, command_text, created) "
+                "VALUES (?, ?, ?, ?)", interactions)
+            return self.connection.execute("SELECT file_count FROM totals WHERE id = 1").fetchone()[0] - before
+    
+    def add_file(self, interaction, kind, path):
+        """
+        Record a file that was just written.
+        
+        Args:
+            interaction: Interaction timestamp the file belongs to
+            kind: 'wake', 'command', 'unknown_command' or 'metadata'
+            path: Path of the file
+        """
+        size = os.path.getsize(path)
+        with self.lock, self.connection:
+            # Delete and insert rather than REPLACE, which wouldn't fire the totals trigger
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            self.connection.execute(
+                "INSERT INTO files (interaction, kind, path, size, created) VALUES (?, ?, ?, ?, ?)",
+                (interaction, kind, path, size, time.time()))
+    
+    def add_interaction(self, interaction, wake_text, command_text, created=None):
+        """Record the transcripts of an interaction"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO interactions (interaction, wake_text, command_text, created) VALUES (?, ?, ?, ?)",
+                (interaction, wake_text, command_text, created or time.time()))
+    
+    def totals(self):
+        """(file count, total bytes) of the indexed files"""
+        with self.lock:
+            return self.connection.execute("SELECT file_count, total_bytes FROM totals WHERE id = 1").fetchone()
+    
+    def enforce_retention(self, max_files=None, max_bytes=None):
+        """
+        Delete the oldest files until the archive is within its limits.
+        
+        Only the totals are read when nothing has to go; otherwise the
+        oldest rows are taken from the primary key order. Interactions left
+        without any file are removed with them.
+        
+        Args:
+            max_files: Most files to keep (None for no limit)
+            max_bytes: Most bytes to keep (None for no limit)
+        
+        Returns:
+            Number of files deleted
+        """
+        deleted = 0
+        with self.lock:
+            while True:
+                file_count, total_bytes = self.connection.execute(
+                    "SELECT file_count, total_bytes FROM totals WHERE id = 1").fetchone()
+                excess_files = file_count - max_files if max_files is not None else 0
+                excess_bytes = total_bytes - max_bytes if max_bytes is not None else 0
+                if excess_files <= 0 and excess_bytes <= 0:
+                    break
+                
+                # Take enough of the oldest rows for the file limit, or a batch for the byte limit
+                batch = max(excess_files, 1 if excess_bytes <= 0 else 16)
+                rows = self.connection.execute(
+                    "SELECT id, interaction, path, size FROM files ORDER BY id LIMIT ?", (batch,)).fetchall()
+                if not rows:
+                    break
+                doomed = []
+                touched = set()
+                for row_id, interaction, path, size in rows:
+                    if excess_files <= 0 and excess_bytes <= 0:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        print(f"Error deleting {path}: {e}")
+                    doomed.append((row_id,))
+                    touched.add((interaction,))
+                    excess_files -= 1
+                    excess_bytes -= size
+                with self.connection:
+                    self.connection.executemany("DELETE FROM files WHERE id = ?", doomed)
+                    self.connection.executemany(
+                        "DELETE FROM interactions WHERE interaction = ? AND NOT EXISTS "
+                        "(SELECT 1 FROM files WHERE files.interaction = interactions.interaction)", touched)
+                deleted += len(doomed)
+        return deleted
+    
+    def last_commands(self, limit=10):
+        """
+        The most recent interactions.
+        
+        Returns:
+            List of dictionaries with interaction, time, wake_text and
+            command_text, newest first
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT interaction, created, wake_text, command_text FROM interactions "
+                "ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [{'interaction': interaction, 'time': created, 'wake_text': wake_text, 'command_text': command_text}
+                for interaction, created, wake_text, command_text in rows]
+    
+    def files_for(self, interaction):
+        """Paths of an interaction's indexed files by kind"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT kind, path FROM files WHERE interaction = ?", (interaction,)).fetchall()
+        return dict(rows)
+    
+    def format_stats(self):
+        """File count and size of the archive"""
+        file_count, total_bytes = self.totals()
+        return f"{file_count} files, {total_bytes / 1024 / 1024:.1f} MB"
+    
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', nargs='?', default="temp", help="Archive directory")
+    parser.add_argument('--last', type=int, default=10, help="Number of recent commands to list")
+    parser.add_argument('--max-files', type=int, default=None, help="Apply a file count limit")
+    parser.add_argument('--max-mb', type=float, default=None, help="Apply a total size limit in MB")
+    args = parser.parse_args()
+    
+    store = RecordingStore(args.directory)
+    print(f"Archive: {store.format_stats()}")
+    if args.max_files is not None or args.max_mb is not None:
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        print(f"Deleted {store.enforce_retention(args.max_files, max_bytes)} files; now {store.format_stats()}")
+    for entry in store.last_commands(args.last):
+        when = datetime.datetime.fromtimestamp(entry['time']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"  {when}  {entry['wake_text']!r} -> {entry['command_text']!r}")
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Cached speech bubble rendering for the avatar window.
+
+A message is word-wrapped and rasterized into a bubble surface once, uploaded
+as a single RGBA texture and then drawn as one textured quad per frame. The
+textures of the most recently shown messages are kept in a small LRU cache
+keyed by text, font and wrap width, so re-showing a message (or showing the
+same one for many frames) costs one draw call and no text layout.
+"""
+from collections import OrderedDict
+
+import moderngl
+import numpy as np
+import pygame
+
+# Number of rasterized bubbles kept as GL textures
+CACHE_SIZE = 8
+
+# Height of the pointer triangle under the bubble
+POINTER_HEIGHT = 10
+
+def wrap_text(text, font, max_width):
+    """
+    Split text into lines no wider than max_width (long single words get a line of their own).
+    
+    Args:
+        text: The message text
+        font: pygame font used to measure the words
+        max_width: Maximum line width in pixels
+    
+    Returns:
+        List of line strings
+    """
+    lines = []
+    current_line = []
+    
+    for word in text.split(' '):
+        test_width, _ = font.size(' '.join(current_line + [word]))
+        
+        if test_width <= max_width:
+            current_line.append(word)
+        elif current_line:
+            lines.append(' '.join(current_line))
+            current_line = [word]
+        else:
+            # The word is too long by itself
+            lines.append(word)
+    
+    # Add the last line
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+def rasterize_bubble(text, font, text_color, bubble_color, max_width, padding, border_radius):
+    """
+    Lay out a message and draw it into a speech bubble surface.
+    
+    Args:
+        text: The message text
+        font: pygame font for the text
+        text_color: RGB text color
+        bubble_color: RGBA bubble background color
+        max_width: Maximum text line width in pixels
+        padding: Padding between the text and the bubble edge
+        border_radius: Corner radius of the bubble
+    
+    Returns:
+        pygame SRCALPHA surface with the bubble and the pointer triangle below it
+    """
+    line_surfaces = [font.render(line, True, text_color) for line in wrap_text(text, font, max_width)]
+    
+    # Calculate bubble size
+    bubble_width = max((surface.get_width() for surface in line_surfaces), default=0) + padding * 2
+    bubble_height = sum(surface.get_height() for surface in line_surfaces) + padding * 2
+    
+    surface = pygame.Surface((bubble_width, bubble_height + POINTER_HEIGHT), pygame.SRCALPHA)
+    pygame.draw.rect(surface, bubble_color, pygame.Rect(0, 0, bubble_width, bubble_height),
+                     border_radius=border_radius)
+    
+    # Draw little triangle pointing to character
+    pygame.draw.polygon(surface, bubble_color, [
+        (bubble_width // 2 - 10, bubble_height),
+        (bubble_width // 2 + 10, bubble_height),
+        (bubble_width // 2, bubble_height + POINTER_HEIGHT)
+    ])
+    
+    # Draw the lines centered in the bubble
+    current_y = padding
+    for line_surface in line_surfaces:
+        surface.blit(line_surface, ((bubble_width - line_surface.get_width()) // 2, current_y))
+        current_y += line_surface.get_height()
+    return surface
+
+class SpeechBubbleRenderer:
+    """
+    Draws speech bubbles as textured quads over the OpenGL scene.
+    """
+    
+    def __init__(self, ctx, text_color=(255, 255, 255), bubble_color=(0, 0, 0, 180),
+                 padding=10, border_radius=10, cache_size=CACHE_SIZE):
+        """
+        Initialize the renderer.
+        
+        Args:
+            ctx: The ModernGL context
+            text_color: RGB text color
+            bubble_color: RGBA bubble background color
+            padding: Padding between the text and the bubble edge
+            border_radius: Corner radius of the bubble
+            cache_size: Number of bubble textures to keep
+        """
+        self.ctx = ctx
+        self.text_color = text_color
+        self.bubble_color = bubble_color
+        self.padding = padding
+        self.border_radius = border_radius
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'uploaded_bytes': 0}
+        
+        self.program = ctx.program(
+            vertex_shader='''
+                #version 330
+                
+                uniform vec4 rect;         // x, y, width, height in pixels (y down)
+                uniform vec2 screen_size;
+                
+                in vec2 in_position;
+                out vec2 v_texcoord;
+                
+                void main() {
+                    vec2 pixel = rect.xy + in_position * rect.zw;
+                    vec2 ndc = pixel / screen_size * 2.0 - 1.0;
+                    // Draw at the near plane so the bubble is always on top of the scene
+                    gl_Position = vec4(ndc.x, -ndc.y, -1.0, 1.0);
+                    v_texcoord = in_position;
+                }
+            ''',
+            fragment_shader='''
+                #version 330
+                
+                uniform sampler2D bubble;
+                
+                in vec2 v_texcoord;
+                out vec4 f_color;
+                
+                void main() {
+                    f_color = texture(bubble, v_texcoord);
+                }
+            '''
+        )
+        
+        # Unit quad as a counter-clockwise triangle strip once flipped to y up
+        quad = np.array([0.0, 1.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0], dtype='f4')
+        self.vbo = ctx.buffer(quad)
+        self.vao = ctx.vertex_array(self.program, [(self.vbo, '2f', 'in_position')])
+    
+    def get_texture(self, text, font, max_width):
+        """
+        Get the bubble texture for a message, rasterizing and uploading it on a cache miss.
+        
+        Returns:
+            The ModernGL texture (rows top first)
+        """
+        key = (text, font, max_width)
+        texture = self.cache.get(key)
+        if texture is not None:
+            self.cache.move_to_end(key)
+            self.stats['hits'] += 1
+            return texture
+        
+        self.stats['misses'] += 1
+        surface = rasterize_bubble(text, font, self.text_color, self.bubble_color,
+                                   max_width, self.padding, self.border_radius)
+        pixels = pygame.image.tobytes(surface, 'RGBA')
+        texture = self.ctx.texture(surface.get_size(), 4, pixels)
+        texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.stats['uploaded_bytes'] += len(pixels)
+        
+        self.cache[key] = texture
+        if len(self.cache) > self.cache_size:
+            _, evicted = self.cache.popitem(last=False)
+            evicted.release()
+        return texture
+    
+    def draw(self, text, font, max_width, pos_x, pos_y, screen_size):
+        """
+        Draw a speech bubble whose pointer tip is at (pos_x, pos_y).
+        
+        Args:
+            text: The message text
+            font: pygame font for the text
+            max_width: Maximum text line width in pixels
+            pos_x: Horizontal center of the bubble in window pixels
+            pos_y: Window pixel row of the pointer tip (y down)
+            screen_size: (width, height) of the window in pixels
+        """
+        texture = self.get_texture(text, font, max_width)
+        width, height = texture.size
+        
+        self.program['rect'].value = (pos_x - width // 2, pos_y - height, width, height)
+        self.program['screen_size'].value = screen_size
+        self.program['bubble'].value = 0
+        texture.use(0)
+        
+        self.ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+    
+    def format_stats(self):
+        """Summarize cache hits and misses and the texture bytes uploaded"""
+        return (f"{self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['uploaded_bytes'] / 1024:.1f} KB uploaded")
+    
+    def release(self):
+        """Release the cached textures and GL objects"""
+        for texture in self.cache.values():
+            texture.release()
+        self.cache.clear()
+        self.vao.release()
+        self.vbo.release()
+        self.program.release()
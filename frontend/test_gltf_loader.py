@@ -0,0 +1,51 @@
+"""
+Tests for the pruning of stale gltf_loader model cache entries.
+
+Usage:
+    python -m pytest test_gltf_loader.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gltf_loader
+
+class PruneModelCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.directory, 'avatar.gltf')
+        with open(self.model_path, 'w') as f:
+            f.write("{}")
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def write_entry(self, stem, key, source_path):
+        base_path = os.path.join(self.directory, f"{stem}-merged-{key}")
+        with open(base_path + '.json', 'w') as f:
+            json.dump({'sources': [[os.path.abspath(source_path), 0, 0]]}, f)
+        with open(base_path + '.bin', 'wb') as f:
+            f.write(b"x")
+        return base_path + '.json'
+    
+    def cache_names(self):
+        return sorted(name for name in os.listdir(self.directory) if name != 'avatar.gltf')
+    
+    def test_removes_stale_entries_of_the_same_model(self):
+        self.write_entry('avatar', 'a' * 16, self.model_path)
+        manifest_path = self.write_entry('avatar', 'b' * 16, self.model_path)
+        gltf_loader._prune_model_cache(self.model_path, self.directory, manifest_path)
+        self.assertEqual(self.cache_names(), [f"avatar-merged-{'b' * 16}.bin", f"avatar-merged-{'b' * 16}.json"])
+    
+    def test_keeps_other_models_with_the_same_prefix(self):
+        self.write_entry('avatar-v2', 'a' * 16, os.path.join(self.directory, 'avatar-v2.gltf'))
+        self.write_entry('avatar', 'c' * 16, os.path.join(self.directory, 'other', 'avatar.gltf'))
+        manifest_path = self.write_entry('avatar', 'b' * 16, self.model_path)
+        gltf_loader._prune_model_cache(self.model_path, self.directory, manifest_path)
+        self.assertEqual(len(self.cache_names()), 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Tests for the retention of recording_store.RecordingStore.
+
+Usage:
+    python -m pytest test_recording_store.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from recording_store import RecordingStore
+
+INTERACTIONS = ["20250101_120000", "20250101_120100", "20250101_120200"]
+KINDS = [('wake', 'wav'), ('command', 'wav'), ('metadata', 'json')]
+
+class EnforceRetentionTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = RecordingStore(self.directory)
+        for interaction in INTERACTIONS:
+            for kind, extension in KINDS:
+                path = os.path.join(self.directory, f"{kind}_{interaction}.{extension}")
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 100)
+                self.store.add_file(interaction, kind, path)
+            self.store.add_interaction(interaction, "hey ava", f"command {interaction}")
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+    
+    def interactions(self):
+        return sorted(entry['interaction'] for entry in self.store.last_commands(len(INTERACTIONS)))
+    
+    def test_removes_interactions_without_files(self):
+        # The first interaction's three files and one of the second's go
+        self.assertEqual(self.store.enforce_retention(max_files=5), 4)
+        self.assertEqual(self.interactions(), INTERACTIONS[1:])
+        self.assertEqual(self.store.files_for(INTERACTIONS[0]), {})
+        self.assertEqual(self.store.totals(), (5, 500))
+    
+    def test_byte_limit_removes_interactions(self):
+        self.assertEqual(self.store.enforce_retention(max_bytes=300), 6)
+        self.assertEqual(self.interactions(), INTERACTIONS[2:])
+    
+    def test_empty_archive_has_no_interactions(self):
+        self.store.enforce_retention(max_files=0)
+        self.assertEqual(self.store.last_commands(), [])
+        self.assertEqual([name for name in os.listdir(self.directory) if not name.startswith("recordings.db")], [])
+
+if __name__ == '__main__':
+    unittest.main()
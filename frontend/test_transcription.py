@@ -0,0 +1,98 @@
+"""
+Tests for the circuit breakers of transcription.TranscriptionDispatcher.
+
+Usage:
+    python -m pytest test_transcription.py
+"""
+import time
+import unittest
+from concurrent.futures import Future
+
+from transcription import CircuitBreaker, TranscriptionDispatcher
+
+class CircuitBreakerTest(unittest.TestCase):
+    
+    def open_breaker(self, reset_timeout):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout)
+        self.assertTrue(breaker.allow_request())
+        self.assertTrue(breaker.record_failure())
+        return breaker
+    
+    def test_released_trial_is_allowed_again(self):
+        breaker = self.open_breaker(reset_timeout=0.0)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, 'half_open')
+        breaker.release_trial()
+        self.assertEqual(breaker.state, 'open')
+        self.assertTrue(breaker.allow_request())
+    
+    def test_lost_trial_expires(self):
+        breaker = self.open_breaker(reset_timeout=0.05)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        # The trial never reports back
+        self.assertFalse(breaker.allow_request())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+    
+    def test_release_keeps_a_closed_breaker_closed(self):
+        breaker = CircuitBreaker()
+        breaker.release_trial()
+        self.assertEqual(breaker.state, 'closed')
+
+class QueueingExecutor:
+    """Executor that runs only the named backends' requests; the others wait in the queue"""
+    
+    def __init__(self, run_names):
+        self.run_names = run_names
+        self.queued = []
+    
+    def submit(self, function, backend, *args):
+        future = Future()
+        if backend['name'] in self.run_names:
+            future.set_result(function(backend, *args))
+        else:
+            self.queued.append(future)
+        return future
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+class CancelledTrialTest(unittest.TestCase):
+    
+    def test_cancelled_trial_reopens_the_breaker(self):
+        failing = [True]
+        
+        def fast(wav_data, audio, filename):
+            return "hello"
+        
+        def flaky(wav_data, audio, filename):
+            if failing[0]:
+                raise RuntimeError("unavailable")
+            return "flaky"
+        
+        dispatcher = TranscriptionDispatcher([('flaky', flaky), ('fast', fast)], mode='parallel',
+                                             failure_threshold=1, reset_timeout=0.0)
+        dispatcher.executor.shutdown()
+        breaker = dispatcher.backends[0]['breaker']
+        
+        # Open the flaky backend's breaker
+        dispatcher.executor = QueueingExecutor({'flaky', 'fast'})
+        self.assertEqual(dispatcher.transcribe(b""), "hello")
+        self.assertEqual(breaker.state, 'open')
+        
+        # The trial request waits in the queue and is cancelled when the fast backend wins
+        dispatcher.executor = QueueingExecutor({'fast'})
+        self.assertEqual(dispatcher.transcribe(b""), "hello")
+        self.assertTrue(dispatcher.executor.queued[0].cancelled())
+        self.assertEqual(breaker.state, 'open')
+        
+        # The next request is the trial again, and its success closes the breaker
+        failing[0] = False
+        dispatcher.executor = QueueingExecutor({'flaky', 'fast'})
+        dispatcher.mode = 'fallback'
+        self.assertEqual(dispatcher.transcribe(b""), "flaky")
+        self.assertEqual(breaker.state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
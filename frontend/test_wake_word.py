@@ -0,0 +1,62 @@
+"""
+Tests for adding templates to wake_word.WakeWordDetector.
+
+Usage:
+    python -m pytest test_wake_word.py
+"""
+import threading
+import unittest
+
+import numpy as np
+
+from wake_word import SAMPLE_RATE, WakeWordDetector
+
+def tone(frequency, seconds=0.6):
+    times = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * frequency * times)).astype(np.float32)
+
+def to_pcm(samples):
+    return (samples * 32767).astype('<i2').tobytes()
+
+class AddTemplateTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.detector = WakeWordDetector(min_templates=2)
+        for frequency in (400, 420, 440):
+            self.assertTrue(self.detector.add_template(tone(frequency), calibrate=False))
+        self.detector.calibrate()
+    
+    def test_detection_keeps_the_previous_threshold_while_calibrating(self):
+        threshold = self.detector.threshold
+        derive_threshold = self.detector._derive_threshold
+        calibrating = threading.Event()
+        finish = threading.Event()
+        
+        def slow_derive_threshold(templates):
+            calibrating.set()
+            finish.wait(5)
+            return derive_threshold(templates)
+        
+        self.detector._derive_threshold = slow_derive_threshold
+        adder = threading.Thread(target=self.detector.add_template, args=(tone(460),))
+        adder.start()
+        self.assertTrue(calibrating.wait(5))
+        
+        accepted, score = self.detector.detect(to_pcm(tone(430)))
+        self.assertEqual(self.detector.threshold, threshold)
+        self.assertEqual(len(self.detector.templates), 3)
+        self.assertEqual(accepted, score <= threshold)
+        
+        finish.set()
+        adder.join(5)
+        self.assertEqual(len(self.detector.templates), 4)
+        self.assertEqual(self.detector.threshold, derive_threshold(list(self.detector.templates)))
+    
+    def test_add_without_calibration_keeps_the_threshold(self):
+        threshold = self.detector.threshold
+        self.detector.add_template(tone(460), calibrate=False)
+        self.assertEqual(self.detector.threshold, threshold)
+        self.assertEqual(len(self.detector.templates), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,347 @@
+"""
+Hedged transcription across several speech-to-text backends.
+
+TranscriptionDispatcher sends a phrase to the preferred backend and, if it
+hasn't answered within its usual latency (a percentile of its recent
+response times), also to the next one. The first non-empty transcript
+wins and requests that haven't started yet are cancelled; requests already
+in flight can't be aborted and finish in the background, still feeding
+their backend's latency and health stats. A backend that fails repeatedly
+is skipped by its circuit breaker, which lets a single trial request
+through after a cool-down (half-open) and closes again when it succeeds.
+A backend that heard no speech doesn't start the next one, so silent
+phrases cost one request (see RETRY_NO_SPEECH).
+
+The Groq backend talks to an OpenAI-compatible transcription endpoint whose
+base URL can be pointed at a local stand-in server (GROQ_API_BASE, see
+mock_transcription_server.py).
+"""
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+
+GROQ_API_BASE = os.environ.get('GROQ_API_BASE', "https://api.groq.com/openai/v1")
+GROQ_MODEL = "distil-whisper-large-v3-en"
+
+# Upload content type by filename extension
+CONTENT_TYPES = {'wav': "audio/wav", 'flac': "audio/flac", 'ogg': "audio/ogg", 'mp3': "audio/mpeg"}
+
+# Dispatch modes: wait for a failure before trying the next backend, start
+# the next one when the current one is slower than usual, or ask all at once
+MODES = ('fallback', 'hedge', 'parallel')
+DEFAULT_MODE = 'hedge'
+
+# Hedge once the backend is slower than this percentile of its recent
+# latencies; until enough latencies are known a fixed delay is used
+HEDGE_PERCENTILE = 90
+HEDGE_MIN_SAMPLES = 5
+DEFAULT_HEDGE_DELAY = 1.0
+MIN_HEDGE_DELAY = 0.1
+LATENCY_WINDOW = 100
+
+# Circuit breaker settings
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 30.0
+
+# Whether a backend hearing no speech sends the phrase to the next backend.
+# Silent and noise-only phrases are common, so by default the answer is final
+RETRY_NO_SPEECH = False
+
+class TranscriptionError(Exception):
+    """Raised when no backend could be asked or every backend failed"""
+
+def transcribe_with_groq(wav_data, api_key, filename="audio.wav", base_url=None, timeout=5, session=None):
+    """
+    Transcribe an in-memory audio file with Groq's Whisper endpoint.
+    
+    Args:
+        wav_data: Audio file bytes (WAV, or FLAC/Ogg from audio_encoding)
+        api_key: Groq API key
+        filename: Upload filename (tells the API the format)
+        base_url: OpenAI-compatible API base URL (default GROQ_API_BASE)
+        timeout: Request timeout in seconds
+        session: Optional requests.Session to send the request with
+    
+    Returns:
+        The transcript text
+    
+    Raises:
+        Exception: On HTTP errors and timeouts
+    """
+    content_type = CONTENT_TYPES.get(os.path.splitext(filename)[1].lstrip('.').lower(), "application/octet-stream")
+    files = {"file": (filename, io.BytesIO(wav_data), content_type)}
+    data = {
+        "model": GROQ_MODEL,
+        "language": "en"
+    }
+    response = (session or requests).post(
+        f"{base_url or GROQ_API_BASE}/audio/transcriptions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        files=files,
+        data=data,
+        timeout=timeout
+    )
+    if response.status_code != 200:
+        raise Exception(f"API error {response.status_code}: {response.text[:100]}")
+    return response.json()["text"]
+
+class CircuitBreaker:
+    """
+    Stops requests to a failing backend and probes it again after a cool-down.
+    
+    States are 'closed' (requests allowed), 'open' (requests skipped until
+    reset_timeout has passed) and 'half_open' (one trial request in flight;
+    its outcome closes or re-opens the breaker). A trial that is cancelled
+    before it runs gives its slot back with release_trial(), and one that
+    never reports back expires after reset_timeout, so the breaker can't
+    stay half-open for good.
+    """
+    
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        """
+        Initialize the breaker in the closed state.
+        
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds before an open breaker allows a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_at = 0.0
+        self.lock = threading.Lock()
+    
+    def allow_request(self):
+        """Whether a request may be sent now (claims the trial slot when half-open)"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_at = now
+                return True
+            if self.state == 'half_open' and now - self.trial_at >= self.reset_timeout:
+                # The trial never reported back; allow another one
+                self.trial_at = now
+                return True
+            return False
+    
+    def release_trial(self):
+        """Give back the trial slot of a request that was never sent (re-opens a half-open breaker)"""
+        with self.lock:
+            if self.state == 'half_open':
+                # Keep opened_at, so the next request is allowed as the trial right away
+                self.state = 'open'
+    
+    def record_success(self):
+        """Close the breaker after a successful request"""
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+    
+    def record_failure(self):
+        """
+        Count a failed request.
+        
+        Returns:
+            True if this failure opened the breaker
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+class TranscriptionDispatcher:
+    """
+    Sends phrases to transcription backends in preference order with hedging.
+    
+    Backends are callables taking (wav_data, audio, filename) and returning
+    the transcript. Exceptions listed in no_speech_errors mean the backend
+    worked but heard no speech; they don't count against its breaker and are
+    re-raised if no backend produced text. Unless retry_no_speech is set, no
+    further backend is started (by fallback or hedging) after one heard no
+    speech; backends already running are still waited for.
+    """
+    
+    def __init__(self, backends, mode=DEFAULT_MODE, no_speech_errors=(),
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, retry_no_speech=RETRY_NO_SPEECH):
+        """
+        Initialize the dispatcher.
+        
+        Args:
+            backends: List of (name, transcribe) pairs, most preferred first
+            mode: One of MODES
+            no_speech_errors: Exception types meaning "no speech recognized"
+            failure_threshold: Consecutive failures that open a backend's breaker
+            reset_timeout: Seconds before a failing backend is tried again
+            retry_no_speech: Ask the next backend when one heard no speech
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown dispatch mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.no_speech_errors = tuple(no_speech_errors)
+        self.retry_no_speech = retry_no_speech
+        self.backends = [
+            {
+                'name': name,
+                'transcribe': transcribe,
+                'breaker': CircuitBreaker(failure_threshold, reset_timeout),
+                'latencies': deque(maxlen=LATENCY_WINDOW),
+                'stats': {'requests': 0, 'successes': 0, 'failures': 0, 'wins': 0, 'breaker_opens': 0}
+            }
+            for name, transcribe in backends
+        ]
+        self.executor = ThreadPoolExecutor(max_workers=max(2, len(self.backends) * 2),
+                                           thread_name_prefix="transcription")
+        self.last_backend = None
+        self.stats = {'requests': 0, 'hedges': 0, 'no_speech': 0, 'errors': 0}
+    
+    def hedge_delay(self, backend):
+        """Seconds to wait for a backend before asking the next one"""
+        latencies = backend['latencies']
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, float(np.percentile(latencies, HEDGE_PERCENTILE)))
+    
+    def _call(self, backend, wav_data, audio, filename):
+        """Run one backend request and record its latency and outcome"""
+        stats = backend['stats']
+        stats['requests'] += 1
+        start_time = time.perf_counter()
+        try:
+            text = backend['transcribe'](wav_data, audio, filename)
+        except self.no_speech_errors as e:
+            backend['latencies'].append(time.perf_counter() - start_time)
+            backend['breaker'].record_success()
+            stats['successes'] += 1
+            return 'no_speech', e
+        except Exception as e:
+            stats['failures'] += 1
+            if backend['breaker'].record_failure():
+                stats['breaker_opens'] += 1
+                print(f"Transcription backend {backend['name']} failing ({e}); "
+                      f"skipping it for {backend['breaker'].reset_timeout:.0f}s")
+            return 'error', e
+        
+        backend['latencies'].append(time.perf_counter() - start_time)
+        backend['breaker'].record_success()
+        stats['successes'] += 1
+        if not text or not text.strip():
+            return 'no_speech', None
+        return 'text', text
+    
+    def transcribe(self, wav_data, audio=None, filename="audio.wav"):
+        """
+        Transcribe a phrase with the first backend that answers.
+        
+        Args:
+            wav_data: WAV file bytes
+            audio: Optional backend-specific audio object (e.g. sr.AudioData)
+            filename: Upload filename for HTTP backends
+        
+        Returns:
+            The transcript text
+        
+        Raises:
+            One of no_speech_errors if the backends heard no speech
+            TranscriptionError if no backend was available or all failed
+        """
+        self.stats['requests'] += 1
+        waiting = list(self.backends)
+        pending = {}
+        
+        def launch_next():
+            # Start the next backend whose breaker allows a request
+            while waiting:
+                backend = waiting.pop(0)
+                if backend['breaker'].allow_request():
+                    pending[self.executor.submit(self._call, backend, wav_data, audio, filename)] = backend
+                    return backend
+            return None
+        
+        current = launch_next()
+        if self.mode == 'parallel':
+            while launch_next():
+                pass
+        if current is None:
+            self.stats['errors'] += 1
+            raise TranscriptionError("All transcription backends are unavailable")
+        
+        no_speech = None
+        heard_nothing = False
+        errors = []
+        while pending:
+            timeout = self.hedge_delay(current) if self.mode == 'hedge' and waiting else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            if not done:
+                # The backend is slower than usual: ask the next one as well
+                hedge = launch_next()
+                if hedge is not None:
+                    self.stats['hedges'] += 1
+                    current = hedge
+                continue
+            
+            for future in done:
+                backend = pending.pop(future)
+                outcome, result = future.result()
+                if outcome == 'text':
+                    for other, other_backend in pending.items():
+                        # A cancelled request never reports to its breaker
+                        if other.cancel():
+                            other_backend['breaker'].release_trial()
+                    backend['stats']['wins'] += 1
+                    self.last_backend = backend['name']
+                    return result
+                if outcome == 'no_speech':
+                    heard_nothing = True
+                    no_speech = no_speech or result
+                else:
+                    errors.append(f"{backend['name']}: {result}")
+            
+            # Once a backend heard nothing, don't pay for another one
+            if heard_nothing and not self.retry_no_speech:
+                waiting.clear()
+            
+            # Fall back right away when nothing else is still running
+            if not pending:
+                current = launch_next() or current
+        
+        if heard_nothing:
+            self.stats['no_speech'] += 1
+            if no_speech is not None:
+                raise no_speech
+            if self.no_speech_errors:
+                raise self.no_speech_errors[0]()
+            raise TranscriptionError("No speech recognized")
+        self.stats['errors'] += 1
+        raise TranscriptionError("; ".join(errors) or "All transcription backends are unavailable")
+    
+    def format_stats(self):
+        """Summarize hedging and each backend's latency, wins and breaker state"""
+        lines = [f"{self.stats['requests']} phrases ({self.mode}), {self.stats['hedges']} hedged, "
+                 f"{self.stats['no_speech']} no speech, {self.stats['errors']} failed"]
+        for backend in self.backends:
+            stats = backend['stats']
+            latencies = np.array(backend['latencies']) * 1000
+            latency = (f"p50 {np.percentile(latencies, 50):.0f} ms, p95 {np.percentile(latencies, 95):.0f} ms"
+                       if len(latencies) else "no latencies")
+            lines.append(f"{backend['name']}: {stats['wins']} wins, {stats['requests']} requests, "
+                         f"{stats['failures']} failures, {latency}, breaker {backend['breaker'].state}")
+        return "; ".join(lines)
+    
+    def close(self):
+        """Stop the worker threads (requests in flight still finish)"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,149 @@
+"""
+Frame-by-frame voice activity detection with an adaptive noise floor.
+
+Replaces the blocking ambient noise calibration of speech_recognition:
+the noise floor is tracked continuously from the frames that aren't
+speech, so the detector works from the first frame and follows changes in
+the room without pausing to recalibrate. Frame energies of a whole audio
+block are computed at once with NumPy; only the small per-frame state
+machine (onset, hangover, noise tracking) runs in Python.
+"""
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.01
+
+# A frame is voiced when it is this far above the noise floor and above
+# an absolute floor (dB relative to full scale 16-bit samples)
+SNR_DB = 9.0
+MIN_SPEECH_DB = 20.0
+
+# Consecutive voiced frames needed to start speech (rejects clicks) and
+# unvoiced time that ends it
+ONSET_FRAMES = 3
+HANGOVER_SECONDS = 0.5
+
+# Noise floor smoothing per frame: falls quickly so it can't get stuck high,
+# rises slowly so soft speech doesn't pull it up. Non-speech frames in the
+# first WARMUP_SECONDS adapt faster in both directions.
+NOISE_FALL = 0.2
+NOISE_RISE = 0.01
+WARMUP_SECONDS = 0.5
+WARMUP_RATE = 0.3
+
+# Speech always dips towards the noise floor between words. If no frame
+# came close for this long, the background got louder: the floor jumps to
+# the quietest recent frame
+NOISE_RESET_SECONDS = 2.0
+
+class VoiceActivityDetector:
+    """
+    Decides for every 10 ms frame whether speech is in progress.
+    
+    Speech starts after ONSET_FRAMES consecutive voiced frames (backdated to
+    the first of them) and ends once hangover_seconds pass without a voiced
+    frame.
+    """
+    
+    def __init__(self, rate=SAMPLE_RATE, hangover_seconds=HANGOVER_SECONDS, snr_db=SNR_DB,
+                 onset_frames=ONSET_FRAMES, min_speech_db=MIN_SPEECH_DB):
+        """
+        Initialize the detector.
+        
+        Args:
+            rate: Sample rate in Hz
+            hangover_seconds: Unvoiced time that ends speech
+            snr_db: Margin above the noise floor for a voiced frame
+            onset_frames: Consecutive voiced frames that start speech
+            min_speech_db: Frames quieter than this are never voiced
+        """
+        self.frame_length = int(rate * FRAME_SECONDS)
+        self.hangover_frames = max(1, int(round(hangover_seconds / FRAME_SECONDS)))
+        self.warmup_frames = int(round(WARMUP_SECONDS / FRAME_SECONDS))
+        self.recent_energies = np.zeros(int(round(NOISE_RESET_SECONDS / FRAME_SECONDS)), dtype=np.float32)
+        self.snr_db = snr_db
+        self.onset_frames = onset_frames
+        self.min_speech_db = min_speech_db
+        
+        self.noise_db = None
+        self.in_speech = False
+        self._frames = 0
+        self._voiced_run = 0
+        self._unvoiced_run = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+    
+    def frame_energies(self, samples):
+        """
+        Energies of consecutive frames in dB relative to 16-bit full scale.
+        
+        Args:
+            samples: 1-D int16 array whose length is a multiple of the frame length
+        
+        Returns:
+            1-D float32 array with one energy per frame
+        """
+        frames = samples.reshape(-1, self.frame_length).astype(np.float32)
+        power = np.mean(frames * frames, axis=1)
+        return 10.0 * np.log10(power + 1.0)
+    
+    def process(self, block):
+        """
+        Run the detector over a block of samples.
+        
+        Samples that don't fill a whole frame are kept for the next block.
+        
+        Args:
+            block: 1-D int16 array
+        
+        Returns:
+            List of (offset, event) tuples, where event is 'start' or 'end'
+            and offset is the sample offset into this block where speech
+            started or the hangover ran out (negative when a start is
+            backdated into earlier blocks)
+        """
+        samples = np.concatenate([self._remainder, block]) if len(self._remainder) else block
+        usable = len(samples) - len(samples) % self.frame_length
+        self._remainder = samples[usable:].copy()
+        # Offsets are relative to the block, which starts after the leftover samples
+        base = -(len(samples) - len(block))
+        
+        events = []
+        for index, energy in enumerate(self.frame_energies(samples[:usable])):
+            energy = float(energy)
+            if self.noise_db is None:
+                self.noise_db = energy
+            
+            voiced = energy > max(self.noise_db + self.snr_db, self.min_speech_db)
+            frame_end = base + (index + 1) * self.frame_length
+            
+            if voiced:
+                self._voiced_run += 1
+                self._unvoiced_run = 0
+                if not self.in_speech and self._voiced_run >= self.onset_frames:
+                    self.in_speech = True
+                    events.append((frame_end - self._voiced_run * self.frame_length, 'start'))
+            else:
+                self._voiced_run = 0
+                self._unvoiced_run += 1
+                if self.in_speech and self._unvoiced_run >= self.hangover_frames:
+                    self.in_speech = False
+                    events.append((frame_end, 'end'))
+            
+            # Track the noise floor on non-speech frames; during speech only
+            # follow a lasting rise in background noise, so it can't keep
+            # speech going forever
+            self.recent_energies[self._frames % len(self.recent_energies)] = energy
+            if self.in_speech or voiced:
+                rate = 0.0
+                if self._voiced_run >= len(self.recent_energies):
+                    quietest = float(self.recent_energies.min())
+                    if quietest > self.noise_db + self.snr_db:
+                        self.noise_db = quietest
+            elif self._frames < self.warmup_frames:
+                rate = WARMUP_RATE
+            else:
+                rate = NOISE_RISE if energy > self.noise_db else NOISE_FALL
+            self.noise_db += (energy - self.noise_db) * rate
+            self._frames += 1
+        
+        return events
@@ -1,3 +1,4 @@
+import io
 import os
 import time
 import threading
@@ -7,7 +8,7 @@ import numpy as np
 from collections import deque
 import datetime
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
 
 # Try to import dotenv
 try:
@@ -47,12 +48,30 @@ except ImportError:
     print("Try installing it with: pip install pydub")
     MP3_AVAILABLE = False
 
+from archive_worker import ArchiveWorker
+from audio_capture import AudioCapture
+from audio_encoding import DEFAULT_ENCODING, UploadEncoder
+from recording_store import RecordingStore
+from http_client import format_connection_stats, get_session, json_headers
+from transcription import (DEFAULT_MODE, GROQ_API_BASE, TranscriptionDispatcher, TranscriptionError,
+                           transcribe_with_groq)
+from wake_phrase import WakePhraseMatcher
+from wake_word import WakeWordDetector, pcm_to_float
+
+def interaction_key(timestamp):
+    """Idempotency key of the interaction recorded at timestamp"""
+    return f"interaction-{timestamp}"
+
 class VoiceRecognizer:
-    def __init__(self, wake_words=None, temp_dir="temp", callback=None):
+    def __init__(self, wake_words=None, temp_dir="temp", callback=None, archive_recordings=True,
+                 local_wake_word=True, transcription_mode=DEFAULT_MODE, upload_encoding=DEFAULT_ENCODING):
         # Create temp directory if it doesn't exist
         self.temp_dir = temp_dir
         os.makedirs(self.temp_dir, exist_ok=True)
         
+        # Captured audio stays in memory; it is only written to temp_dir when archiving
+        self.archive_recordings = archive_recordings
+        
         # Check if required libraries are available
         if not VOICE_RECOGNITION_AVAILABLE:
             print("Voice recognition is disabled due to missing libraries.")
@@ -78,9 +97,13 @@ class VoiceRecognizer:
         self.CHUNK = 1024  # Buffer size
         self.FORMAT = np.int16  # 16-bit audio
         
-        # Customize wake words with additional variations for better detection
+        # Wake phrases are matched fuzzily (greeting variants, misspellings like
+        # "eva", filler words) by a matcher compiled once
         self.base_wake_words = wake_words or ["hi ava", "hey ava"]
-        self.wake_words = self._expand_wake_words(self.base_wake_words)
+        self.wake_matcher = WakePhraseMatcher(self.base_wake_words)
+        print(f"Using wake words: {[' '.join(phrase) for phrase in self.wake_matcher.phrases]}")
+        # Words after the wake phrase that count as the command, without listening again
+        self.min_inline_command_words = 2
         self.callback = callback
         
         # Recording state
@@ -90,6 +113,7 @@ class VoiceRecognizer:
         self.recording_thread = None
         self.detection_thread = None
         self.current_recording = []
+        self.audio_capture = None
         
         # Improve Alexa-like behavior with continuous listening
         self.continuous_listening = True
@@ -98,44 +122,53 @@ class VoiceRecognizer:
         
         # File management settings
         self.max_recordings = 100  # Maximum number of recordings to keep
-        self.cleanup_interval = 3600  # Clean up old files every hour (in seconds)
-        self.last_cleanup_time = time.time()
+        self.max_archive_bytes = 200 * 1024 * 1024  # Maximum total size of the recordings
+        # Index of the archived files; retention is checked after every save
+        self.recording_store = RecordingStore(self.temp_dir)
+        # (idempotency key, command text) of the latest interaction; every request
+        # the interaction makes to the backend carries the key, so they run once
+        self.last_interaction = (None, None)
         
-        # Create recognizer with optimized settings
+        # Create recognizer for the Google fallback; endpointing is done by AudioCapture
         self.recognizer = sr.Recognizer()
-        # Lower energy threshold for better sensitivity
-        self.recognizer.energy_threshold = 250  
-        self.recognizer.dynamic_energy_threshold = True
         # More aggressive settings for faster response
-        self.recognizer.pause_threshold = 0.5
-        # Adjust non-speaking duration for better phrase detection
-        self.recognizer.non_speaking_duration = 0.3
-        # Increase phrase threshold for better detection
-        self.recognizer.phrase_threshold = 0.3
+        self.pause_threshold = 0.5
+        # Minimum speech length for a phrase
+        self.phrase_threshold = 0.3
         
-        # Run initial cleanup of old files
-        self._cleanup_old_files()
+        # Groq first (if the key works) with Google hedged behind it; each
+        # backend has a circuit breaker instead of a permanent switch
+        backends = []
+        if self.use_groq:
+            # Uploads are trimmed and compressed (FLAC by default) instead of raw WAV
+            self.upload_encoder = UploadEncoder(upload_encoding, rate=self.RATE)
+            backends.append(('groq', lambda wav_data, audio, filename: self._transcribe_with_groq(audio, filename)))
+        backends.append(('google', lambda wav_data, audio, filename: self.recognizer.recognize_google(audio)))
+        self.transcriber = TranscriptionDispatcher(backends, mode=transcription_mode,
+                                                   no_speech_errors=(sr.UnknownValueError,))
+        
+        # MP3 conversion and metadata files run on a background worker so the
+        # listening thread never waits for ffmpeg or the disk
+        self.archive_worker = ArchiveWorker()
+        # Commands are sent to the backend on their own thread: archive jobs
+        # can be dropped when the queue is full, commands must not be
+        self.command_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command-sender")
         
-    def _expand_wake_words(self, base_words):
-        """Expand wake words with common variations to improve detection"""
-        expanded = []
-        for word in base_words:
-            expanded.append(word)
-            # Add common variations and misspellings
-            if "ava" in word:
-                expanded.append(word.replace("ava", "eva"))
-                expanded.append(word.replace("ava", "ava please"))
-                expanded.append(word.replace("ava", "ava can you"))
-            if "hi" in word:
-                expanded.append(word.replace("hi", "hey"))
-                expanded.append(word.replace("hi", "hello"))
-            if "hey" in word:
-                expanded.append(word.replace("hey", "hi"))
-                expanded.append(word.replace("hey", "hello"))
-                expanded.append(word.replace("hey", "hay"))
+        # Run initial cleanup of old files
+        if self.archive_recordings:
+            self.archive_worker.submit('cleanup', self._cleanup_old_files)
         
-        print(f"Using wake words: {expanded}")
-        return expanded
+        # Local first-stage wake word check, trained from the archived wake recordings
+        self.wake_word_detector = None
+        if local_wake_word:
+            self.wake_word_detector = WakeWordDetector()
+            template_count = self.wake_word_detector.load_templates(self.temp_dir)
+            if self.wake_word_detector.ready:
+                print(f"Local wake word detector loaded {template_count} templates "
+                      f"(threshold {self.wake_word_detector.threshold:.2f})")
+            else:
+                print(f"Local wake word detector has {template_count} templates; "
+                      f"sending all phrases for transcription until it has {self.wake_word_detector.min_templates}")
         
     def start_listening(self):
         """Start listening for the wake words in the background"""
@@ -148,6 +181,8 @@ class VoiceRecognizer:
             
         # Start listening thread
         try:
+            if not self.archive_worker.thread.is_alive():
+                self.archive_worker = ArchiveWorker()
             self.is_listening = True
             self.detection_thread = threading.Thread(target=self._listen_and_detect, daemon=True)
             self.detection_thread.start()
@@ -164,205 +199,175 @@ class VoiceRecognizer:
         self.is_listening = False
         if self.detection_thread:
             self.detection_thread.join(timeout=1.0)
+        
+        if self.wake_word_detector:
+            print(f"Local wake word detector: {self.wake_word_detector.format_stats()}")
+        
+        # Let queued recordings finish archiving
+        self.archive_worker.close()
+        print(f"Archive worker: {self.archive_worker.format_stats()}")
             
     def _listen_and_detect(self):
         """Background thread that listens for wake words using microphone"""
         try:
             # Get list of available microphones to help with troubleshooting
             print("Available microphones:")
-            for i, mic_name in enumerate(sr.Microphone.list_microphone_names()):
-                print(f"  {i}: {mic_name}")
+            for i, device in enumerate(sd.query_devices()):
+                if device['max_input_channels'] > 0:
+                    print(f"  {i}: {device['name']}")
                 
-            # Setup microphone with default device
-            with sr.Microphone(sample_rate=self.RATE) as source:
-                # Initial calibration
-                print("Calibrating microphone for ambient noise (please be quiet)...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=2)
-                print("Microphone calibrated, listening for wake words...")
-                
-                # Periodically recalibrate to adjust to changing environments
-                last_calibration = time.time()
-                calibration_interval = 300  # recalibrate every 5 minutes
-                
-                # For Groq API error tracking
-                groq_errors_count = 0
-                max_groq_errors = 3  # After this many errors, fall back to Google permanently
+            # Capture the default microphone continuously into a ring buffer;
+            # phrases are cut by the capture thread as they are spoken
+            # The VAD tracks the noise floor continuously, so there is no
+            # calibration pause before listening or every few minutes
+            capture = AudioCapture(rate=self.RATE, pause_seconds=self.pause_threshold,
+                                   min_speech_seconds=self.phrase_threshold)
+            self.audio_capture = capture
+            capture.start()
+            try:
+                print("Microphone open, listening for wake words...")
                 
                 while self.is_listening:
-                    # Periodic recalibration
-                    current_time = time.time()
-                    if current_time - last_calibration > calibration_interval:
-                        print("Recalibrating microphone...")
-                        self.recognizer.adjust_for_ambient_noise(source, duration=1)
-                        last_calibration = current_time
-                        print("Recalibration complete")
-                        
-                    # Periodically clean up old files
-                    if current_time - self.last_cleanup_time > self.cleanup_interval:
-                        self._cleanup_old_files()
-                        self.last_cleanup_time = current_time
-                    
                     try:
-                        # Listen for phrases with a shorter timeout and phrase time limit
-                        # This makes it more responsive, like Alexa
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
+                        # Take the next phrase cut by the capture thread, waiting briefly
+                        # so the loop can notice stop_listening
+                        segment = capture.next_segment(timeout=1)
+                        if segment is None:
+                            continue
+                        pcm_data = capture.get_pcm(segment)
+                        audio = sr.AudioData(pcm_data, self.RATE, 2)
+                        
+                        # Only phrases that sound like the wake word leave the machine
+                        if self.wake_word_detector:
+                            accepted, _ = self.wake_word_detector.detect(pcm_data)
+                            if not accepted:
+                                continue
                         
-                        # Save the audio to a temporary file for Groq transcription
-                        temp_audio_path = os.path.join(self.temp_dir, "temp_listen.wav")
-                        with open(temp_audio_path, "wb") as f:
-                            f.write(audio.get_wav_data())
+                        # WAV bytes for the archive; Groq gets its own compressed upload
+                        wav_data = audio.get_wav_data()
                         
-                        # Try to recognize speech with Groq Whisper or fall back to Google
+                        # Try to recognize speech with Groq Whisper, hedged with Google
                         try:
-                            if self.use_groq and groq_errors_count < max_groq_errors:
-                                try:
-                                    text = self._transcribe_with_groq(temp_audio_path).lower()
-                                except Exception as e:
-                                    # Count Groq errors
-                                    groq_errors_count += 1
-                                    if groq_errors_count >= max_groq_errors:
-                                        print(f"Too many Groq API errors ({groq_errors_count}). Permanently falling back to Google Speech Recognition.")
-                                        self.use_groq = False
-                                    # Fall back to Google for this attempt
-                                    text = self.recognizer.recognize_google(audio).lower()
-                            else:
-                                text = self.recognizer.recognize_google(audio).lower()
+                            text = self.transcriber.transcribe(wav_data, audio, "listen.wav").lower()
                             
                             # Only print if it's not just background noise
                             if len(text) > 2:  # Filter out very short recognitions
                                 print(f"Detected: {text}")
                             
-                            # Check for wake words with more flexibility
-                            detected = False
-                            detected_word = None
-                            
-                            # Check exact matches first (faster)
-                            for wake_word in self.wake_words:
-                                if wake_word in text:
-                                    detected = True
-                                    detected_word = wake_word
-                                    break
-                            
-                            # If not found, try partial matching for more flexibility
-                            if not detected:
-                                # For wake words with multiple parts (e.g., "hey ava")
-                                for wake_word in self.base_wake_words:
-                                    parts = wake_word.split()
-                                    if len(parts) > 1 and all(part in text for part in parts):
-                                        detected = True
-                                        detected_word = wake_word
-                                        break
+                            # Find the wake phrase and where it ends in the transcript
+                            wake_match = self.wake_matcher.match(text)
                             
                             # Check cooldown period before activation
-                            if detected and (time.time() - self.last_activation_time) > self.cooldown_period:
-                                print(f"Wake word detected: {detected_word} in '{text}'")
+                            if wake_match and (time.time() - self.last_activation_time) > self.cooldown_period:
+                                print(f"Wake word detected: {wake_match['wake_word']} in '{text}' "
+                                      f"(confidence {wake_match['confidence']:.2f})")
+                                
+                                # Confirmed wake words become templates for the local detector;
+                                # recalibrating is O(templates²) DTW matches, so it runs on the
+                                # archive worker and detection keeps the old threshold meanwhile
+                                if self.wake_word_detector:
+                                    self.archive_worker.submit('wake_template', self.wake_word_detector.add_template,
+                                                               pcm_to_float(pcm_data))
+                                
+                                # A command said in the same phrase ("hey ava, what's the time")
+                                # is used right away instead of listening for another one
+                                inline_command = None
+                                if len(wake_match['command'].split()) >= self.min_inline_command_words:
+                                    inline_command = wake_match['command']
                                 
                                 # Save the audio and any following speech
-                                self._save_audio_and_listen_for_command(audio, text, source, temp_audio_path)
+                                self._save_audio_and_listen_for_command(audio, text, capture, wav_data, segment[1],
+                                                                        inline_command)
                                 
                                 # Update last activation time
                                 self.last_activation_time = time.time()
-                            else:
-                                # Clean up temp file if not used
-                                if os.path.exists(temp_audio_path):
-                                    os.remove(temp_audio_path)
                             
                         except sr.UnknownValueError:
-                            # Clean up temp file
-                            if os.path.exists(temp_audio_path):
-                                os.remove(temp_audio_path)
                             pass  # Speech was not understood
-                        except sr.RequestError as e:
-                            # Clean up temp file
-                            if os.path.exists(temp_audio_path):
-                                os.remove(temp_audio_path)
+                        except (sr.RequestError, TranscriptionError) as e:
                             print(f"Could not request results from speech recognition service: {e}")
-                    except sr.WaitTimeoutError:
-                        pass  # Timeout is normal, just continue listening
                     except Exception as e:
-                        if "IOError" in str(e) and "Input overflowed" in str(e):
-                            # Common PyAudio buffer overrun, just continue
-                            pass
-                        else:
-                            print(f"Error during listening: {e}")
-                    
-                    # Brief pause to prevent high CPU usage
-                    time.sleep(0.05)
+                        print(f"Error during listening: {e}")
+            finally:
+                capture.stop()
+                print(f"Audio capture: {capture.format_stats()}")
+                print(f"Transcription: {self.transcriber.format_stats()}")
+                if self.use_groq:
+                    print(f"Upload encoding: {self.upload_encoder.format_stats()}")
+                print(f"HTTP connections: {format_connection_stats()}")
         except Exception as e:
             print(f"Fatal error in speech recognition thread: {e}")
             self.is_listening = False
     
-    def _transcribe_with_groq(self, audio_file):
-        """Transcribe audio using Groq's Whisper model via direct API access"""
+    def _transcribe_with_groq(self, audio, filename="audio.wav"):
+        """Transcribe a phrase using Groq's Whisper model via direct API access"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.groq_api_key}",
-            }
-            
-            with open(audio_file, "rb") as file:
-                files = {"file": (os.path.basename(audio_file), file, "audio/wav")}
-                data = {
-                    "model": "distil-whisper-large-v3-en",
-                    "language": "en"
-                }
-                
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/audio/transcriptions",
-                    headers=headers,
-                    files=files,
-                    data=data,
-                    timeout=5  # Add timeout to prevent hanging
-                )
-                
-                if response.status_code == 200:
-                    return response.json()["text"]
-                else:
-                    print(f"Groq API error ({response.status_code}): {response.text[:100]}...")
-                    raise Exception(f"API error: {response.status_code}")
-                    
+            # Upload the trimmed, compressed phrase straight from memory; the
+            # filename tells the API the format
+            upload_data, filename = self.upload_encoder.encode(audio.get_raw_data(), filename)
+            return transcribe_with_groq(upload_data, self.groq_api_key, filename,
+                                        timeout=5, session=get_session())  # Reuse the pooled connection
         except Exception as e:
             print(f"Error with Groq transcription: {e}")
-            # Fall back to Google - but note that this is handled in the calling function
+            # Fall back to Google - but note that this is handled by the dispatcher
             raise
             
-    def _save_audio_and_listen_for_command(self, wake_word_audio, wake_word_text, source, temp_audio_path=None):
-        """Save the wake word audio and listen for a follow-up command (like Alexa)"""
+    def _save_audio_and_listen_for_command(self, wake_word_audio, wake_word_text, capture, wake_word_wav=None,
+                                           wake_word_end=None, inline_command=None):
+        """Save the wake word audio and take the follow-up command from the capture (like Alexa),
+        or use the command that was said together with the wake word"""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # First save the wake word audio
-        wake_word_filename = self._save_audio(wake_word_audio, f"wake_{timestamp}", temp_audio_path)
+        # Queue the wake word audio for archiving; the saved filenames are
+        # collected in 'saved' for the interaction's metadata
+        saved = {}
+        self._archive_audio(wake_word_audio, 'wake', timestamp, wake_word_wav, saved)
         
         # Activate VTuber
         if self.callback:
             self.callback(True)  # Activate callback
         
+        if inline_command:
+            print(f"Command detected: {inline_command}")
+            self.last_interaction = (interaction_key(timestamp), inline_command)
+            self._archive_metadata(timestamp, wake_word_text, inline_command, saved)
+            if self.callback:
+                # The confirmation flow of the main application takes over
+                self.callback(True, inline_command)
+            return
+        
         try:
             # Now listen for the command (what comes after "Hey Ava")
             print("Listening for command...")
             
+            # The command is cut from audio captured since the wake phrase ended,
+            # so anything said while the wake word was transcribed is kept.
             # Use a longer timeout for command to give user more time to start speaking
-            command_audio = self.recognizer.listen(source, timeout=5.0, phrase_time_limit=7)
+            if wake_word_end is None:
+                wake_word_end = capture.position
+            command_segment = capture.next_segment(timeout=5.0, after=wake_word_end)
+            if command_segment is None:
+                raise sr.WaitTimeoutError("listening timed out while waiting for command to start")
             
-            try:
-                # Save the command audio to temporary file for Groq
-                temp_command_path = os.path.join(self.temp_dir, "temp_command.wav")
-                with open(temp_command_path, "wb") as f:
-                    f.write(command_audio.get_wav_data())
+            ready_for = time.perf_counter() - command_segment[2]
+            if ready_for > 0.01:
+                print(f"Command was already captured {ready_for:.2f}s before it was needed")
+            command_audio = sr.AudioData(capture.get_pcm(command_segment), self.RATE, 2)
+            
+            # WAV bytes for archiving the command
+            command_wav = command_audio.get_wav_data()
                 
+            try:
                 # Try to recognize the command with Groq or fallback
-                if self.use_groq:
-                    command_text = self._transcribe_with_groq(temp_command_path).lower()
-                else:
-                    command_text = self.recognizer.recognize_google(command_audio).lower()
+                command_text = self.transcriber.transcribe(command_wav, command_audio, "command.wav").lower()
                 
                 print(f"Command detected: {command_text}")
+                self.last_interaction = (interaction_key(timestamp), command_text)
                 
-                # Save the command audio
-                command_filename = self._save_audio(command_audio, f"command_{timestamp}", temp_command_path)
-                
-                # Save metadata about the interaction
-                self._save_metadata(timestamp, wake_word_text, command_text, 
-                                   wake_word_filename, command_filename)
+                # Queue the command audio and the interaction metadata; the
+                # worker runs jobs in order, so the audio is saved first
+                self._archive_audio(command_audio, 'command', timestamp, command_wav, saved)
+                self._archive_metadata(timestamp, wake_word_text, command_text, saved)
                 
                 # Pass the command text back to the callback
                 if self.callback:
@@ -376,21 +381,17 @@ class VoiceRecognizer:
             except sr.UnknownValueError:
                 print("Command not understood")
                 # Still save the audio even if not understood
-                self._save_audio(command_audio, f"unknown_command_{timestamp}")
+                self._archive_audio(command_audio, 'unknown_command', timestamp, command_wav)
                 # Inform callback that command wasn't understood
                 if self.callback:
                     self.callback(True, "I couldn't understand that")
                 
-            except sr.RequestError as e:
+            except (sr.RequestError, TranscriptionError) as e:
                 print(f"Could not request results for command: {e}")
                 # Inform callback about the request error
                 if self.callback:
                     self.callback(True, "Sorry, I had trouble connecting")
                 
-            # Clean up temp file
-            if os.path.exists(temp_command_path):
-                os.remove(temp_command_path)
-                
         except Exception as e:
             print(f"Error while listening for command: {e}")
             # Inform callback about the error
@@ -401,94 +402,137 @@ class VoiceRecognizer:
         # This will be managed by the main application for confirmation scenarios
         threading.Timer(3.0, lambda: self.callback(False) if self.callback else None).start()
     
-    def _save_audio(self, audio_data, prefix, temp_path=None):
-        """Save the recorded audio to a file (MP3 if possible, otherwise WAV)"""
+    def _archive_audio(self, audio_data, kind, timestamp, wav_data=None, saved=None):
+        """Queue a recording for _save_audio on the archive worker; the filename is stored in saved[kind]"""
+        if not self.archive_recordings:
+            return
+        
+        def save():
+            filename = self._save_audio(audio_data, f"{kind}_{timestamp}", wav_data)
+            if filename:
+                self.recording_store.add_file(timestamp, kind, filename)
+                self._cleanup_old_files()
+            if saved is not None:
+                saved[kind] = filename
+        self.archive_worker.submit('audio', save)
+    
+    def _archive_metadata(self, timestamp, wake_word_text, command_text, saved):
+        """
+        Send the command to the backend and, when archiving is on, queue
+        _save_metadata on the archive worker, with the recognition state as
+        it is now
+        """
+        recognition = {
+            "method": self.transcriber.last_backend,
+            "noise_floor_db": self.audio_capture.vad.noise_db if self.audio_capture else None,
+            "pause_threshold": self.pause_threshold,
+        }
+        recorded_at = time.time()
+        # The recordings may not be saved yet, so the command is sent without their file details
+        metadata = self._build_metadata(timestamp, wake_word_text, command_text, None, None, recognition, recorded_at)
+        self.command_sender.submit(self._send_command, timestamp, command_text, metadata)
+        if not self.archive_recordings:
+            return
+        self.archive_worker.submit(
+            'metadata',
+            lambda: self._save_metadata(timestamp, wake_word_text, command_text, saved.get('wake'),
+                                        saved.get('command'), recognition, recorded_at))
+    
+    def _save_audio(self, audio_data, prefix, wav_data=None):
+        """Archive the recorded audio to a file (MP3 if possible, otherwise WAV); returns None when archiving is off"""
+        if not self.archive_recordings:
+            return None
+        
         try:
             # Create timestamp for filename
             wav_filename = os.path.join(self.temp_dir, f"{prefix}.wav")
             mp3_filename = os.path.join(self.temp_dir, f"{prefix}.mp3")
             
-            # Use existing temp file if provided, otherwise create from audio_data
-            if temp_path and os.path.exists(temp_path):
-                # Rename temp file instead of creating a new one
-                os.rename(temp_path, wav_filename)
-            else:
-                # First save as WAV
-                with open(wav_filename, "wb") as f:
-                    f.write(audio_data.get_wav_data())
+            # Reuse the WAV bytes already encoded for transcription
+            if wav_data is None:
+                wav_data = audio_data.get_wav_data()
             
-            # Convert to MP3 if pydub is available (Alexa-like)
+            # Convert to MP3 straight from memory if pydub is available (Alexa-like)
             if MP3_AVAILABLE:
                 try:
-                    audio = AudioSegment.from_wav(wav_filename)
+                    audio = AudioSegment.from_wav(io.BytesIO(wav_data))
                     audio.export(mp3_filename, format="mp3")
-                    
-                    # Remove the WAV file after successful conversion
-                    os.remove(wav_filename)
                     print(f"Saved recording to {mp3_filename}")
                     return mp3_filename
                 except Exception as e:
                     print(f"Error converting to MP3, keeping WAV: {e}")
-                    return wav_filename
-            else:
-                print(f"Saved recording to {wav_filename}")
-                return wav_filename
+            
+            with open(wav_filename, "wb") as f:
+                f.write(wav_data)
+            print(f"Saved recording to {wav_filename}")
+            return wav_filename
                 
         except Exception as e:
             print(f"Error saving audio: {e}")
             return None
             
-    def _save_metadata(self, timestamp, wake_word_text, command_text, wake_filename, command_filename):
-        """Save detailed metadata about the voice interaction"""
-        try:
-            # Get system info for better debugging
-            system_info = {
-                "platform": os.name,
-                "python_version": os.sys.version.split()[0],
-                "audio_rate": self.RATE,
-                "audio_channels": self.CHANNELS,
+    def _build_metadata(self, timestamp, wake_word_text, command_text, wake_filename, command_filename,
+                        recognition=None, recorded_at=None):
+        """Detailed metadata about the voice interaction, with the stats of the recordings that exist"""
+        # Get system info for better debugging
+        system_info = {
+            "platform": os.name,
+            "python_version": os.sys.version.split()[0],
+            "audio_rate": self.RATE,
+            "audio_channels": self.CHANNELS,
+        }
+        
+        # Get audio file stats if available
+        wake_file_stats = None
+        command_file_stats = None
+        
+        if wake_filename and os.path.exists(wake_filename):
+            wake_file_stats = {
+                "size_bytes": os.path.getsize(wake_filename),
+                "created": datetime.datetime.fromtimestamp(os.path.getctime(wake_filename)).isoformat(),
             }
             
-            # Get audio file stats if available
-            wake_file_stats = None
-            command_file_stats = None
-            
-            if wake_filename and os.path.exists(wake_filename):
-                wake_file_stats = {
-                    "size_bytes": os.path.getsize(wake_filename),
-                    "created": datetime.datetime.fromtimestamp(os.path.getctime(wake_filename)).isoformat(),
-                }
-                
-            if command_filename and os.path.exists(command_filename):
-                command_file_stats = {
-                    "size_bytes": os.path.getsize(command_filename),
-                    "created": datetime.datetime.fromtimestamp(os.path.getctime(command_filename)).isoformat(),
-                }
-            
-            # Create comprehensive metadata
-            metadata = {
-                "interaction": {
-                    "timestamp": timestamp,
-                    "iso_time": datetime.datetime.now().isoformat(),
-                    "unix_time": time.time(),
-                    "wake_word": {
-                        "text": wake_word_text,
-                        "file": os.path.basename(wake_filename) if wake_filename else None,
-                        "file_stats": wake_file_stats
-                    },
-                    "command": {
-                        "text": command_text,
-                        "file": os.path.basename(command_filename) if command_filename else None,
-                        "file_stats": command_file_stats
-                    }
+        if command_filename and os.path.exists(command_filename):
+            command_file_stats = {
+                "size_bytes": os.path.getsize(command_filename),
+                "created": datetime.datetime.fromtimestamp(os.path.getctime(command_filename)).isoformat(),
+            }
+        
+        # Create comprehensive metadata
+        metadata = {
+            "interaction": {
+                "timestamp": timestamp,
+                "iso_time": datetime.datetime.fromtimestamp(recorded_at or time.time()).isoformat(),
+                "unix_time": recorded_at or time.time(),
+                "wake_word": {
+                    "text": wake_word_text,
+                    "file": os.path.basename(wake_filename) if wake_filename else None,
+                    "file_stats": wake_file_stats
                 },
-                "system": system_info,
-                "recognition": {
-                    "method": "groq" if self.use_groq else "google",
-                    "energy_threshold": self.recognizer.energy_threshold,
-                    "dynamic_threshold": self.recognizer.dynamic_energy_threshold,
+                "command": {
+                    "text": command_text,
+                    "file": os.path.basename(command_filename) if command_filename else None,
+                    "file_stats": command_file_stats
                 }
+            },
+            "system": system_info,
+            "recognition": recognition or {
+                "method": self.transcriber.last_backend,
+                "noise_floor_db": self.audio_capture.vad.noise_db if self.audio_capture else None,
+                "pause_threshold": self.pause_threshold,
             }
+        }
+        return metadata
+    
+    def _save_metadata(self, timestamp, wake_word_text, command_text, wake_filename, command_filename,
+                       recognition=None, recorded_at=None):
+        """Save detailed metadata about the voice interaction to the archive; returns None when archiving is off"""
+        if not self.archive_recordings:
+            return None
+        
+        try:
+            metadata = self._build_metadata(timestamp, wake_word_text, command_text, wake_filename,
+                                            command_filename, recognition, recorded_at)
             
             # Save as pretty-formatted JSON
             metadata_file = os.path.join(self.temp_dir, f"metadata_{timestamp}.json")
@@ -496,66 +540,42 @@ class VoiceRecognizer:
                 json.dump(metadata, f, indent=2)
                 
             print(f"Saved detailed interaction metadata to {metadata_file}")
-            
-            # Send the metadata to the voice command API endpoint
-            try:
-                api_url = "http://localhost:8000/voice/command"
-                print(f"Sending command to API: {command_text}")
-                
-                response = requests.post(
-                    api_url,
-                    json=metadata,
-                    headers={"Content-Type": "application/json"},
-                    timeout=5  # Add timeout to prevent hanging
-                )
-                
-                if response.status_code == 200:
-                    print(f"Successfully sent command to API. Response: {response.json()}")
-                else:
-                    print(f"API request failed with status code {response.status_code}: {response.text[:100]}...")
-            except Exception as e:
-                print(f"Error sending command to API: {e}")
-                
+            self.recording_store.add_file(timestamp, 'metadata', metadata_file)
+            self.recording_store.add_interaction(timestamp, wake_word_text, command_text, recorded_at)
+            self._cleanup_old_files()
             return metadata_file
         except Exception as e:
             print(f"Error saving metadata: {e}")
             return None
-
-    def _cleanup_old_files(self):
-        """Clean up old recording files to prevent disk space issues"""
+    
+    def _send_command(self, timestamp, command_text, metadata):
+        """Send the interaction metadata to the voice command API endpoint"""
         try:
-            print("Cleaning up old recording files...")
-            
-            # Get all files in the temp directory
-            all_files = []
-            for file in os.listdir(self.temp_dir):
-                file_path = os.path.join(self.temp_dir, file)
-                if os.path.isfile(file_path):
-                    # Get file creation time and add to list
-                    creation_time = os.path.getctime(file_path)
-                    all_files.append((file_path, creation_time))
-            
-            # Skip if there aren't many files
-            if len(all_files) <= self.max_recordings:
-                print(f"Only {len(all_files)} files found, no cleanup needed (limit: {self.max_recordings})")
-                return
-                
-            # Sort by creation time (oldest first)
-            all_files.sort(key=lambda x: x[1])
-            
-            # Calculate how many files to delete
-            files_to_delete = len(all_files) - self.max_recordings
+            api_url = "http://localhost:8000/voice/command"
+            print(f"Sending command to API: {command_text}")
             
-            # Delete oldest files
-            deleted_count = 0
-            for file_path, _ in all_files[:files_to_delete]:
-                try:
-                    os.remove(file_path)
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting {file_path}: {e}")
+            response = get_session().post(
+                api_url,
+                json=metadata,
+                headers=json_headers(interaction_key(timestamp)),
+                timeout=5  # Add timeout to prevent hanging
+            )
             
-            print(f"Cleanup complete: Deleted {deleted_count} old files, keeping {self.max_recordings} newest recordings")
+            if response.status_code == 200:
+                print(f"Successfully sent command to API. Response: {response.json()}")
+            else:
+                print(f"API request failed with status code {response.status_code}: {response.text[:100]}...")
+        except Exception as e:
+            print(f"Error sending command to API: {e}")
+
+    def _cleanup_old_files(self):
+        """Delete the oldest recordings once the archive exceeds its file count or size limit"""
+        try:
+            # The index keeps the totals, so this doesn't list the directory
+            deleted_count = self.recording_store.enforce_retention(self.max_recordings, self.max_archive_bytes)
+            if deleted_count:
+                print(f"Cleanup complete: Deleted {deleted_count} old files, keeping {self.max_recordings} newest "
+                      f"recordings ({self.recording_store.format_stats()})")
         except Exception as e:
             print(f"Error during file cleanup: {e}")
 
@@ -567,8 +587,8 @@ class VoiceRecognizer:
                 "Authorization": f"Bearer {self.groq_api_key}",
                 "Content-Type": "application/json"
             }
-            response = requests.get(
-                "https://api.groq.com/openai/v1/models",
+            response = get_session().get(
+                f"{GROQ_API_BASE}/models",
                 headers=headers,
                 timeout=5
             )
@@ -584,25 +604,32 @@ class VoiceRecognizer:
             print(f"✗ Error validating Groq API key: {e}")
             return False
 
-    def listen_for_confirmation(self, source):
+    def idempotency_key_for(self, command):
+        """Idempotency key of the latest interaction if command is its command, else None"""
+        key, command_text = self.last_interaction
+        return key if command is not None and command == command_text else None
+
+    def get_recent_commands(self, limit=10):
+        """The most recent interactions from the recording index, newest first"""
+        return self.recording_store.last_commands(limit)
+
+    def listen_for_confirmation(self, capture):
         """Listen specifically for a yes/no confirmation response"""
         try:
             print("Listening for confirmation (yes/no)...")
             
             # Use a shorter timeout for confirmation as it's typically a short response
-            confirmation_audio = self.recognizer.listen(source, timeout=3.0, phrase_time_limit=2.0)
+            segment = capture.next_segment(timeout=3.0, after=capture.position)
+            if segment is None:
+                raise sr.WaitTimeoutError("listening timed out while waiting for confirmation to start")
+            # Keep the first two seconds, like the old phrase time limit
+            segment = (segment[0], min(segment[1], segment[0] + 2 * self.RATE))
+            confirmation_audio = sr.AudioData(capture.get_pcm(segment), self.RATE, 2)
             
             try:
-                # Save the confirmation audio to temporary file
-                temp_confirm_path = os.path.join(self.temp_dir, "temp_confirm.wav")
-                with open(temp_confirm_path, "wb") as f:
-                    f.write(confirmation_audio.get_wav_data())
-                
                 # Try to recognize the confirmation response
-                if self.use_groq:
-                    confirmation_text = self._transcribe_with_groq(temp_confirm_path).lower()
-                else:
-                    confirmation_text = self.recognizer.recognize_google(confirmation_audio).lower()
+                confirmation_text = self.transcriber.transcribe(confirmation_audio.get_wav_data(), confirmation_audio,
+                                                                "confirm.wav").lower()
                 
                 print(f"Confirmation response: {confirmation_text}")
                 
@@ -610,10 +637,6 @@ class VoiceRecognizer:
                 is_confirmed = any(word in confirmation_text for word in ["yes.", "yeah.", "yep.", "correct.", "sure.", "ok.", "okay."])
                 is_denied = any(word in confirmation_text for word in ["no.", "nope.", "don't.", "not.", "cancel.", "incorrect."])
                 
-                # Clean up temp file
-                if os.path.exists(temp_confirm_path):
-                    os.remove(temp_confirm_path)
-                
                 if is_confirmed:
                     return True, confirmation_text
                 elif is_denied:
@@ -624,14 +647,10 @@ class VoiceRecognizer:
                 
             except sr.UnknownValueError:
                 print("Confirmation not understood")
-                if os.path.exists(temp_confirm_path):
-                    os.remove(temp_confirm_path)
                 return None, "I couldn't understand that"
                 
-            except sr.RequestError as e:
+            except (sr.RequestError, TranscriptionError) as e:
                 print(f"Could not request results for confirmation: {e}")
-                if os.path.exists(temp_confirm_path):
-                    os.remove(temp_confirm_path)
                 return None, f"Request error: {e}"
                 
         except Exception as e:
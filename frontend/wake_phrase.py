@@ -0,0 +1,357 @@
+"""
+Matching of wake phrases in transcripts.
+
+Transcription renders the same wake phrase in many ways: "Hey Ava.",
+"hey, eva", "Hi Ava, what's the time", "hey abba", "heyava". Instead of a
+list of hand-made spellings checked one by one, WakePhraseMatcher is
+built once from the wake phrases and matches in two stages:
+
+1. One compiled regular expression over the lowercased transcript finds
+   the phrases as spoken, with the greetings treated as interchangeable
+   ("hi" / "hey" / "hello" / "hay") and any punctuation between words.
+2. Otherwise the transcript's words are aligned with each phrase: a word
+   matches when it is within a small edit distance of the phrase word
+   (bounded by the word length) or sounds alike by a coarse phonetic key,
+   and a filler word inside the phrase ("hey, um, ava") is tolerated at a
+   cost. Phrases transcribed as one word ("heyava") are compared whole.
+
+A match has a confidence and its character span, so the text after the
+wake phrase can be used as the command right away. A repeated wake phrase
+or assistant name right after it ("hey ava, ava, ...") is not part of the
+command. A wake phrase needs a word besides the greeting: greetings alone
+are ordinary speech.
+
+Usage (evaluation on a labelled corpus and timing):
+    python wake_phrase.py [wake_phrase_corpus.jsonl] [--wake-words "hi ava" "hey ava"] [--repeat 2000]
+"""
+import argparse
+import json
+import re
+import time
+
+# Greetings are said and transcribed interchangeably
+GREETINGS = ('hi', 'hey', 'hello', 'hay')
+SYNONYM_CONFIDENCE = 0.9
+PHONETIC_CONFIDENCE = 0.85
+
+MIN_CONFIDENCE = 0.85
+# Filler words allowed between the words of a phrase, and what each costs
+FILLER_WORDS = frozenset(('um', 'uh', 'er', 'erm', 'ah', 'oh', 'hmm', 'mm'))
+MAX_GAP_WORDS = 1
+GAP_PENALTY = 0.05
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+# Characters stripped between the wake phrase and the command
+COMMAND_STRIP = " \t\n,.!?;:-"
+
+# Coarse sound classes for the phonetic key
+PHONETIC_CLASSES = {}
+for _letters, _code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        PHONETIC_CLASSES[_letter] = _code
+
+def words(text):
+    """Lowercase words of a text"""
+    return WORD_PATTERN.findall(text.lower())
+
+def max_edits(word):
+    """Edits allowed when matching a word: none for very short words, more for long ones"""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance, giving up once it must exceed limit.
+    
+    Returns:
+        The distance, or limit + 1 if it is larger than limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    if limit <= 1:
+        # At most one edit: compare what follows the common prefix
+        if limit == 0:
+            return 1
+        if len(a) > len(b):
+            a, b = b, a
+        prefix = 0
+        while prefix < len(a) and a[prefix] == b[prefix]:
+            prefix += 1
+        if len(a) == len(b):
+            return 1 if a[prefix + 1:] == b[prefix + 1:] else 2
+        return 1 if a[prefix:] == b[prefix + 1:] else 2
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+def phonetic_key(word):
+    """
+    Coarse pronunciation key: vowel runs become 'a', consonants their sound
+    class, silent-ish h/w/y are dropped after the first letter and repeats
+    collapse. A final vowel keeps its quality, so "ava", "eva", "abba" and
+    "avah" share a key but "eve" and "avi" don't.
+    """
+    stem = word.rstrip('h') or word
+    key = []
+    for index, char in enumerate(stem):
+        if char in 'aeiou':
+            code = 'a'
+        elif char in 'hwy' and index > 0:
+            continue
+        else:
+            code = PHONETIC_CLASSES.get(char, char)
+        if not key or key[-1] != code:
+            key.append(code)
+    if len(stem) > 1 and stem[-1] in 'eiy':
+        key[-1] = 'e'
+    return ''.join(key)
+
+class WakePhraseMatcher:
+    """Finds the first wake phrase in a transcript, with its position and confidence"""
+    
+    def __init__(self, wake_words, min_confidence=MIN_CONFIDENCE, max_gap=MAX_GAP_WORDS):
+        """
+        Compile the matcher.
+        
+        Args:
+            wake_words: Wake phrases; case and punctuation don't matter
+            min_confidence: Fuzzy matches below this are rejected
+            max_gap: Filler words tolerated between the words of a phrase
+        """
+        # Word tuples, longest first so a longer phrase wins over its prefix
+        phrases = {tuple(words(phrase)) for phrase in wake_words}
+        greeting_only = [phrase for phrase in phrases if phrase and all(word in GREETINGS for word in phrase)]
+        if greeting_only:
+            print(f"Ignoring wake words without a name: {[' '.join(phrase) for phrase in greeting_only]}")
+        self.phrases = sorted((phrase for phrase in phrases if phrase and phrase not in greeting_only),
+                              key=len, reverse=True)
+        if not self.phrases:
+            raise ValueError("No wake words to match; each needs a word besides a greeting (e.g. 'hey ava')")
+        self.min_confidence = min_confidence
+        self.max_gap = max_gap
+        
+        # Stage 1: the phrases as spoken, greetings interchangeable
+        greeting = "(?:" + "|".join(GREETINGS) + ")"
+        alternatives = [r"[\W_]+".join(greeting if word in GREETINGS else re.escape(word) for word in phrase)
+                        for phrase in self.phrases]
+        self.pattern = re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+        
+        # Stage 2: per phrase word, what it takes to match it
+        self.targets = [[(word, max_edits(word), phonetic_key(word)) for word in phrase] for phrase in self.phrases]
+        # The names said again after the phrase ("hey ava, ava, ..."), skipped with the repeats
+        names = {target[-1] for target in self.targets if target[-1][0] not in GREETINGS}
+        self.repeats = self.targets + [[name] for name in sorted(names)]
+        # One edit at most: a merged phrase is otherwise too easily a real word ("heavy")
+        self.joined = [(''.join(phrase), min(1, max_edits(''.join(phrase))), phrase)
+                       for phrase in self.phrases if len(phrase) > 1]
+    
+    def _word_score(self, token, target):
+        word, word_key = token
+        text, limit, key = target
+        if word == text:
+            return 1.0
+        if word in GREETINGS and text in GREETINGS:
+            return SYNONYM_CONFIDENCE
+        score = 0.0
+        if abs(len(word) - len(text)) <= limit:
+            distance = edit_distance(word, text, limit)
+            if distance <= limit:
+                score = 1.0 - distance / (2 * len(text))
+        if len(text) > 2 and word_key == key:
+            score = max(score, PHONETIC_CONFIDENCE)
+        return score
+    
+    def _cached_score(self, token, target, scores):
+        # Phrases share words ("hi ava", "hey ava"); score each word once per transcript
+        cache_key = (token[0], target[0])
+        score = scores.get(cache_key)
+        if score is None:
+            score = scores[cache_key] = self._word_score(token, target)
+        return score
+    
+    def _align(self, targets, tokens, first, scores):
+        # Match the phrase starting at token 'first'; returns (confidence, last token index).
+        # The weakest word decides: a perfect greeting can't make up for a poor name
+        score = self._cached_score(tokens[first], targets[0], scores)
+        if score == 0.0:
+            return 0.0, first
+        weakest = score
+        gaps = 0
+        position = first
+        for target in targets[1:]:
+            best_score, best_position = 0.0, None
+            for candidate in range(position + 1, min(len(tokens), position + 2 + self.max_gap)):
+                candidate_score = self._cached_score(tokens[candidate], target, scores)
+                if candidate_score > best_score:
+                    best_score, best_position = candidate_score, candidate
+                # Only filler words may be skipped
+                if tokens[candidate][0] not in FILLER_WORDS:
+                    break
+            if best_position is None:
+                return 0.0, first
+            gaps += best_position - position - 1
+            weakest = min(weakest, best_score)
+            position = best_position
+        return weakest - gaps * GAP_PENALTY, position
+    
+    def match(self, text):
+        """
+        Find the wake phrase in a transcript.
+        
+        Args:
+            text: Transcript as returned by the transcription service
+        
+        Returns:
+            None, or a dictionary with wake_word (the phrase matched),
+            start and end (character span in text), confidence (0-1) and
+            command (the text after the wake phrase, stripped)
+        """
+        lowered = text.lower()
+        found = self.pattern.search(lowered)
+        if found:
+            spoken = tuple(words(found.group()))
+            phrase = next(phrase for phrase in self.phrases
+                          if len(phrase) == len(spoken)
+                          and all(a == b or (a in GREETINGS and b in GREETINGS) for a, b in zip(phrase, spoken)))
+            confidence = 1.0 if spoken == phrase else SYNONYM_CONFIDENCE
+            return self._result(text, phrase, found.start(), found.end(), confidence)
+        
+        spans = [(token.start(), token.end()) for token in WORD_PATTERN.finditer(lowered)]
+        tokens = [(lowered[start:end], phonetic_key(lowered[start:end])) for start, end in spans]
+        best = None
+        scores = {}
+        for phrase, targets in zip(self.phrases, self.targets):
+            for first in range(len(tokens)):
+                confidence, last = self._align(targets, tokens, first, scores)
+                if confidence >= self.min_confidence and (best is None or confidence > best[0]):
+                    best = (confidence, phrase, spans[first][0], spans[last][1])
+        
+        # A multi-word phrase transcribed as one word ("heyava")
+        for joined, limit, phrase in self.joined:
+            for (word, _), (start, end) in zip(tokens, spans):
+                if abs(len(word) - len(joined)) > limit:
+                    continue
+                distance = edit_distance(word, joined, limit)
+                confidence = 1.0 - distance / (2 * len(joined))
+                if distance <= limit and confidence >= self.min_confidence and (best is None or confidence > best[0]):
+                    best = (confidence, phrase, start, end)
+        
+        if best is None:
+            return None
+        confidence, phrase, start, end = best
+        return self._result(text, phrase, start, end, confidence)
+    
+    def _skip_repeats(self, lowered, end):
+        # Move end past wake phrases and names repeated right after the match
+        while True:
+            spans = [(token.start(), token.end()) for token in WORD_PATTERN.finditer(lowered, end)][:4]
+            if not spans:
+                return end
+            tokens = [(lowered[start:stop], phonetic_key(lowered[start:stop])) for start, stop in spans]
+            scores = {}
+            repeat_end = None
+            for targets in self.repeats:
+                if len(targets) > len(tokens):
+                    continue
+                confidence, last = self._align(targets, tokens, 0, scores)
+                if confidence >= self.min_confidence:
+                    repeat_end = max(repeat_end or 0, spans[last][1])
+            if repeat_end is None:
+                return end
+            end = repeat_end
+    
+    def _result(self, text, phrase, start, end, confidence):
+        end = self._skip_repeats(text.lower(), end)
+        return {
+            'wake_word': ' '.join(phrase),
+            'start': start,
+            'end': end,
+            'confidence': round(confidence, 3),
+            'command': text[end:].strip(COMMAND_STRIP)
+        }
+
+def substring_match(text, wake_words):
+    """The previous check: expanded spellings as substrings, then all words anywhere"""
+    for wake_word in wake_words:
+        if wake_word in text:
+            return wake_word
+    for wake_word in wake_words:
+        parts = wake_word.split()
+        if len(parts) > 1 and all(part in text for part in parts):
+            return wake_word
+    return None
+
+def expand_wake_words(base_words):
+    """The spellings VoiceRecognizer used to generate for substring_match"""
+    expanded = []
+    for word in base_words:
+        expanded.append(word)
+        if "ava" in word:
+            expanded += [word.replace("ava", "eva"), word.replace("ava", "ava please"),
+                         word.replace("ava", "ava can you")]
+        if "hi" in word:
+            expanded += [word.replace("hi", "hey"), word.replace("hi", "hello")]
+        if "hey" in word:
+            expanded += [word.replace("hey", "hi"), word.replace("hey", "hello"), word.replace("hey", "hay")]
+    return expanded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='?', default="wake_phrase_corpus.jsonl",
+                        help="JSON lines with text, wake (true/false) and optionally command")
+    parser.add_argument('--wake-words', nargs='+', default=["hi ava", "hey ava"])
+    parser.add_argument('--repeat', type=int, default=2000, help="Passes over the corpus for the timing")
+    args = parser.parse_args()
+    
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    matcher = WakePhraseMatcher(args.wake_words)
+    expanded = expand_wake_words(args.wake_words)
+    
+    results = {'matcher': [0, 0, 0], 'substring': [0, 0, 0]}  # false accepts, false rejects, commands right
+    for entry in corpus:
+        found = matcher.match(entry['text'])
+        old = substring_match(entry['text'].lower(), expanded)
+        for name, accepted in (('matcher', found is not None), ('substring', old is not None)):
+            if accepted and not entry['wake']:
+                results[name][0] += 1
+            elif not accepted and entry['wake']:
+                results[name][1] += 1
+        if found is not None and entry['wake'] and found['command'].lower() == entry.get('command', '').lower():
+            results['matcher'][2] += 1
+        if (found is not None) != entry['wake']:
+            print(f"  matcher {'accepted' if found else 'rejected'}: {entry['text']!r} {found or ''}")
+    
+    positives = sum(entry['wake'] for entry in corpus)
+    negatives = len(corpus) - positives
+    print(f"{len(corpus)} transcripts ({positives} with a wake phrase, {negatives} without):")
+    for name, (false_accepts, false_rejects, _) in results.items():
+        print(f"  {name:9s} false rejects {false_rejects}/{positives} ({false_rejects / max(1, positives):.0%}), "
+              f"false accepts {false_accepts}/{negatives} ({false_accepts / max(1, negatives):.0%})")
+    print(f"  command text after the wake phrase right in {results['matcher'][2]}/{positives}")
+    
+    texts = [entry['text'] for entry in corpus]
+    for name, function in (('matcher', matcher.match),
+                           ('substring', lambda text: substring_match(text.lower(), expanded))):
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                function(text)
+        elapsed = time.perf_counter() - start_time
+        print(f"  {name:9s} {elapsed / (args.repeat * len(texts)) * 1e6:.1f} us per transcript")
+    start_time = time.perf_counter()
+    for _ in range(100):
+        WakePhraseMatcher(args.wake_words)
+    print(f"  building the matcher takes {(time.perf_counter() - start_time) * 10:.2f} ms")
+
+if __name__ == '__main__':
+    main()
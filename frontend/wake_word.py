@@ -0,0 +1,369 @@
+"""
+Local wake word detection in front of cloud transcription.
+
+Every phrase the microphone captures used to be uploaded to Groq or Google
+just to find out whether it contains "hey ava". WakeWordDetector compares
+the phrase against a handful of recorded wake word templates on the CPU
+first, so only likely wake utterances leave the machine.
+
+Features are MFCCs computed with NumPy. A phrase is matched against each
+template with subsequence dynamic time warping: the whole template has to
+be aligned with some part of the phrase, so a wake word followed by a
+command still matches. Templates come from the wake_* recordings the
+recognizer archives and from wake words confirmed by transcription at run
+time.
+"""
+import glob
+import os
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+# Import pydub to read archived MP3 recordings
+try:
+    from pydub import AudioSegment
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+# Feature extraction parameters
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400  # 25 ms
+FRAME_STEP = 160  # 10 ms
+FFT_SIZE = 512
+MEL_BANDS = 26
+MFCC_COUNT = 13
+PRE_EMPHASIS = 0.97
+
+# Templates keep at most this much audio from the start of speech, which is
+# where the wake word is in an archived wake_* phrase
+MAX_TEMPLATE_SECONDS = 1.5
+# Frames quieter than this fraction of the loudest frame count as silence
+SILENCE_RATIO = 0.05
+
+# Number of templates kept, and needed before the detector starts gating
+MAX_TEMPLATES = 10
+MIN_TEMPLATES = 3
+
+# Automatic thresholds accept the worst leave-one-out template match with
+# this margin; a false reject loses an activation while a false accept only
+# costs one upload, so the margin errs on the accepting side
+THRESHOLD_MARGIN = 1.3
+
+def _mel_filterbank(rate=SAMPLE_RATE, fft_size=FFT_SIZE, bands=MEL_BANDS):
+    """Triangular mel filters as a (bands, fft_size // 2 + 1) matrix"""
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+    
+    def to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+    
+    mel_points = np.linspace(to_mel(0.0), to_mel(rate / 2), bands + 2)
+    bins = np.floor((fft_size + 1) * to_hz(mel_points) / rate).astype(int)
+    
+    filters = np.zeros((bands, fft_size // 2 + 1), dtype=np.float32)
+    for band in range(bands):
+        left, center, right = bins[band], bins[band + 1], bins[band + 2]
+        if center > left:
+            filters[band, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[band, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+def _dct_matrix(bands=MEL_BANDS, count=MFCC_COUNT):
+    """Orthonormal DCT-II basis as a (bands, count) matrix"""
+    n = np.arange(bands)[:, np.newaxis]
+    k = np.arange(count)[np.newaxis, :]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * bands)) * np.sqrt(2.0 / bands)
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+MEL_FILTERS = _mel_filterbank()
+DCT_BASIS = _dct_matrix()
+WINDOW = np.hamming(FRAME_LENGTH).astype(np.float32)
+
+def pcm_to_float(pcm_data):
+    """Convert 16-bit little-endian mono PCM bytes to float32 samples in [-1, 1]"""
+    return np.frombuffer(pcm_data, dtype='<i2').astype(np.float32) / 32768.0
+
+def load_audio(file_path, rate=SAMPLE_RATE):
+    """
+    Load a recording as mono float32 samples at the given rate.
+    
+    WAV files are read with the wave module; other formats (the MP3 archive)
+    need pydub.
+    
+    Returns:
+        1-D float32 array, or None if the file can't be read
+    """
+    try:
+        if file_path.lower().endswith('.wav'):
+            with wave.open(file_path, 'rb') as wav_file:
+                if wav_file.getsampwidth() != 2:
+                    raise ValueError(f"unsupported sample width {wav_file.getsampwidth()}")
+                channels = wav_file.getnchannels()
+                file_rate = wav_file.getframerate()
+                samples = pcm_to_float(wav_file.readframes(wav_file.getnframes()))
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        elif PYDUB_AVAILABLE:
+            segment = AudioSegment.from_file(file_path).set_channels(1).set_sample_width(2)
+            file_rate = segment.frame_rate
+            samples = pcm_to_float(segment.raw_data)
+        else:
+            return None
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+    
+    if file_rate != rate and len(samples):
+        # Linear resampling is plenty for 13 MFCCs
+        positions = np.arange(int(len(samples) * rate / file_rate)) * (file_rate / rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+def compute_mfcc(samples):
+    """
+    Compute cepstral-mean-normalized MFCCs.
+    
+    Args:
+        samples: 1-D float32 array at SAMPLE_RATE
+    
+    Returns:
+        (frames, MFCC_COUNT - 1) float32 array; the energy coefficient is
+        dropped so matching doesn't depend on loudness
+    """
+    if len(samples) < FRAME_LENGTH:
+        samples = np.pad(samples, (0, FRAME_LENGTH - len(samples)))
+    
+    emphasized = np.append(samples[:1], samples[1:] - PRE_EMPHASIS * samples[:-1])
+    frame_count = 1 + (len(emphasized) - FRAME_LENGTH) // FRAME_STEP
+    frames = np.lib.stride_tricks.sliding_window_view(emphasized, FRAME_LENGTH)[::FRAME_STEP][:frame_count]
+    
+    spectrum = np.abs(np.fft.rfft(frames * WINDOW, FFT_SIZE)) ** 2 / FFT_SIZE
+    mel_energies = np.log(spectrum @ MEL_FILTERS.T + 1e-10)
+    mfcc = (mel_energies @ DCT_BASIS)[:, 1:]
+    return (mfcc - mfcc.mean(axis=0)).astype(np.float32)
+
+def trim_silence(samples, max_seconds=None):
+    """
+    Cut leading and trailing silence, optionally keeping only the start of the speech.
+    
+    Frames are voiced relative to the loudest frame, which suits the short,
+    close-up wake templates (uploads use audio_encoding.trim_upload_silence).
+    
+    Returns:
+        The trimmed samples (unchanged if no frame stands out from silence)
+    """
+    frame_count = len(samples) // FRAME_STEP
+    if frame_count == 0:
+        return samples
+    
+    energies = np.square(samples[:frame_count * FRAME_STEP].reshape(frame_count, FRAME_STEP)).mean(axis=1)
+    voiced = np.flatnonzero(energies > energies.max() * SILENCE_RATIO)
+    if len(voiced) == 0:
+        return samples
+    
+    start = voiced[0] * FRAME_STEP
+    end = (voiced[-1] + 1) * FRAME_STEP
+    if max_seconds is not None:
+        end = min(end, start + int(max_seconds * SAMPLE_RATE))
+    return samples[start:end]
+
+def dtw_distance(template, features):
+    """
+    Subsequence DTW distance between a template and any part of a phrase.
+    
+    Uses the symmetric (1, 1), (1, 2), (2, 1) step pattern, which limits
+    warping to between half and twice the template's speed and lets every
+    template row be computed from the previous two with vectorized NumPy.
+    
+    Args:
+        template: (n, d) template features
+        features: (m, d) phrase features
+    
+    Returns:
+        Average frame distance along the best alignment (inf if the phrase
+        is too short to match)
+    """
+    n, m = len(template), len(features)
+    if m * 2 < n:
+        return np.inf
+    
+    # Euclidean distances between every template and phrase frame
+    costs = np.sqrt(np.maximum(
+        (template ** 2).sum(axis=1)[:, np.newaxis]
+        + (features ** 2).sum(axis=1)[np.newaxis, :]
+        - 2.0 * template @ features.T, 0.0))
+    
+    # The alignment can start at any phrase frame
+    previous2 = np.full(m, np.inf, dtype=np.float32)
+    previous = costs[0].copy()
+    step = np.empty(m, dtype=np.float32)
+    for row in range(1, n):
+        step.fill(np.inf)
+        step[1:] = previous[:-1]
+        step[2:] = np.minimum(step[2:], previous[:-2])
+        step[1:] = np.minimum(step[1:], previous2[:-1])
+        previous2, previous = previous, costs[row] + step
+    
+    # ... and end at any phrase frame
+    return float(previous.min()) / n
+
+class WakeWordDetector:
+    """
+    Decides locally whether a phrase is likely to contain the wake word.
+    
+    Until MIN_TEMPLATES templates are known the detector can't tell and
+    accepts everything, so a fresh install keeps using cloud transcription
+    while it collects wake recordings. Accept/reject counts and the CPU time
+    spent per second of audio are kept in stats.
+    """
+    
+    def __init__(self, threshold=None, max_templates=MAX_TEMPLATES, min_templates=MIN_TEMPLATES):
+        """
+        Initialize the detector.
+        
+        Args:
+            threshold: DTW distance below which a phrase is accepted; None
+                derives it from the templates (see calibrate)
+            max_templates: Number of most recent templates to keep
+            min_templates: Templates needed before phrases are rejected
+        """
+        self.fixed_threshold = threshold
+        self.threshold = threshold
+        self.min_templates = min_templates
+        self.templates = deque(maxlen=max_templates)
+        # Serializes template updates; matching reads the published templates
+        # and threshold without it
+        self.update_lock = threading.Lock()
+        self.stats = {'phrases': 0, 'accepted': 0, 'audio_seconds': 0.0, 'cpu_seconds': 0.0}
+    
+    @property
+    def ready(self):
+        """Whether there are enough templates to reject phrases"""
+        return len(self.templates) >= self.min_templates and self.threshold is not None
+    
+    def add_template(self, samples, calibrate=True):
+        """
+        Add a wake word recording as a template.
+        
+        The threshold is calibrated on a copy of the template set and both are
+        swapped in afterwards, so a caller on another thread (the recognizer
+        uses its archive worker) can add templates while phrases keep being
+        matched against the previous templates and threshold.
+        
+        Args:
+            samples: Float32 samples at SAMPLE_RATE of a phrase starting with the wake word
+            calibrate: Re-derive the automatic threshold afterwards
+        
+        Returns:
+            True if the recording had usable speech
+        """
+        samples = trim_silence(samples, MAX_TEMPLATE_SECONDS)
+        if len(samples) < FRAME_LENGTH * 4:
+            return False
+        features = compute_mfcc(samples)
+        with self.update_lock:
+            templates = deque(self.templates, maxlen=self.templates.maxlen)
+            templates.append(features)
+            threshold = self._derive_threshold(list(templates)) if calibrate else self.threshold
+            self.templates, self.threshold = templates, threshold
+        return True
+    
+    def load_templates(self, directory, pattern="wake_*"):
+        """
+        Load the most recent archived wake word recordings as templates.
+        
+        Returns:
+            Number of templates loaded
+        """
+        paths = sorted(glob.glob(os.path.join(directory, pattern)), key=os.path.getmtime)
+        loaded = 0
+        # Newest last, so the deque keeps the most recent recordings
+        for path in paths[-self.templates.maxlen * 2:]:
+            samples = load_audio(path)
+            if samples is not None and self.add_template(samples, calibrate=False):
+                loaded += 1
+        self.calibrate()
+        return loaded
+    
+    def calibrate(self):
+        """
+        Derive the automatic threshold from leave-one-out template matches.
+        
+        Each template is matched against the others; the threshold accepts
+        the worst of those best matches with THRESHOLD_MARGIN to spare. A
+        threshold passed to the constructor is kept as is.
+        """
+        with self.update_lock:
+            self.threshold = self._derive_threshold(list(self.templates))
+    
+    def _derive_threshold(self, templates):
+        """Threshold for a list of template features (None if it can't be derived)"""
+        if self.fixed_threshold is not None:
+            return self.fixed_threshold
+        if len(templates) < 2:
+            return None
+        
+        scores = [
+            min(dtw_distance(other, template) for other in templates[:index] + templates[index + 1:])
+            for index, template in enumerate(templates)
+        ]
+        return max(scores) * THRESHOLD_MARGIN
+    
+    def score(self, samples, templates=None):
+        """
+        Distance of a phrase to the closest template.
+        
+        Args:
+            samples: Float32 samples at SAMPLE_RATE
+            templates: Template features to match (defaults to the current templates)
+        
+        Returns:
+            Smallest DTW distance (inf without templates)
+        """
+        if templates is None:
+            templates = self.templates
+        if not templates:
+            return np.inf
+        features = compute_mfcc(samples)
+        return min(dtw_distance(template, features) for template in templates)
+    
+    def detect(self, pcm_data):
+        """
+        Check a captured phrase for the wake word.
+        
+        Args:
+            pcm_data: 16-bit mono PCM bytes at SAMPLE_RATE
+        
+        Returns:
+            (accepted, score) tuple; score is None while the detector isn't ready
+        """
+        start_cpu = time.process_time()
+        samples = pcm_to_float(pcm_data)
+        
+        # One consistent template set and threshold, even while a template is added
+        templates, threshold = self.templates, self.threshold
+        if len(templates) >= self.min_templates and threshold is not None:
+            score = self.score(samples, templates)
+            accepted = score <= threshold
+        else:
+            score = None
+            accepted = True
+        
+        self.stats['phrases'] += 1
+        self.stats['accepted'] += 1 if accepted else 0
+        self.stats['audio_seconds'] += len(samples) / SAMPLE_RATE
+        self.stats['cpu_seconds'] += time.process_time() - start_cpu
+        return accepted, score
+    
+    def format_stats(self):
+        """Summarize gated phrases and the CPU cost per second of audio"""
+        stats = self.stats
+        audio_seconds = max(stats['audio_seconds'], 1e-9)
+        return (f"{stats['accepted']}/{stats['phrases']} phrases sent for transcription, "
+                f"{len(self.templates)} templates, "
+                f"{stats['cpu_seconds'] / audio_seconds * 1000:.1f} ms CPU per second of audio")